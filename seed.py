@@ -2,38 +2,354 @@
 #!/usr/bin/env python3
 # Auto-generated seed script converted from seed-database.ts (simplified).
 # Run: python3 seed_database.py
+#      python3 seed.py --scale 1000000 --seed 42   (synthetic load-test data)
 # Requires: pip install pymongo bcrypt python-dotenv
+# Optional: pip install numpy   (--assign-zones, --evacuation-table, --evacuation-plan, --route-geometry)
+#           pip install motor   (--engine async; without it pymongo runs in threads)
+import argparse
+import bz2
+import csv
+import gzip
+import hashlib
+import heapq
+import json
+import lzma
+import math
+import mmap
 import os
-from datetime import datetime, timedelta
-from pymongo import MongoClient
-import bcrypt
-from dotenv import load_dotenv
+import random
+import re
+import struct
+import threading
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from functools import partial
+from datetime import datetime, timedelta, timezone
+from bisect import bisect_right
+from itertools import accumulate, chain, islice
+from zoneinfo import ZoneInfo
+from bson import MaxKey, MinKey, ObjectId, SON, decode_file_iter, json_util
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from pymongo import (ASCENDING, DESCENDING, GEOSPHERE, TEXT, DeleteMany, DeleteOne, IndexModel, MongoClient,
+                     UpdateMany, UpdateOne, WriteConcern)
+from pymongo.errors import BulkWriteError, OperationFailure
 
-load_dotenv()
+np = None  # imported by require_numpy(); only the spatial jobs need it
 
-MONGODB_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-DB_NAME = os.getenv("DB_NAME", "cruzroja_db")
+# Nothing below touches .env or the network at import time: settings are read
+# and the client is created on first use, so other scripts and test runners
+# can import the data builders without a reachable database. bcrypt, NumPy,
+# Motor, asyncio and sqlite3 are imported by the functions that need them.
+CONFIG_DEFAULTS = {
+    'MONGODB_URI': "mongodb://localhost:27017",
+    'DB_NAME': "cruzroja_db",
+    # Day boundaries for rollups; should match the timezone the Next.js server runs in.
+    'STATS_TZ': "UTC",
+}
+_config = None
+_client = None
+_client_uri = None  # what _client was opened with; None after use_database()
+_db = None
+
+
+def config(key):
+    global _config
+    if _config is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _config = {k: os.getenv(k, default) for k, default in CONFIG_DEFAULTS.items()}
+    return _config[key]
+
+
+def get_client():
+    global _client, _client_uri
+    if _client is None:
+        _client_uri = config('MONGODB_URI')
+        _client = MongoClient(_client_uri)
+    return _client
+
+
+def get_db():
+    global _db
+    if _db is None:
+        _db = get_client()[config('DB_NAME')]
+    return _db
+
+
+def use_database(database):
+    # Point everything at an existing pymongo Database (seed_bench.py, tests).
+    global _client, _client_uri, _db
+    _client, _client_uri, _db = database.client, None, database
+
+
+def __getattr__(name):
+    # Keeps `seed.db`, `seed.client` and `seed.DB_NAME` working for importers.
+    if name == 'db':
+        return get_db()
+    if name == 'client':
+        return get_client()
+    if name in CONFIG_DEFAULTS:
+        return config(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+SEED_COLLECTIONS = [
+    'riskzones', 'meetingpoints', 'evacuationroutes', 'alerts',
+    'courses', 'videos', 'resources', 'users',
+]
+# Everything seed.py writes; what --snapshot saves and --restore brings back.
+MANAGED_COLLECTIONS = SEED_COLLECTIONS + [
+    'incidents', 'dashboardstats', 'zonestats', 'evacuationlookup', 'evacuationplan', 'trainingcatalog',
+    'quarantine', 'seedjobs',
+]
+# Natural key used to match seed documents across runs in --incremental mode.
+SEED_KEYS = {
+    'riskzones': 'name',
+    'meetingpoints': 'name',
+    'evacuationroutes': 'name',
+    'alerts': 'title',
+    'courses': 'title',
+    'videos': 'youtubeId',
+    'resources': 'title',
+    'users': 'email',
+}
+# Fields that change on every run and must not count as a content change.
+VOLATILE_FIELDS = {'_id', 'createdAt', 'updatedAt', 'resolvedAt', 'seedHash'}
+# Never part of seedHash (an unsalted hash of a plaintext password can be
+# reversed offline); changes are detected by checking the stored bcrypt hash.
+SECRET_FIELDS = {'password'}
+# GeoJSON field added next to the {lat, lng} objects the UI reads.
+GEO_FIELD = 'geometry'
+CIRCLE_SEGMENTS = 32
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_POOL_SIZE = 100        # pymongo's default maxPoolSize
+BCRYPT_ROUNDS = 10
+# Below this many uncached passwords a process pool costs more than it saves.
+POOL_MIN_PASSWORDS = 16
 
-client = MongoClient(MONGODB_URI)
-db = client[DB_NAME]
 
 def now():
     return datetime.utcnow()
 
-def seed():
-    print("Clearing collections...")
-    db['riskzones'].delete_many({})
-    db['meetingpoints'].delete_many({})
-    db['evacuationroutes'].delete_many({})
-    db['alerts'].delete_many({})
-    db['courses'].delete_many({})
-    db['videos'].delete_many({})
-    db['resources'].delete_many({})
-    db['users'].delete_many({})
-
-    # Insert users (passwords will be hashed)
+
+class StageTimer:
+    # Wall time per stage (stages may nest), item counts, and per-batch insert
+    # latencies. Always on and cheap; seed_bench.py reads and resets it.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with getattr(self, 'lock', threading.Lock()):
+            self.stages = {}
+            self.counts = {}
+            self.batches = {}
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds, count=0):
+        with self.lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+            self.counts[name] = self.counts.get(name, 0) + count
+
+    def batch(self, collection, seconds, docs):
+        with self.lock:
+            self.batches.setdefault(collection, []).append((seconds, docs))
+
+
+timer = StageTimer()
+
+
+def hash_password(pwd, rounds=BCRYPT_ROUNDS):
+    import bcrypt
+    hashed = bcrypt.hashpw(pwd.encode('utf-8'), bcrypt.gensalt(rounds=rounds))
+    return hashed.decode('utf-8', errors='ignore')
+
+
+def hash_passwords(passwords, cache=None, pool=None):
+    # Returns {plaintext: hash}. Passwords already in `cache` are not rehashed,
+    # and duplicates are hashed once; new hashes are added to `cache`.
+    cache = {} if cache is None else cache
+    todo = sorted({p for p in passwords if p not in cache})
+    started = time.perf_counter()
+    if pool is not None and len(todo) >= POOL_MIN_PASSWORDS:
+        workers = getattr(pool, '_max_workers', None) or os.cpu_count() or 1
+        chunksize = max(1, len(todo) // (workers * 4))
+        hashed = pool.map(hash_password, todo, chunksize=chunksize)
+    else:
+        hashed = map(hash_password, todo)
+    for pwd, h in zip(todo, hashed):
+        cache[pwd] = h
+    timer.add('bcrypt', time.perf_counter() - started, len(todo))
+    return cache
+
+
+def check_password(plain, hashed):
+    import bcrypt
+    try:
+        return bcrypt.checkpw(plain.encode('utf-8'), hashed.encode('utf-8'))
+    except ValueError:
+        return False
+
+
+def passwords_unchanged(pairs, cache=None, pool=None):
+    # pairs: [(seed user, stored user)]. bcrypt salts every hash, so a stored
+    # password can only be checked against the plaintext, never recomputed.
+    results = [False] * len(pairs)
+    todo = []
+    for i, (doc, stored) in enumerate(pairs):
+        plain, hashed = doc['password'], stored.get('password')
+        if cache is not None and cache.get(plain) == hashed:
+            results[i] = True
+        elif isinstance(hashed, str):
+            todo.append((i, plain, hashed))
+    if todo:
+        mapper = pool.map if pool is not None and len(todo) >= POOL_MIN_PASSWORDS else map
+        checked = mapper(check_password, [t[1] for t in todo], [t[2] for t in todo])
+        for (i, plain, hashed), ok in zip(todo, checked):
+            results[i] = ok
+            if ok and cache is not None:
+                cache[plain] = hashed
+    return results
+
+
+def hash_user_passwords(users, cache=None, pool=None):
+    hashes = hash_passwords([u['password'] for u in users], cache=cache, pool=pool)
+    for u in users:
+        u['password'] = hashes[u['password']]
+    return users
+
+
+def seed_user_id(email):
+    # Stable _id for seeded users, so alerts can reference them across runs.
+    return ObjectId(hashlib.sha256(f"users:{email}".encode('utf-8')).digest()[:12])
+
+
+def loadtest_email(i):
+    return f"test{i}@loadtest.cruzroja.org.co"
+
+
+def geo_point(c):
+    return {'type': 'Point', 'coordinates': [c['lng'], c['lat']]}
+
+
+def geo_linestring(coords):
+    return {'type': 'LineString', 'coordinates': [[c['lng'], c['lat']] for c in coords]}
+
+
+def geo_circle(c, radius_m, segments=CIRCLE_SEGMENTS):
+    # Closed, counter-clockwise ring approximating the zone's radius.
+    ring = []
+    for i in range(segments):
+        angle = 2 * math.pi * i / segments
+        p = offset_coords(c['lat'], c['lng'], radius_m * math.cos(angle), radius_m * math.sin(angle))
+        ring.append([p['lng'], p['lat']])
+    ring.append(ring[0])
+    return {'type': 'Polygon', 'coordinates': [ring]}
+
+
+def route_difficulty(distance_m):
+    return 'easy' if distance_m < 600 else 'moderate' if distance_m < 1000 else 'difficult'
+
+
+def complete_route(route, start_name, end_name):
+    # The Route model wants numbered vertices, named ends, distance and
+    # difficulty; distance_m/estimated_time_min stay for older readers.
+    coords = [{'lat': float(c['lat']), 'lng': float(c['lng']), 'order': i}
+              for i, c in enumerate(route['coordinates'])]
+    route.update({
+        'coordinates': coords,
+        'startPoint': {'name': start_name, 'lat': coords[0]['lat'], 'lng': coords[0]['lng']},
+        'endPoint': {'name': end_name, 'lat': coords[-1]['lat'], 'lng': coords[-1]['lng']},
+        'distance': int(route['distance_m']),
+        'estimatedTime': int(route['estimated_time_min']),
+        'difficulty': route_difficulty(route['distance_m']),
+    })
+    return route
+
+
+def add_geometry(name, doc):
+    # riskzones also keep their center as a Point so $near still works on them.
+    if name == 'riskzones':
+        doc[GEO_FIELD] = geo_circle(doc['coordinates'], doc['radius'])
+        doc['center'] = geo_point(doc['coordinates'])
+    elif name == 'meetingpoints':
+        doc[GEO_FIELD] = geo_point(doc['coordinates'])
+    elif name == 'evacuationroutes' and len(doc.get('coordinates', [])) >= 2:
+        doc[GEO_FIELD] = geo_linestring(doc['coordinates'])
+    elif name == 'alerts' and doc.get('location', {}).get('coordinates'):
+        doc[GEO_FIELD] = geo_point(doc['location']['coordinates'])
+    return doc
+
+
+# Search: a weighted Spanish text index per collection, plus `searchTokens`,
+# the accent-folded lowercase words of the same fields ("Inundación" ->
+# "inundacion"), for exact, index-backed {searchTokens: {$all: [...]}} lookups.
+SEARCH_FIELDS = {
+    'alerts': ['title', 'description'],
+    'courses': ['title', 'description'],
+    'videos': ['title', 'description', 'tags'],
+    'resources': ['title', 'description', 'tags'],
+}
+SEARCH_WEIGHTS = {'title': 10, 'tags': 5, 'description': 2}
+SEARCH_STOPWORDS = {
+    'a', 'al', 'ante', 'con', 'de', 'del', 'el', 'en', 'es', 'la', 'las', 'lo', 'los', 'o', 'para',
+    'por', 'se', 'su', 'sus', 'un', 'una', 'y',
+}
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def fold_text(text):
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def search_tokens(doc, fields):
+    words = set()
+    for field in fields:
+        value = doc.get(field)
+        for text in value if isinstance(value, list) else [value]:
+            if isinstance(text, str):
+                words.update(TOKEN_RE.findall(fold_text(text)))
+    return sorted(words - SEARCH_STOPWORDS)
+
+
+def add_search_tokens(name, doc):
+    if name in SEARCH_FIELDS:
+        doc['searchTokens'] = search_tokens(doc, SEARCH_FIELDS[name])
+    return doc
+
+
+def load_hash_cache(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_hash_cache(path, cache):
+    if not path:
+        return
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(cache, f)
+    os.replace(tmp, path)
+
+
+def seed_documents():
+    # Plain documents, user passwords still in clear text.
+    # Users (passwords will be hashed)
     users = [
         {
+            '_id': seed_user_id("admin@cruzroja.org.co"),
             'name': "Admin Cruz Roja",
             'email': "admin@cruzroja.org.co",
             'password': "admin123",
@@ -43,6 +359,7 @@ def seed():
             'updatedAt': now(),
         },
         {
+            '_id': seed_user_id("maria.gonzalez@email.com"),
             'name': "Mar\u00eda Gonz\u00e1lez",
             'email': "maria.gonzalez@email.com",
             'password': "maria123",
@@ -52,6 +369,7 @@ def seed():
             'updatedAt': now(),
         },
         {
+            '_id': seed_user_id("carlos.rodriguez@email.com"),
             'name': "Carlos Rodr\u00edguez",
             'email': "carlos.rodriguez@email.com",
             'password': "carlos123",
@@ -62,17 +380,7 @@ def seed():
         },
     ]
 
-
-    # Hash passwords and insert users
-    for u in users:
-        pwd = u.pop('password', None)
-        if pwd is not None:
-            hashed = bcrypt.hashpw(pwd.encode('utf-8'), bcrypt.gensalt(rounds=10))
-            u['password'] = hashed.decode('utf-8', errors='ignore')
-    result = db['users'].insert_many(users)
-    print(f"Inserted {len(result.inserted_ids)} users")
-
-    # Insert into riskzones
+    # riskzones
     riskzones_docs = [
         {
             'name': "Danubio - Soacha",
@@ -97,11 +405,7 @@ def seed():
             'updatedAt': now(),
         },
     ]
-    if riskzones_docs:
-        res = db['riskzones'].insert_many(riskzones_docs)
-        print(f"Inserted {len(res.inserted_ids)} into riskzones")
-
-    # Insert into meetingpoints
+    # meetingpoints
     meetingpoints_docs = [
         {
             "name": "Colegio Local Danubio",
@@ -111,7 +415,7 @@ def seed():
             "capacity": 800,                     # estimado
             "facilities": ["Baños", "Agua potable", "Refugio temporal", "Espacio abierto"],
             "accessibility": True,
-            "contact": {"phone": "+57 1 XXX XXXX", "email": None},
+            "contact": {"phone": "+57 1 XXX XXXX"},
             "status": "active",
             "createdAt": datetime.now(),
             "updatedAt": datetime.now(),
@@ -124,7 +428,7 @@ def seed():
             "capacity": 500,
             "facilities": ["Baños", "Espacio interior", "Techo cubierto"],
             "accessibility": True,
-            "contact": {"phone": None, "email": None},
+            "contact": {"phone": "+57 1 XXX XXXX"},
             "status": "active",
             "createdAt": datetime.now(),
             "updatedAt": datetime.now(),
@@ -137,7 +441,7 @@ def seed():
             "capacity": 300,
             "facilities": ["Espacio abierto", "Iluminación", "Caminos pavimentados"],
             "accessibility": True,
-            "contact": {"phone": None, "email": None},
+            "contact": {"phone": "+57 1 XXX XXXX"},
             "status": "active",
             "createdAt": datetime.now(),
             "updatedAt": datetime.now(),
@@ -150,18 +454,14 @@ def seed():
             "capacity": 700,
             "facilities": ["Baños", "Comedor / comedor temporal", "Espacio cubierto"],
             "accessibility": True,
-            "contact": {"phone": "+57 1 XXX XXXX", "email": None},
+            "contact": {"phone": "+57 1 XXX XXXX"},
             "status": "active",
             "createdAt": datetime.now(),
             "updatedAt": datetime.now(),
         },
     ]
 
-    if meetingpoints_docs:
-        res = db['meetingpoints'].insert_many(meetingpoints_docs)
-        print(f"Inserted {len(res.inserted_ids)} into meetingpoints")
-
-    # Insert into evacuationroutes
+    # evacuationroutes
     evacuationroutes_docs = [
         {
             'name': "Ruta A - Danubio a Colegio Local Danubio",
@@ -251,20 +551,23 @@ def seed():
             'updatedAt': now(),
         },
     ]
+    route_ends = [
+        ("El Danubio", "Colegio Local Danubio"),
+        ("El Danubio", "Parque Local Danubio"),
+        ("Barrio La María", "Parroquia La María"),
+        ("Barrio La María", "Colegio La María"),
+        ("Barrio La María", "Vía Indumil"),
+    ]
+    evacuationroutes_docs = [complete_route(r, *ends) for r, ends in zip(evacuationroutes_docs, route_ends)]
 
-    if evacuationroutes_docs:
-        res = db['evacuationroutes'].insert_many(evacuationroutes_docs)
-        print(f"Inserted {len(res.inserted_ids)} into evacuationroutes")
-
-    
-    userId1 = "user_123"
-    adminId = "admin_456"
+    userId1 = seed_user_id("maria.gonzalez@email.com")
+    adminId = seed_user_id("admin@cruzroja.org.co")
 
     # Zonas reales
     zona1 = "Barrio La María"
     zona2 = "El Danubio"
 
-    # Insert into alerts
+    # alerts
     alerts_docs = [
         # Incidentes en Barrio La María
         {
@@ -323,7 +626,7 @@ def seed():
                 "address": f"{zona2}, Calle 20 #5-30",
                 "coordinates": {"lat": 4.574, "lng": -74.184},
             },
-            "status": "reported",
+            "status": "active",
             "userId": userId1,
             "assignedTo": adminId,
             "createdAt": datetime.now() - timedelta(hours=1),
@@ -331,11 +634,7 @@ def seed():
         }
     ]
 
-    if alerts_docs:
-        res = db['alerts'].insert_many(alerts_docs)
-        print(f"Inserted {len(res.inserted_ids)} into alerts")
-
-    # Insert into courses
+    # courses
     courses = [
         {
             "title": "Primeros Auxilios Básicos",
@@ -444,10 +743,6 @@ def seed():
         }
     ]
 
-    if courses:
-        res = db['courses'].insert_many(courses)
-        print(f"Inserted {len(res.inserted_ids)} into courses")
-
     videos = [
         {
             "title": "Primeros auxilios básicos - Cruz Roja",
@@ -517,10 +812,6 @@ def seed():
     ]
 
 
-    if videos:
-        res = db['videos'].insert_many(videos)
-        print(f"Inserted {len(res.inserted_ids)} into videos")
-
     resources = [
         {
             "title": "Guía de Primeros Auxilios Básicos",
@@ -594,10 +885,3523 @@ def seed():
         }
     ]
 
+    docs = {
+        'riskzones': riskzones_docs,
+        'meetingpoints': meetingpoints_docs,
+        'evacuationroutes': evacuationroutes_docs,
+        'alerts': alerts_docs,
+        'courses': courses,
+        'videos': videos,
+        'resources': resources,
+        'users': users,
+    }
+    for name, items in docs.items():
+        for d in items:
+            add_geometry(name, d)
+            add_search_tokens(name, d)
+    return docs
+
+
+def seed(hash_cache=None, batch_size=DEFAULT_BATCH_SIZE, write_concern=None, workers=None,
+         incremental=False, prune=False, engine='threads', pool_size=DEFAULT_POOL_SIZE):
+    if engine == 'async' and not incremental:
+        import asyncio
+        return asyncio.run(seed_async(hash_cache=hash_cache, batch_size=batch_size,
+                                      write_concern=write_concern, pool_size=pool_size))
+    with timer.stage('build'):
+        docs = seed_documents()
+    if incremental:
+        # Passwords are hashed only for users that actually changed.
+        prepare = {'users': lambda users: hash_user_passwords(users, cache=hash_cache)}
+        verify = {'users': lambda pairs: passwords_unchanged(pairs, cache=hash_cache)}
+        with timer.stage('upsert'):
+            return upsert_load(docs, prepare=prepare, verify=verify, batch_size=batch_size,
+                               write_concern=write_concern, workers=workers, prune=prune)
+
+    print("Clearing collections...")
+    with timer.stage('clear'):
+        for name in SEED_COLLECTIONS:
+            get_db()[name].delete_many({})
+
+    hash_user_passwords(docs['users'], cache=hash_cache)
+    with timer.stage('load'):
+        return bulk_load(docs, batch_size=batch_size, write_concern=write_concern, workers=workers)
+
+
+# ---------------------------------------------------------------------------
+# Bulk-write engine
+#
+# Every collection is fed by its own thread, which cuts the source iterable
+# into batches and hands them to a shared writer pool. A semaphore bounds the
+# number of batches in flight so a fast generator cannot queue up the whole
+# collection in memory. Batches are unordered: a bad document is reported but
+# does not stop the rest of its batch.
+# ---------------------------------------------------------------------------
+
+def batched(iterable, size):
+    it = iter(iterable)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_write_concern(value):
+    # "majority", "1", "0" or "<w>:j" for journaled writes.
+    if value is None:
+        return None
+    w, _, journal = value.partition(':')
+    w = int(w) if w.isdigit() else w
+    return WriteConcern(w=w, j=True if journal == 'j' else None)
+
+
+def get_collection(name, write_concern=None):
+    coll = get_db()[name]
+    if write_concern is not None:
+        coll = coll.with_options(write_concern=write_concern)
+    return coll
+
+
+def insert_batch(coll, batch):
+    # Returns (inserted, errors).
+    try:
+        res = coll.insert_many(batch, ordered=False)
+        return len(res.inserted_ids), 0
+    except BulkWriteError as e:
+        details = e.details
+        return details.get('nInserted', 0), len(details.get('writeErrors', []))
+
+
+def bulk_load(sources, batch_size=DEFAULT_BATCH_SIZE, write_concern=None, workers=None, max_in_flight=None):
+    # sources: {collection name: iterable of documents}
+    workers = workers or min(32, (os.cpu_count() or 1) * 4)
+    in_flight = threading.BoundedSemaphore(max_in_flight or workers * 2)
+    lock = threading.Lock()
+    stats = {name: {'inserted': 0, 'errors': 0, 'batches': 0, 'quarantined': 0} for name in sources}
+
+    def write(name, coll, batch):
+        try:
+            started = time.perf_counter()
+            inserted, errors = insert_batch(coll, batch)
+            timer.batch(name, time.perf_counter() - started, len(batch))
+            with lock:
+                stats[name]['inserted'] += inserted
+                stats[name]['errors'] += errors
+                stats[name]['batches'] += 1
+        finally:
+            in_flight.release()
+
+    def feed(name, docs, pool):
+        coll = get_collection(name, write_concern)
+        futures = []
+        for batch in source_batches(name, docs, batch_size):
+            if name in VALIDATED:
+                batch, invalid = validate_batch(name, batch)
+                with lock:
+                    stats[name]['quarantined'] += invalid
+                if not batch:
+                    continue
+            in_flight.acquire()
+            futures.append(pool.submit(write, name, coll, batch))
+        return futures
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        with ThreadPoolExecutor(max_workers=max(1, len(sources))) as feeders:
+            fed = [feeders.submit(feed, name, docs, pool) for name, docs in sources.items()]
+            for f in as_completed(fed):
+                for w in f.result():
+                    w.result()
+
+    print_load_stats(stats)
+    return stats
+
+
+def print_load_stats(stats):
+    for name, st in stats.items():
+        msg = f"Inserted {st['inserted']} into {name}"
+        if st['errors']:
+            msg += f" ({st['errors']} write errors)"
+        if st.get('quarantined'):
+            msg += f" ({st['quarantined']} failed validation)"
+        print(msg)
+
+
+def load(sources, batch_size=DEFAULT_BATCH_SIZE, write_concern=None, workers=None, engine='threads',
+         pool_size=DEFAULT_POOL_SIZE, prepare=None):
+    # Runs bulk_load or async_bulk_load over the same sources. `prepare` maps a
+    # collection to a function applied to each batch before it is written.
+    if engine == 'async':
+        import asyncio
+        return asyncio.run(async_bulk_load(sources, batch_size=batch_size, write_concern=write_concern,
+                                           pool_size=pool_size, prepare=prepare))
+    prepare = prepare or {}
+    sources = {name: prepared(docs, prepare[name], batch_size) if name in prepare else docs
+               for name, docs in sources.items()}
+    return bulk_load(sources, batch_size=batch_size, write_concern=write_concern, workers=workers)
+
+
+def prepared(docs, fn, batch_size):
+    for batch in batched(docs, batch_size):
+        yield from fn(batch)
+
+
+# ---------------------------------------------------------------------------
+# Sharded loading (--shard alerts --shard incidents=location.neighborhood,createdAt)
+#
+# Through mongos, a load of documents with growing createdAt sends nearly
+# every insert to the shard that owns the top of the key range. For
+# collections sharded on (zone field, createdAt) the loader instead:
+#   - samples the head of the stream for the leading field's values, splits
+#     the collection at evenly spaced values and spreads those chunks over
+#     the shards round-robin (split + moveChunk), before any bulk insert;
+#   - reads the chunk table back and routes each document to its shard, so
+#     every insert_many batch targets a single shard;
+#   - flushes a shard's buffer as soon as it is full, which interleaves
+#     batches across key ranges and keeps all shards writing.
+# Against a server that is not mongos the same plan is built over
+# --virtual-shards stand-in shards and the documents go to the plain
+# collection, so splitting and routing can be exercised on a single mongod.
+# ---------------------------------------------------------------------------
+
+DEFAULT_SHARD_KEYS = {
+    # Alert addresses start with the barrio, so ranges on them are zone ranges.
+    'alerts': ['location.address', 'createdAt'],
+    'incidents': ['location.neighborhood', 'createdAt'],
+}
+SHARD_KEYS = {}                # collection -> shard key fields; filled from --shard
+VIRTUAL_SHARDS = 2
+SPLIT_SAMPLE = 20000           # documents read ahead to choose split points
+SPLIT_MIN_SAMPLE = 1000        # smaller loads are not worth pre-splitting for
+CHUNKS_PER_SHARD = 4
+
+_routers = {}
+
+
+def get_path(doc, path):
+    for part in path.split('.'):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+class ShardRouter:
+    # Maps the leading shard-key field to a shard. `bounds` are the sorted
+    # lower bounds of the chunks after the first, paired with their shard.
+    def __init__(self, name, key, bounds, first_shard, virtual=False):
+        self.name = name
+        self.lead = key[0]
+        self.values = [v for v, _ in bounds]
+        self.shards = [first_shard] + [s for _, s in bounds]
+        self.virtual = virtual
+        self.counts = {}
+
+    def shard_of(self, doc):
+        value = get_path(doc, self.lead)
+        return self.shards[0 if value is None else bisect_right(self.values, value)]
+
+    def batches(self, docs, batch_size):
+        buffers = {}
+        for d in docs:
+            shard = self.shard_of(d)
+            buf = buffers.setdefault(shard, [])
+            buf.append(d)
+            if len(buf) >= batch_size:
+                self.counts[shard] = self.counts.get(shard, 0) + len(buf)
+                yield buf
+                buffers[shard] = []
+        for shard, buf in buffers.items():
+            if buf:
+                self.counts[shard] = self.counts.get(shard, 0) + len(buf)
+                yield buf
+        per_shard = ", ".join(f"{s} {n}" for s, n in sorted(self.counts.items()))
+        kind = "virtual shards" if self.virtual else "shards"
+        print(f"{self.name}: {len(self.values) + 1} chunks over {len(set(self.shards))} {kind} ({per_shard})")
+
+
+def split_values(key, sample, chunks):
+    values = sorted({v for v in (get_path(d, key[0]) for d in sample) if v is not None})
+    chunks = min(chunks, len(values))
+    return [values[i * len(values) // chunks] for i in range(1, chunks)]
+
+
+def is_mongos():
+    try:
+        return get_client().admin.command('hello').get('msg') == 'isdbgrid'
+    except (OperationFailure, NotImplementedError):
+        return False
+
+
+def chunk_bound(key, value):
+    # Chunk boundary at `value` of the leading field, below every later field.
+    return SON([(key[0], value)] + [(f, MinKey()) for f in key[1:]])
+
+
+def presplit(name, key, sample):
+    admin = get_client().admin
+    ns = f"{get_db().name}.{name}"
+    shards = [s['_id'] for s in admin.command('listShards')['shards']]
+    # shardCollection needs the shard key index when the collection has data.
+    get_db()[name].create_index([(f, ASCENDING) for f in key])
+    try:
+        admin.command('enableSharding', get_db().name)
+        admin.command('shardCollection', ns, key=SON((f, 1) for f in key))
+    except OperationFailure as e:
+        if 'already' not in str(e):
+            raise
+    # Chunks carry `ns` before 5.0 and the collection's `uuid` from 5.0 on.
+    meta = get_client().config.collections.find_one({'_id': ns}) or {}
+    chunk_query = {'$or': [{'ns': ns}, {'uuid': meta['uuid']}]} if 'uuid' in meta else {'ns': ns}
+    if get_client().config.chunks.count_documents(chunk_query) == 1:
+        splits = split_values(key, sample, len(shards) * CHUNKS_PER_SHARD)
+        for v in splits:
+            admin.command('split', ns, middle=chunk_bound(key, v))
+        for i, v in enumerate([MinKey()] + splits):
+            try:
+                admin.command('moveChunk', ns, find=chunk_bound(key, v), to=shards[i % len(shards)],
+                              _waitForDelete=False)
+            except OperationFailure as e:
+                if 'already' not in str(e):
+                    raise
+    bounds, first = [], shards[0]
+    for c in get_client().config.chunks.find(chunk_query).sort('min', ASCENDING):
+        lower = c['min'][key[0]]
+        if isinstance(lower, MinKey):
+            first = c['shard']
+        elif not isinstance(lower, MaxKey) and (not bounds or bounds[-1][0] != lower):
+            bounds.append((lower, c['shard']))
+    return ShardRouter(name, key, bounds, first)
+
+
+def shard_router(name, key, sample):
+    if is_mongos():
+        return presplit(name, key, sample)
+    shards = [f"shard{i}" for i in range(VIRTUAL_SHARDS)]
+    splits = split_values(key, sample, VIRTUAL_SHARDS * CHUNKS_PER_SHARD)
+    bounds = [(v, shards[(i + 1) % len(shards)]) for i, v in enumerate(splits)]
+    return ShardRouter(name, key, bounds, shards[0], virtual=True)
+
+
+def source_batches(name, docs, batch_size):
+    # What bulk_load and async_bulk_load cut each source into: plain batches,
+    # or single-shard batches for collections in SHARD_KEYS.
+    if name not in SHARD_KEYS:
+        return batched(docs, batch_size)
+    docs = iter(docs)
+    sample = list(islice(docs, SPLIT_SAMPLE))
+    router = _routers.get(name)
+    if router is None:
+        if len(sample) < SPLIT_MIN_SAMPLE:
+            # The whole source fit in the sample; load it without splitting.
+            return batched(sample, batch_size)
+        router = _routers[name] = shard_router(name, SHARD_KEYS[name], sample)
+    return router.batches(chain(sample, docs), batch_size)
+
+
+def parse_shard_spec(spec):
+    # "incidents" (default key) or "incidents=location.neighborhood,createdAt".
+    name, _, fields = spec.partition('=')
+    if fields:
+        return name, fields.split(',')
+    if name not in DEFAULT_SHARD_KEYS:
+        raise SystemExit(f"--shard {name}: no default shard key, use {name}=field1,field2")
+    return name, DEFAULT_SHARD_KEYS[name]
+
+
+# ---------------------------------------------------------------------------
+# Async engine (--engine async)
+#
+# One asyncio pipeline per collection with three stages that overlap:
+# generating the next batch (in a thread, since the generators are plain
+# Python), preparing it (e.g. bcrypt through the process pool) and writing
+# it. A small queue between the first two stages and a semaphore on writes
+# in flight give backpressure, so the generator never runs ahead by more
+# than a few batches. Writes go through Motor with a connection pool of
+# --pool-size; without Motor the same pipeline drives pymongo from a thread
+# pool of that size.
+# ---------------------------------------------------------------------------
+
+PIPELINE_DEPTH = 2             # batches generated ahead of the prepare stage
+
+
+class ThreadedCollection:
+    # The few awaitable Motor collection methods the async engine uses,
+    # implemented on a pymongo collection.
+    def __init__(self, coll, executor):
+        self.coll = coll
+        self.executor = executor
+
+    async def _run(self, fn, *args, **kwargs):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, partial(fn, *args, **kwargs))
+
+    async def insert_many(self, docs, **kwargs):
+        return await self._run(self.coll.insert_many, docs, **kwargs)
+
+    async def delete_many(self, query, **kwargs):
+        return await self._run(self.coll.delete_many, query, **kwargs)
+
+
+class AsyncEngine:
+    # Writes to `database`, by default the one behind get_db(). Motor opens its
+    # own connection, which it can only do from the URI get_client() used; a
+    # database set by use_database() or passed in is written from threads.
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, database=None):
+        self.pool_size = pool_size
+        self.database = get_db() if database is None else database
+        try:
+            from motor.motor_asyncio import AsyncIOMotorClient
+        except ImportError:  # fall back to pymongo in worker threads
+            AsyncIOMotorClient = None
+        if AsyncIOMotorClient is not None and database is None and _client_uri is not None:
+            self.client = AsyncIOMotorClient(_client_uri, maxPoolSize=pool_size)
+            self.executor = None
+        else:
+            self.client = None
+            self.executor = ThreadPoolExecutor(max_workers=pool_size)
+
+    def collection(self, name, write_concern=None):
+        if self.client is None:
+            coll = self.database[name]
+            if write_concern is not None:
+                coll = coll.with_options(write_concern=write_concern)
+            return ThreadedCollection(coll, self.executor)
+        coll = self.client[self.database.name][name]
+        if write_concern is not None:
+            coll = coll.with_options(write_concern=write_concern)
+        return coll
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        else:
+            self.executor.shutdown()
+
+
+async def async_insert_batch(coll, batch):
+    try:
+        res = await coll.insert_many(batch, ordered=False)
+        return len(res.inserted_ids), 0
+    except BulkWriteError as e:
+        details = e.details
+        return details.get('nInserted', 0), len(details.get('writeErrors', []))
+
+
+async def async_bulk_load(sources, batch_size=DEFAULT_BATCH_SIZE, write_concern=None, pool_size=DEFAULT_POOL_SIZE,
+                          max_in_flight=None, prepare=None, engine=None):
+    # Same contract as bulk_load. Pass `engine` to share one client between calls.
+    import asyncio
+    prepare = prepare or {}
+    own_engine = engine is None
+    engine = engine or AsyncEngine(pool_size)
+    loop = asyncio.get_running_loop()
+    in_flight = asyncio.Semaphore(max_in_flight or engine.pool_size)
+    stats = {name: {'inserted': 0, 'errors': 0, 'batches': 0, 'quarantined': 0} for name in sources}
+    done = object()
+
+    async def write(name, coll, batch):
+        try:
+            started = time.perf_counter()
+            inserted, errors = await async_insert_batch(coll, batch)
+            timer.batch(name, time.perf_counter() - started, len(batch))
+            stats[name]['inserted'] += inserted
+            stats[name]['errors'] += errors
+            stats[name]['batches'] += 1
+        finally:
+            in_flight.release()
+
+    async def generate(name, docs, queue):
+        # A failing source still ends its queue, so pipeline stops waiting and
+        # re-raises the error from `await producer`.
+        try:
+            batches = iter(await loop.run_in_executor(None, source_batches, name, docs, batch_size))
+            while True:
+                batch = await loop.run_in_executor(None, next, batches, done)
+                await queue.put(batch)
+                if batch is done:
+                    return
+        except asyncio.CancelledError:
+            raise
+        except BaseException:
+            await queue.put(done)
+            raise
+
+    async def cancel(tasks):
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def pipeline(name, docs):
+        coll = engine.collection(name, write_concern)
+        fn = prepare.get(name)
+        queue = asyncio.Queue(maxsize=PIPELINE_DEPTH)
+        producer = asyncio.create_task(generate(name, docs, queue))
+        writes = []
+        try:
+            while (batch := await queue.get()) is not done:
+                if fn is not None:
+                    batch = await loop.run_in_executor(None, fn, batch)
+                if name in VALIDATED:
+                    batch, invalid = await loop.run_in_executor(None, validate_batch, name, batch)
+                    stats[name]['quarantined'] += invalid
+                    if not batch:
+                        continue
+                await in_flight.acquire()
+                writes.append(asyncio.create_task(write(name, coll, batch)))
+            await producer
+            await asyncio.gather(*writes)
+        except BaseException:
+            await cancel([producer] + writes)
+            raise
+
+    pipelines = [asyncio.create_task(pipeline(name, docs)) for name, docs in sources.items()]
+    try:
+        await asyncio.gather(*pipelines)
+    except BaseException:
+        # One failed collection stops the others before the client is closed.
+        await cancel(pipelines)
+        raise
+    finally:
+        if own_engine:
+            engine.close()
+    print_load_stats(stats)
+    return stats
+
+
+async def seed_async(hash_cache=None, batch_size=DEFAULT_BATCH_SIZE, write_concern=None,
+                     pool_size=DEFAULT_POOL_SIZE):
+    # Non-incremental seed() on the async engine: passwords are hashed in the
+    # users pipeline while the other collections are already being written.
+    import asyncio
+    engine = AsyncEngine(pool_size)
+    try:
+        with timer.stage('build'):
+            docs = seed_documents()
+        print("Clearing collections...")
+        with timer.stage('clear'):
+            await asyncio.gather(*(engine.collection(name).delete_many({}) for name in SEED_COLLECTIONS))
+        prepare = {'users': partial(hash_user_passwords, cache=hash_cache)}
+        with timer.stage('load'):
+            return await async_bulk_load(docs, batch_size=batch_size, write_concern=write_concern,
+                                         prepare=prepare, engine=engine)
+    finally:
+        engine.close()
+
+
+# ---------------------------------------------------------------------------
+# Incremental seeding (--incremental)
+#
+# Instead of wiping collections, every seed document is matched on its natural
+# key (SEED_KEYS) and carries a `seedHash` of its content. Only new or changed
+# documents are upserted, so an unchanged reseed reads a few keys and writes
+# nothing, and readers never see an empty collection.
+# ---------------------------------------------------------------------------
+
+def content_hash(doc):
+    stable = {k: v for k, v in doc.items() if k not in VOLATILE_FIELDS and k not in SECRET_FIELDS}
+    raw = json.dumps(stable, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def upsert_changed(name, docs, key=None, prepare=None, verify=None, batch_size=DEFAULT_BATCH_SIZE,
+                   write_concern=None):
+    # Returns (seen keys, stats). `prepare` runs on changed documents only,
+    # after hashing, e.g. to bcrypt user passwords. `verify` gets
+    # [(doc, stored doc)] for documents whose seedHash matches and says which
+    # are really unchanged, for SECRET_FIELDS that the hash leaves out.
+    key = key or SEED_KEYS[name]
+    coll = get_collection(name, write_concern)
+    seen = set()
+    stats = {'upserted': 0, 'modified': 0, 'unchanged': 0, 'errors': 0, 'quarantined': 0}
+    for batch in batched(docs, batch_size):
+        for d in batch:
+            d['seedHash'] = content_hash(d)
+        keys = [d[key] for d in batch]
+        seen.update(keys)
+        projection = {key: 1, 'seedHash': 1, '_id': 0}
+        if verify is not None:
+            projection.update({f: 1 for f in SECRET_FIELDS})
+        current = {e[key]: e for e in coll.find({key: {'$in': keys}}, projection)}
+        same = [d for d in batch if d[key] in current and current[d[key]].get('seedHash') == d['seedHash']]
+        if verify is not None and same:
+            same = [d for d, ok in zip(same, verify([(d, current[d[key]]) for d in same])) if ok]
+        same = {id(d) for d in same}
+        changed = [d for d in batch if id(d) not in same]
+        stats['unchanged'] += len(batch) - len(changed)
+        if not changed:
+            continue
+        if prepare is not None:
+            prepare(changed)
+        if name in VALIDATED:
+            changed, invalid = validate_batch(name, changed)
+            stats['quarantined'] += invalid
+        ops = []
+        for d in changed:
+            fields = {k: v for k, v in d.items() if k not in ('_id', 'createdAt')}
+            fields.setdefault('updatedAt', now())
+            on_insert = {'createdAt': d.get('createdAt', now())}
+            if '_id' in d:
+                on_insert['_id'] = d['_id']
+            ops.append(UpdateOne({key: d[key]}, {'$set': fields, '$setOnInsert': on_insert}, upsert=True))
+        try:
+            res = coll.bulk_write(ops, ordered=False)
+            stats['upserted'] += res.upserted_count
+            stats['modified'] += res.modified_count
+        except BulkWriteError as e:
+            stats['upserted'] += e.details.get('nUpserted', 0)
+            stats['modified'] += e.details.get('nModified', 0)
+            stats['errors'] += len(e.details.get('writeErrors', []))
+    return seen, stats
+
+
+def prune_removed(name, seen, key=None, write_concern=None):
+    # Only documents that came from a previous seed (have seedHash) are removed;
+    # anything created through the app is left alone.
+    key = key or SEED_KEYS[name]
+    coll = get_collection(name, write_concern)
+    return coll.delete_many({'seedHash': {'$exists': True}, key: {'$nin': list(seen)}}).deleted_count
+
+
+def upsert_load(sources, prepare=None, verify=None, batch_size=DEFAULT_BATCH_SIZE, write_concern=None,
+                workers=None, prune=False):
+    prepare = prepare or {}
+    verify = verify or {}
+
+    def run(name, docs):
+        seen, st = upsert_changed(name, docs, prepare=prepare.get(name), verify=verify.get(name),
+                                  batch_size=batch_size, write_concern=write_concern)
+        if prune:
+            st['pruned'] = prune_removed(name, seen, write_concern=write_concern)
+        return st
+
+    with ThreadPoolExecutor(max_workers=workers or max(1, len(sources))) as pool:
+        futures = {name: pool.submit(run, name, docs) for name, docs in sources.items()}
+        stats = {name: f.result() for name, f in futures.items()}
+
+    for name, st in stats.items():
+        msg = (f"{name}: {st['upserted']} new, {st['modified']} updated, "
+               f"{st['unchanged']} unchanged")
+        if st.get('pruned'):
+            msg += f", {st['pruned']} removed"
+        if st['errors']:
+            msg += f" ({st['errors']} write errors)"
+        if st['quarantined']:
+            msg += f" ({st['quarantined']} failed validation)"
+        print(msg)
+    return stats
+
+# ---------------------------------------------------------------------------
+# Synthetic load-scale data (--scale N)
+#
+# Everything below is generated lazily and inserted in fixed-size batches, so
+# memory use depends on the batch size and not on N. Each collection gets its
+# own Random derived from --seed, so the same seed and base date always
+# produce the same documents regardless of which collections are generated.
+# Generated documents carry seedSource "scale", and a rerun deletes those
+# before generating again, leaving seed(), history and app data alone.
+# ---------------------------------------------------------------------------
+
+SCALE_MARK = 'scale'           # seedSource of --scale documents; reruns replace them
+SOACHA_CENTER = {"lat": 4.5794, "lng": -74.2168}
+SCALE_SPREAD_M = 6000          # how far from the center synthetic zones go
+
+SOACHA_BARRIOS = [
+    "Danubio", "La María", "Ciudadela Sucre", "Altos de Cazucá", "San Mateo",
+    "León XIII", "Compartir", "El Porvenir", "Ciudad Verde", "Terreros",
+    "San Humberto", "La Despensa", "Quintanares", "Olivos", "Santa Ana",
+    "El Silo", "Ducales", "Hogares Soacha", "Rincón de Santafé", "Cagua",
+]
+
+ALERT_TYPES = ["incendio", "inundacion", "terremoto", "deslizamiento", "otro"]
+ALERT_TYPE_WEIGHTS = [15, 40, 3, 30, 12]
+ALERT_SEVERITIES = ["baja", "media", "alta", "critica"]
+ALERT_SEVERITY_WEIGHTS = [40, 35, 20, 5]
+ALERT_STATUSES = ["active", "in-progress", "resolved"]
+ALERT_STATUS_WEIGHTS = [20, 15, 65]
+
+INCIDENT_TYPES = ["medical", "fire", "flood", "earthquake", "accident", "other"]
+INCIDENT_TYPE_WEIGHTS = [30, 12, 28, 2, 20, 8]
+INCIDENT_SEVERITIES = ["low", "medium", "high", "critical"]
+INCIDENT_SEVERITY_WEIGHTS = [40, 35, 20, 5]
+INCIDENT_STATUSES = ["reported", "in-progress", "resolved", "closed"]
+INCIDENT_STATUS_WEIGHTS = [15, 15, 55, 15]
+
+ZONE_TYPES = ["flood", "earthquake", "fire", "landslide", "multiple"]
+ZONE_LEVELS = ["low", "medium", "high", "critical"]
+
+ALERT_TITLES = {
+    "incendio": "Incendio en",
+    "inundacion": "Inundación en",
+    "terremoto": "Sismo reportado en",
+    "deslizamiento": "Deslizamiento de tierra en",
+    "otro": "Emergencia en",
+}
+INCIDENT_TITLES = {
+    "medical": "Emergencia médica en",
+    "fire": "Incendio en",
+    "flood": "Inundación en",
+    "earthquake": "Daños por sismo en",
+    "accident": "Accidente en",
+    "other": "Incidente en",
+}
+
+
+def scale_rng(seed, name):
+    # Independent stream per collection, stable across runs for the same seed.
+    if seed is None:
+        return random.Random()
+    return random.Random(f"{seed}:{name}")
+
+
+def offset_coords(lat, lng, dx_m, dy_m):
+    dlat = dy_m / 111320.0
+    dlng = dx_m / (111320.0 * math.cos(math.radians(lat)))
+    return {"lat": round(lat + dlat, 6), "lng": round(lng + dlng, 6)}
+
+
+def scatter(rng, center, sigma_m):
+    return offset_coords(center["lat"], center["lng"], rng.gauss(0, sigma_m), rng.gauss(0, sigma_m))
+
+
+def barrio_name(i):
+    base = SOACHA_BARRIOS[i % len(SOACHA_BARRIOS)]
+    # Always numbered, so synthetic zones never share a name with the
+    # hand-written "Danubio - Soacha" and "La María - Soacha".
+    return f"{base} Sector {i // len(SOACHA_BARRIOS) + 1}"
+
+
+def scale_counts(n):
+    zones = max(10, min(n // 1000, 20000))
+    return {
+        "riskzones": zones,
+        "evacuationroutes": zones * 2,
+        "alerts": n,
+        "incidents": n,
+    }
+
+
+def gen_riskzones(count, rng, base):
+    for i in range(count):
+        barrio = barrio_name(i)
+        created = base - timedelta(days=rng.randint(30, 720))
+        yield add_geometry("riskzones", {
+            "name": f"{barrio} - Soacha",
+            "description": f"Barrio {barrio} en Soacha, Cundinamarca",
+            "type": rng.choice(ZONE_TYPES),
+            "level": rng.choices(ZONE_LEVELS, weights=[30, 35, 25, 10])[0],
+            "coordinates": scatter(rng, SOACHA_CENTER, SCALE_SPREAD_M / 2),
+            "radius": rng.choice([500, 750, 1000, 1500]),
+            "population": rng.randint(800, 12000),
+            "createdAt": created,
+            "updatedAt": created,
+        })
+
+
+def gen_evacuationroutes(zones, per_zone, rng, base):
+    for z in zones:
+        center = z["coordinates"]
+        for k in range(per_zone):
+            # Walk outwards from inside the zone towards a safer point.
+            heading = rng.uniform(0, 2 * math.pi)
+            start = offset_coords(center["lat"], center["lng"], rng.gauss(0, 150), rng.gauss(0, 150))
+            steps = rng.randint(3, 8)
+            step_m = rng.uniform(80, 160)
+            coords = [start]
+            for _ in range(steps - 1):
+                heading += rng.gauss(0, 0.35)
+                last = coords[-1]
+                coords.append(offset_coords(last["lat"], last["lng"],
+                                            step_m * math.cos(heading), step_m * math.sin(heading)))
+            distance = int(step_m * (steps - 1))
+            yield add_geometry("evacuationroutes", complete_route({
+                "name": f"Ruta {chr(65 + k)} - {z['name']}",
+                "description": f"Ruta de evacuación desde {z['name']} hacia zona segura.",
+                "coordinates": coords,
+                "distance_m": distance,
+                "estimated_time_min": max(1, round(distance / 80)),
+                "status": rng.choices(["active", "inactive", "blocked"], weights=[90, 5, 5])[0],
+                "createdAt": base - timedelta(days=rng.randint(1, 365)),
+                "updatedAt": base,
+            }, z['name'], "Zona segura"))
+
+
+def seeded_user_ids():
+    # Alerts reference users that exist: whatever `users` holds (seed() and
+    # --users run before --scale and --history), sorted so a seed is stable.
+    return [u['_id'] for u in get_db()['users'].find({}, {'_id': 1}).sort('_id', ASCENDING)]
+
+
+def gen_alerts(count, rng, zones, base, history_days=180, reporters=None):
+    for _ in range(count):
+        z = rng.choice(zones)
+        created = base - timedelta(minutes=rng.randint(0, history_days * 24 * 60))
+        yield make_alert(rng, z, created, reporters=reporters)
+
+
+def make_alert(rng, z, created, kind=None, status=None, reporters=None):
+    # `reporters`: user _ids to draw userId from; without any, the
+    # hand-written citizen account reports everything.
+    barrio = z["name"].replace(" - Soacha", "")
+    kind = kind or rng.choices(ALERT_TYPES, weights=ALERT_TYPE_WEIGHTS)[0]
+    status = status or rng.choices(ALERT_STATUSES, weights=ALERT_STATUS_WEIGHTS)[0]
+    updated = created + timedelta(minutes=rng.randint(5, 48 * 60))
+    doc = {
+        "title": f"{ALERT_TITLES[kind]} {barrio}",
+        "description": f"Reporte ciudadano en {barrio}. Equipo de la Cruz Roja en camino.",
+        "type": kind,
+        "severity": rng.choices(ALERT_SEVERITIES, weights=ALERT_SEVERITY_WEIGHTS)[0],
+        "location": {
+            "address": f"{barrio}, Calle {rng.randint(1, 60)} #{rng.randint(1, 40)}-{rng.randint(1, 99)}",
+            "coordinates": scatter(rng, z["coordinates"], z["radius"] / 2),
+        },
+        "status": status,
+        "userId": rng.choice(reporters) if reporters else seed_user_id("maria.gonzalez@email.com"),
+        "assignedTo": seed_user_id("admin@cruzroja.org.co"),
+        "createdAt": created,
+        "updatedAt": updated,
+    }
+    if status == "resolved":
+        doc["resolvedAt"] = updated
+    return add_search_tokens("alerts", add_geometry("alerts", doc))
+
+
+def gen_incidents(count, rng, zones, base, history_days=180):
+    for _ in range(count):
+        z = rng.choice(zones)
+        created = base - timedelta(minutes=rng.randint(0, history_days * 24 * 60))
+        yield make_incident(rng, z, created)
+
+
+def make_incident(rng, z, created, kind=None, status=None):
+    barrio = z["name"].replace(" - Soacha", "")
+    kind = kind or rng.choices(INCIDENT_TYPES, weights=INCIDENT_TYPE_WEIGHTS)[0]
+    status = status or rng.choices(INCIDENT_STATUSES, weights=INCIDENT_STATUS_WEIGHTS)[0]
+    point = scatter(rng, z["coordinates"], z["radius"] / 2)
+    doc = {
+        "title": f"{INCIDENT_TITLES[kind]} {barrio}",
+        "description": f"Incidente reportado en {barrio}, Soacha.",
+        "type": kind,
+        "severity": rng.choices(INCIDENT_SEVERITIES, weights=INCIDENT_SEVERITY_WEIGHTS)[0],
+        "status": status,
+        "location": {
+            "type": "Point",
+            "coordinates": [point["lng"], point["lat"]],
+            "address": f"{barrio}, Calle {rng.randint(1, 60)} #{rng.randint(1, 40)}-{rng.randint(1, 99)}",
+            "city": "Soacha",
+            "department": "Cundinamarca",
+            "neighborhood": barrio,
+        },
+        "reporter": {"name": f"Ciudadano {rng.randint(1, 50000)}"},
+        "attachments": [],
+        "affectedPeople": rng.choices([0, 1, 2, 5, 10, 25, 100], weights=[20, 30, 20, 15, 8, 5, 2])[0],
+        "createdAt": created,
+        "updatedAt": created,
+    }
+    if status != "reported":
+        assigned = created + timedelta(minutes=rng.randint(2, 30))
+        team = {"teamId": f"team_{rng.randint(1, 40)}", "assignedAt": assigned}
+        if status in ("resolved", "closed"):
+            arrived = assigned + timedelta(minutes=rng.randint(5, 60))
+            resolved = arrived + timedelta(minutes=rng.randint(15, 480))
+            team["arrivedAt"] = arrived
+            team["resolvedAt"] = resolved
+            doc["resolvedAt"] = resolved
+            doc["updatedAt"] = resolved
+        else:
+            doc["updatedAt"] = assigned
+        doc["responseTeam"] = team
+    return doc
+
+
+def seed_scale(n, seed=None, batch_size=DEFAULT_BATCH_SIZE, base=None, write_concern=None, workers=None,
+               engine='threads', pool_size=DEFAULT_POOL_SIZE):
+    if base is None:
+        base = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    counts = scale_counts(n)
+    print(f"Generating synthetic data (scale={n}, seed={seed}): {counts}")
+    for name in counts:
+        get_db()[name].delete_many({'seedSource': SCALE_MARK})
+
+    # Zones are the only thing held in memory; everything else streams.
+    zones = list(gen_riskzones(counts["riskzones"], scale_rng(seed, "riskzones"), base))
+    per_zone = counts["evacuationroutes"] // counts["riskzones"]
+    sources = {
+        "riskzones": (dict(z) for z in zones),
+        "evacuationroutes": gen_evacuationroutes(zones, per_zone, scale_rng(seed, "evacuationroutes"), base),
+        "alerts": gen_alerts(counts["alerts"], scale_rng(seed, "alerts"), zones, base, reporters=seeded_user_ids()),
+        "incidents": gen_incidents(counts["incidents"], scale_rng(seed, "incidents"), zones, base),
+    }
+    with timer.stage('scale'):
+        return load({name: tagged(docs, SCALE_MARK) for name, docs in sources.items()}, batch_size=batch_size,
+                    write_concern=write_concern, workers=workers, engine=engine, pool_size=pool_size)
+
+
+def tagged(docs, source):
+    for d in docs:
+        d['seedSource'] = source
+        yield d
+
+
+def gen_users(count, rng, base):
+    # Test accounts for auth load tests; password for user i is "test<i>".
+    first = ["Ana", "Luis", "María", "Carlos", "Sofía", "Jorge", "Laura", "Andrés", "Paula", "Diego"]
+    last = ["González", "Rodríguez", "Martínez", "Gómez", "López", "Díaz", "Torres", "Ramírez"]
+    for i in range(count):
+        created = base - timedelta(days=rng.randint(0, 365))
+        yield {
+            '_id': seed_user_id(loadtest_email(i)),
+            'name': f"{rng.choice(first)} {rng.choice(last)}",
+            'email': loadtest_email(i),
+            'password': f"test{i}",
+            'role': "user",
+            'phone': f"+57 3{rng.randint(0, 29):02d} {rng.randint(100, 999)} {rng.randint(1000, 9999)}",
+            'createdAt': created,
+            'updatedAt': created,
+        }
+
+
+def hashed_users(users, pool, batch_size=DEFAULT_BATCH_SIZE, hash_cache=None):
+    cache = {} if hash_cache is None else hash_cache
+    for batch in batched(users, batch_size):
+        yield from hash_user_passwords(batch, cache=cache, pool=pool)
+        # Only keep the cache growing when the caller wants it persisted.
+        if hash_cache is None:
+            cache.clear()
+
+
+def seed_users(n, seed=None, batch_size=DEFAULT_BATCH_SIZE, base=None, hash_workers=None, hash_cache=None,
+               write_concern=None, workers=None, incremental=False, engine='threads', pool_size=DEFAULT_POOL_SIZE):
+    if base is None:
+        base = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    with timer.stage('users'), ProcessPoolExecutor(max_workers=hash_workers) as pool:
+        if incremental:
+            prepare = {'users': lambda users: hash_user_passwords(users, cache=hash_cache, pool=pool)}
+            verify = {'users': lambda pairs: passwords_unchanged(pairs, cache=hash_cache, pool=pool)}
+            return upsert_load({'users': gen_users(n, scale_rng(seed, "users"), base)}, prepare=prepare,
+                               verify=verify, batch_size=batch_size, write_concern=write_concern, workers=workers)
+        if engine == 'async':
+            # Hashing is a pipeline stage of its own, overlapping generation and inserts.
+            cache = {} if hash_cache is None else hash_cache
+
+            def prepare(batch):
+                hash_user_passwords(batch, cache=cache, pool=pool)
+                if hash_cache is None:
+                    cache.clear()
+                return batch
+            return load({'users': gen_users(n, scale_rng(seed, "users"), base)}, batch_size=batch_size,
+                        write_concern=write_concern, engine=engine, pool_size=pool_size,
+                        prepare={'users': prepare})
+        users = hashed_users(gen_users(n, scale_rng(seed, "users"), base), pool,
+                             batch_size=batch_size, hash_cache=hash_cache)
+        return bulk_load({'users': users}, batch_size=batch_size, write_concern=write_concern, workers=workers)
+
+
+# ---------------------------------------------------------------------------
+# Alert / incident history (--history YEARS)
+#
+# Years of events over the riskzones already in the database, with the skew
+# real data has: a diurnal curve, Soacha's two rainy seasons (April-May and
+# October-November), and storms that hit one zone for a few hours and produce
+# a burst of flood and landslide reports. Time advances an hour at a time and
+# each hour's events are sorted before being yielded, so the output streams
+# in createdAt order with memory bounded by one hour of events.
+#
+# Storms come from their own random stream, so alerts and incidents generated
+# with the same --seed see the same storms.
+# ---------------------------------------------------------------------------
+
+HISTORY_MARK = 'history'       # seedSource of generated history; reruns replace it
+TIMESERIES_SUFFIX = '_ts'
+# The factors below are Soacha local time; createdAt is stored as naive UTC.
+HISTORY_TZ = ZoneInfo('America/Bogota')
+# Relative event rate per hour of day (mean 1): quiet nights, commute peaks,
+# and the afternoon convective rains.
+HOUR_FACTORS = [0.35, 0.3, 0.25, 0.25, 0.3, 0.5, 0.8, 1.2, 1.3, 1.1, 1.0, 1.0,
+                1.1, 1.2, 1.4, 1.6, 1.7, 1.6, 1.5, 1.3, 1.1, 0.9, 0.7, 0.5]
+# When storms start; they mostly build up in the afternoon.
+STORM_HOUR_FACTORS = [0.3, 0.2, 0.2, 0.2, 0.2, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0,
+                      1.3, 1.8, 2.4, 2.8, 2.8, 2.4, 1.8, 1.3, 0.9, 0.6, 0.4, 0.3]
+# Relative rate per month (mean 1), following the bimodal rainy season.
+MONTH_FACTORS = [0.7, 0.75, 1.0, 1.45, 1.4, 0.85, 0.65, 0.65, 0.9, 1.4, 1.5, 0.95]
+ZONE_LEVEL_WEIGHTS = {"low": 1, "medium": 2, "high": 4, "critical": 6}
+STORM_ZONE_TYPES = ("flood", "landslide", "multiple")
+STORM_SHARE = 0.25             # fraction of events that come from storms
+STORMS_PER_DAY = 0.4           # across the whole city, on an average day
+STORM_HOURS = (2, 10)
+STORM_DECAY = 0.6              # each storm hour brings this fraction of the previous one's reports
+STORM_ALERT_TYPES = ["inundacion", "deslizamiento"]
+STORM_INCIDENT_TYPES = ["flood", "accident", "medical"]
+OPEN_WINDOW = timedelta(days=3)  # only events this recent can still be open
+
+
+def local_time(t):
+    return t.replace(tzinfo=timezone.utc).astimezone(HISTORY_TZ)
+
+
+def normalized(factors):
+    mean = sum(factors) / len(factors)
+    return [f / mean for f in factors]
+
+
+def poisson(rng, lam):
+    if lam <= 0:
+        return 0
+    if lam > 30:
+        return max(0, round(rng.gauss(lam, math.sqrt(lam))))
+    # Knuth; fine for the small per-hour rates used here.
+    limit, k, p = math.exp(-lam), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+def zone_weight(z):
+    return ZONE_LEVEL_WEIGHTS.get(z.get("level"), 1) * math.sqrt(max(z.get("population") or 1000, 1))
+
+
+def gen_storms(rng, zones, start, end):
+    # Yields (start, zone index, per-hour intensities summing to 1) in start order.
+    hour_f, month_f = normalized(STORM_HOUR_FACTORS), normalized(MONTH_FACTORS)
+    weights = [zone_weight(z) * (2 if z.get("type") in STORM_ZONE_TYPES else 1) for z in zones]
+    cum = list(accumulate(weights))
+    t = start
+    while t < end:
+        # Storms are even more seasonal than the background.
+        local = local_time(t)
+        lam = STORMS_PER_DAY / 24 * hour_f[local.hour] * month_f[local.month - 1] ** 2
+        for offset in sorted(rng.uniform(0, 3600) for _ in range(poisson(rng, lam))):
+            zone = rng.choices(range(len(zones)), cum_weights=cum)[0]
+            hours = rng.randint(*STORM_HOURS)
+            shape = [STORM_DECAY ** h for h in range(hours)]
+            strength = rng.lognormvariate(0, 0.75)
+            yield t + timedelta(seconds=offset), zone, [strength * f / sum(shape) for f in shape]
+        t += timedelta(hours=1)
+
+
+def gen_history(name, rng, storms, zones, start, end, daily, reporters=None):
+    # `daily` is the mean number of events per day; storms add bursts on top
+    # of the background but are scaled so the long-run mean stays `daily`.
+    make = partial(make_alert, reporters=reporters) if name == "alerts" else make_incident
+    storm_kinds = STORM_ALERT_TYPES if name == "alerts" else STORM_INCIDENT_TYPES
+    closed = ["resolved"] if name == "alerts" else ["resolved", "closed"]
+    hour_f, month_f = normalized(HOUR_FACTORS), normalized(MONTH_FACTORS)
+    cum = list(accumulate(zone_weight(z) for z in zones))
+    # Mean storm intensity is ~exp(0.75**2 / 2) and storm starts average
+    # STORMS_PER_DAY * E[month_f**2] a day.
+    per_storm = (STORM_SHARE * daily / STORMS_PER_DAY
+                 / math.exp(0.75 ** 2 / 2) / (sum(f * f for f in month_f) / 12))
+    background = (1 - STORM_SHARE) * daily / 24
+    storms = iter(storms)
+    upcoming = next(storms, None)
+    active = []                # [hours elapsed, zone, intensities, start]
+    t = start
+    while t < end:
+        hour_end = t + timedelta(hours=1)
+        while upcoming is not None and upcoming[0] < hour_end:
+            active.append([0, upcoming[1], upcoming[2], upcoming[0]])
+            upcoming = next(storms, None)
+        events = []
+        local = local_time(t)
+        for _ in range(poisson(rng, background * hour_f[local.hour] * month_f[local.month - 1])):
+            z = rng.choices(range(len(zones)), cum_weights=cum)[0]
+            events.append((t + timedelta(seconds=rng.uniform(0, 3600)), z, False))
+        for storm in active:
+            elapsed, z, intensities, began = storm
+            lo = max(t, began)
+            for _ in range(poisson(rng, per_storm * intensities[elapsed])):
+                events.append((lo + (hour_end - lo) * rng.random(), z, True))
+            storm[0] += 1
+        active = [s for s in active if s[0] < len(s[2])]
+        events.sort(key=lambda e: e[0])
+        for created, z, in_storm in events:
+            created = created.replace(microsecond=0)
+            status = None if end - created < OPEN_WINDOW else rng.choice(closed)
+            kind = rng.choice(storm_kinds) if in_storm else None
+            doc = make(rng, zones[z], created, kind=kind, status=status)
+            doc["seedSource"] = HISTORY_MARK
+            yield doc
+        t = hour_end
+
+
+def history_target(name, timeseries):
+    # Regular runs add to the app's collections; --history-timeseries writes
+    # to a separate <name>_ts time-series collection instead.
+    if not timeseries:
+        get_db()[name].delete_many({'seedSource': HISTORY_MARK})
+        return name
+    target = name + TIMESERIES_SUFFIX
+    get_db().drop_collection(target)
+    get_db().create_collection(target, timeseries={
+        'timeField': 'createdAt', 'metaField': 'meta', 'granularity': 'minutes'})
+    return target
+
+
+def as_timeseries(docs):
+    # Time-series buckets are grouped by metaField, so put the usual filters there.
+    for d in docs:
+        d['meta'] = {'type': d['type'], 'severity': d['severity']}
+        yield d
+
+
+def seed_history(years, seed=None, daily=200, batch_size=DEFAULT_BATCH_SIZE, base=None, write_concern=None,
+                 workers=None, timeseries=False, engine='threads', pool_size=DEFAULT_POOL_SIZE):
+    if base is None:
+        base = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start = base - timedelta(days=round(years * 365))
+    zones = list(get_db()['riskzones'].find(
+        {}, {'name': 1, 'coordinates': 1, 'radius': 1, 'level': 1, 'type': 1, 'population': 1}).sort('name'))
+    if not zones:
+        print("history: no riskzones, nothing to do")
+        return {}
+    print(f"Generating {years} years of history ({start:%Y-%m-%d} to {base:%Y-%m-%d}, ~{daily}/day "
+          f"each for alerts and incidents) over {len(zones)} zones")
+    reporters = seeded_user_ids()
+    sources = {}
+    for name in ("alerts", "incidents"):
+        storms = gen_storms(scale_rng(seed, "storms"), zones, start, base)
+        docs = gen_history(name, scale_rng(seed, f"history:{name}"), storms, zones, start, base, daily,
+                           reporters=reporters)
+        if timeseries:
+            docs = as_timeseries(docs)
+        sources[history_target(name, timeseries)] = docs
+    with timer.stage('history'):
+        return load(sources, batch_size=batch_size, write_concern=write_concern, workers=workers,
+                    engine=engine, pool_size=pool_size)
+
+
+# ---------------------------------------------------------------------------
+# Job state
+#
+# Batch jobs remember how far they got in `seedjobs` so the next run only
+# looks at documents updated since then.
+# ---------------------------------------------------------------------------
+
+def get_watermark(job):
+    state = get_db()['seedjobs'].find_one({'_id': job})
+    return state.get('watermark') if state else None
+
+
+def set_watermark(job, value, **extra):
+    get_db()['seedjobs'].update_one({'_id': job},
+                              {'$set': {'watermark': value, 'updatedAt': now(), **extra}},
+                              upsert=True)
+
+
+def day_expr(field, tz=None):
+    # Local midnight of `field` as a date; works on servers without $dateTrunc.
+    tz = tz or config('STATS_TZ')
+    return {'$dateFromParts': {
+        'year': {'$year': {'date': field, 'timezone': tz}},
+        'month': {'$month': {'date': field, 'timezone': tz}},
+        'day': {'$dayOfMonth': {'date': field, 'timezone': tz}},
+        'timezone': tz,
+    }}
+
+
+def local_day(value, tz=None):
+    # What day_expr computes on the server, for a datetime already in Python.
+    tz = tz or config('STATS_TZ')
+    m = re.fullmatch(r'([+-])(\d\d):?(\d\d)', tz)
+    if m:
+        offset = timedelta(hours=int(m.group(2)), minutes=int(m.group(3)))
+        zone = timezone(-offset if m.group(1) == '-' else offset)
+    else:
+        zone = ZoneInfo(tz)
+    local = value.replace(tzinfo=timezone.utc).astimezone(zone)
+    midnight = local.replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+# ---------------------------------------------------------------------------
+# dashboardstats materialization
+#
+# Produces the same documents /api/dashboard/calculate-stats writes, for every
+# day at once: incidents are grouped by (day, department) and then by day, so
+# the whole backfill is a single pass over `incidents`. Later runs only
+# recompute the days whose incidents changed since the last watermark.
+#
+# A deleted incident leaves no updatedAt behind, so its day is only corrected
+# when another incident in the recomputed range changes, by seed_watch.py
+# (which sees deletes through pre-images), or by --full.
+# ---------------------------------------------------------------------------
+
+ACTIVE_INCIDENT_STATUSES = ["reported", "in-progress"]
+LOCAL_DAY_MAX = timedelta(hours=25)  # longest local day (DST fall-back)
+
+
+def _minutes_between(later, earlier):
+    return {'$divide': [{'$subtract': [later, earlier]}, 60000]}
+
+
+def _count_if(cond):
+    return {'$sum': {'$cond': [cond, 1, 0]}}
+
+
+def _histogram(field, values, prefix):
+    return {f'{prefix}_{v}': _count_if({'$eq': [f'${field}', v]}) for v in values}
+
+
+def dashboard_stats_pipeline(match, tz=None):
+    timed = {'$and': [
+        {'$eq': ['$status', 'resolved']},
+        {'$gt': ['$responseTeam.assignedAt', None]},
+        {'$gt': ['$responseTeam.arrivedAt', None]},
+        {'$gt': ['$responseTeam.resolvedAt', None]},
+    ]}
+    per_department = {
+        'total': {'$sum': 1},
+        'active': _count_if({'$in': ['$status', ACTIVE_INCIDENT_STATUSES]}),
+        'resolved': _count_if({'$eq': ['$status', 'resolved']}),
+        'critical': _count_if({'$eq': ['$severity', 'critical']}),
+        'affected': {'$sum': {'$ifNull': ['$affectedPeople', 0]}},
+        'timed': _count_if(timed),
+        'assignment': {'$sum': {'$cond': [
+            timed, _minutes_between('$responseTeam.assignedAt', '$createdAt'), 0]}},
+        'arrival': {'$sum': {'$cond': [
+            timed, _minutes_between('$responseTeam.arrivedAt', '$responseTeam.assignedAt'), 0]}},
+        'resolution': {'$sum': {'$cond': [
+            timed, _minutes_between('$responseTeam.resolvedAt', '$responseTeam.arrivedAt'), 0]}},
+        **_histogram('type', INCIDENT_TYPES, 'type'),
+        **_histogram('severity', INCIDENT_SEVERITIES, 'severity'),
+    }
+
+    per_day = {k: {'$sum': f'${k}'} for k in per_department}
+    per_day['departments'] = {'$push': {'name': '$_id.department', 'count': '$total'}}
+    return [
+        {'$match': match},
+        {'$group': {'_id': {'day': day_expr('$createdAt', tz), 'department': '$location.department'},
+                    **per_department}},
+        {'$group': {'_id': '$_id.day', **per_day}},
+        {'$sort': {'_id': 1}},
+    ]
+
+
+def dashboard_stat_fields(row):
+    timed = row['timed']
+    avg = (lambda k: row[k] / timed) if timed else (lambda k: 0)
+    return {
+        'date': row['_id'],
+        'source': "internal",
+        'metrics': {
+            'totalIncidents': row['total'],
+            'activeIncidents': row['active'],
+            'resolvedIncidents': row['resolved'],
+            'criticalIncidents': row['critical'],
+            'averageResponseTime': round(avg('assignment') + avg('arrival') + avg('resolution')),
+            'affectedPeople': row['affected'],
+        },
+        'incidentsByType': {t: row[f'type_{t}'] for t in INCIDENT_TYPES},
+        'incidentsBySeverity': {sev: row[f'severity_{sev}'] for sev in INCIDENT_SEVERITIES},
+        'incidentsByDepartment': [d for d in row['departments'] if d['name'] is not None],
+        'responseMetrics': {
+            'averageAssignmentTime': round(avg('assignment')),
+            'averageArrivalTime': round(avg('arrival')),
+            'averageResolutionTime': round(avg('resolution')),
+        },
+        'updatedAt': now(),
+    }
+
+
+def changed_days(since, tz=None):
+    rows = get_db()['incidents'].aggregate([
+        {'$match': {'updatedAt': {'$gte': since}}},
+        {'$group': {'_id': day_expr('$createdAt', tz)}},
+    ])
+    return sorted(r['_id'] for r in rows if r['_id'] is not None)
+
+
+def materialize_dashboard_stats(full=False, since=None, tz=None, batch_size=DEFAULT_BATCH_SIZE):
+    started = now()
+    watermark = None if full else get_watermark('dashboardstats')
+    match = {}
+    days = None
+    if since is not None:
+        match['createdAt'] = {'$gte': since}
+    elif watermark is not None:
+        days = changed_days(watermark, tz)
+        if not days:
+            print("dashboardstats: up to date")
+            set_watermark('dashboardstats', started)
+            return 0
+        # One contiguous range keeps it a single indexed scan on createdAt.
+        match['createdAt'] = {'$gte': days[0], '$lt': days[-1] + LOCAL_DAY_MAX}
+
+    written = 0
+    seen = set()
+    coll = get_db()['dashboardstats']
+    rows = get_db()['incidents'].aggregate(dashboard_stats_pipeline(match, tz), allowDiskUse=True)
+    for batch in batched(rows, batch_size):
+        if days is not None:
+            # The day after the range is only partly inside it.
+            batch = [r for r in batch if r['_id'] <= days[-1]]
+            seen.update(r['_id'] for r in batch)
+        ops = [UpdateOne({'date': r['_id']},
+                         {'$set': dashboard_stat_fields(r), '$setOnInsert': {'createdAt': now()}},
+                         upsert=True)
+               for r in batch]
+        if ops:
+            coll.bulk_write(ops, ordered=False)
+        written += len(ops)
+    if days is not None:
+        # Days in the range that no longer have any incidents.
+        coll.delete_many({'date': {'$gte': days[0], '$lte': days[-1], '$nin': sorted(seen)}})
+    set_watermark('dashboardstats', started)
+    print(f"dashboardstats: {written} days materialized")
+    return written
+
+
+def refresh_dashboard_days(days, tz=None):
+    # Recomputes the given days (as local_day returns them); days left without
+    # incidents lose their document.
+    days = set(days)
+    if not days:
+        return 0
+    # A local day lasts up to 25 hours; rows for the neighbouring days the
+    # window clips into are partial and dropped.
+    match = {'$or': [{'createdAt': {'$gte': d, '$lt': d + LOCAL_DAY_MAX}} for d in sorted(days)]}
+    rows = [r for r in get_db()['incidents'].aggregate(dashboard_stats_pipeline(match, tz)) if r['_id'] in days]
+    ops = [UpdateOne({'date': r['_id']},
+                     {'$set': dashboard_stat_fields(r), '$setOnInsert': {'createdAt': now()}},
+                     upsert=True)
+           for r in rows]
+    empty = days - {r['_id'] for r in rows}
+    if empty:
+        ops.append(DeleteMany({'date': {'$in': sorted(empty)}}))
+    get_db()['dashboardstats'].bulk_write(ops, ordered=False)
+    return len(rows)
+
+
+# ---------------------------------------------------------------------------
+# zonestats rollup
+#
+# One document per zone with everything /api/dashboard/zone-stats computes
+# except the recent-incident list (which the neighborhood_createdAt index
+# already serves). Response times are kept as a running sum and count so the
+# average can be derived without loading incidents. Incremental runs recompute
+# only the zones that have incidents updated since the last watermark, plus
+# the zones whose incident count no longer matches their document: an
+# incident moved to another zone or deleted leaves nothing behind in the zone
+# it left, but that zone's count drops.
+# ---------------------------------------------------------------------------
+
+def zone_label(riskzone):
+    # "Danubio - Soacha" -> "Danubio", the value incidents use as location.neighborhood.
+    return riskzone['name'].split(' - ')[0]
+
+
+def zone_stats_pipeline(match):
+    resolved_timed = {'$and': [{'$eq': ['$status', 'resolved']}, {'$gt': ['$resolvedAt', None]}]}
+    return [
+        {'$match': match},
+        {'$group': {
+            '_id': '$location.neighborhood',
+            'total': {'$sum': 1},
+            'active': _count_if({'$in': ['$status', ACTIVE_INCIDENT_STATUSES]}),
+            'resolved': _count_if({'$eq': ['$status', 'resolved']}),
+            'critical': _count_if({'$eq': ['$severity', 'critical']}),
+            'affected': {'$sum': {'$ifNull': ['$affectedPeople', 0]}},
+            'responseCount': _count_if(resolved_timed),
+            'responseSum': {'$sum': {'$cond': [
+                resolved_timed, _minutes_between('$resolvedAt', '$createdAt'), 0]}},
+            'lastIncidentAt': {'$max': '$createdAt'},
+            **_histogram('type', INCIDENT_TYPES, 'type'),
+            **_histogram('severity', INCIDENT_SEVERITIES, 'severity'),
+        }},
+    ]
+
+
+def zone_stat_fields(zone, row, riskzone=None):
+    row = row or {}
+    total = row.get('total', 0)
+    resolved = row.get('resolved', 0)
+    count = row.get('responseCount', 0)
+    fields = {
+        'zone': zone,
+        'totalIncidents': total,
+        'activeIncidents': row.get('active', 0),
+        'resolvedIncidents': resolved,
+        'criticalIncidents': row.get('critical', 0),
+        'peopleAffected': row.get('affected', 0),
+        'incidentsByType': {t: row.get(f'type_{t}', 0) for t in INCIDENT_TYPES},
+        'incidentsBySeverity': {sev: row.get(f'severity_{sev}', 0) for sev in INCIDENT_SEVERITIES},
+        'responseTimeSum': row.get('responseSum', 0),
+        'responseTimeCount': count,
+        'averageResponseTime': round(row['responseSum'] / count) if count else 0,
+        'resolutionRate': round(resolved / total * 100) if total else 0,
+        'lastIncidentAt': row.get('lastIncidentAt'),
+        'updatedAt': now(),
+    }
+    if riskzone is not None:
+        fields['zoneId'] = riskzone['_id']
+        fields['level'] = riskzone.get('level')
+        fields['population'] = riskzone.get('population')
+    return fields
+
+
+def materialize_zone_stats(full=False, batch_size=DEFAULT_BATCH_SIZE):
+    started = now()
+    watermark = None if full else get_watermark('zonestats')
+    zones = None
+    if watermark is not None:
+        touched = get_db()['incidents'].distinct('location.neighborhood', {'updatedAt': {'$gte': watermark}})
+        zones = {z for z in touched if z is not None} | recounted_zones()
+        if not zones:
+            print("zonestats: up to date")
+            set_watermark('zonestats', started)
+            return 0
+    written = refresh_zone_stats(zones, batch_size)
+    set_watermark('zonestats', started)
+    print(f"zonestats: {written} zones materialized")
+    return written
+
+
+def recounted_zones():
+    # Zones whose stored totalIncidents differs from a fresh count, which the
+    # neighborhood_createdAt index answers without fetching incidents.
+    counts = {r['_id']: r['n'] for r in get_db()['incidents'].aggregate([
+        {'$match': {'location.neighborhood': {'$exists': True, '$ne': None}}},
+        {'$group': {'_id': '$location.neighborhood', 'n': {'$sum': 1}}},
+    ])}
+    stored = {z['zone']: z.get('totalIncidents', 0)
+              for z in get_db()['zonestats'].find({}, {'zone': 1, 'totalIncidents': 1})}
+    return {z for z in set(counts) | set(stored) if counts.get(z, 0) != stored.get(z, 0)}
+
+
+def refresh_zone_stats(zones=None, batch_size=DEFAULT_BATCH_SIZE):
+    # Recomputes the given zones (location.neighborhood values), or all of them.
+    riskzones = {zone_label(z): z for z in get_db()['riskzones'].find({}, {'name': 1, 'level': 1, 'population': 1})}
+    if zones is None:
+        match = {'location.neighborhood': {'$exists': True, '$ne': None}}
+        zones = set(riskzones)
+    else:
+        match = {'location.neighborhood': {'$in': sorted(zones)}}
+        zones = set(zones)
+
+    rows = {r['_id']: r for r in get_db()['incidents'].aggregate(zone_stats_pipeline(match), allowDiskUse=True)}
+    zones |= set(rows)
+    ops = [UpdateOne({'zone': z},
+                     {'$set': zone_stat_fields(z, rows.get(z), riskzones.get(z)),
+                      '$setOnInsert': {'createdAt': now()}},
+                     upsert=True)
+           for z in sorted(zones)]
+    for batch in batched(ops, batch_size):
+        get_db()['zonestats'].bulk_write(batch, ordered=False)
+    return len(ops)
+
+
+# ---------------------------------------------------------------------------
+# trainingcatalog read model (--training-catalog)
+#
+# /capacitacion needs courses, videos and resources together. trainingcatalog
+# holds one flattened item per published course and active video or
+# resource, plus one summary per category (and "all") with item counts and
+# the top items by rating, views and downloads, so the page can load with a
+# single indexed find({category}). Later runs only re-read source documents
+# updated since the last watermark and recompute the categories they touch;
+# items whose source was deleted or hidden are removed.
+# ---------------------------------------------------------------------------
+
+CATALOG_SOURCES = {
+    # collection: (item kind, status that makes it visible on the page)
+    'courses': ('course', 'published'),
+    'videos': ('video', 'active'),
+    'resources': ('resource', 'active'),
+}
+CATALOG_FIELDS = {
+    'course': ['level', 'duration', 'instructor', 'enrollments', 'rating'],
+    'video': ['youtubeId', 'duration', 'views', 'tags'],
+    'resource': ['type', 'fileUrl', 'fileSize', 'downloads', 'tags'],
+}
+CATALOG_TOP = {'topRated': 'rating', 'mostViewed': 'views', 'mostDownloaded': 'downloads'}
+CATALOG_TOP_N = 5
+CATALOG_ALL = 'all'
+
+
+def catalog_item(kind, doc):
+    item = {
+        'key': f"{kind}:{doc['_id']}",
+        'kind': kind,
+        'sourceId': doc['_id'],
+        'category': doc.get('category'),
+        'title': doc.get('title'),
+        'description': doc.get('description'),
+        'thumbnail': doc.get('thumbnail'),
+        'sourceUpdatedAt': doc.get('updatedAt'),
+        'updatedAt': now(),
+    }
+    for field in CATALOG_FIELDS[kind]:
+        if field in doc:
+            item[field] = doc[field]
+    return item
+
+
+def catalog_summary_pipeline(category):
+    match = {'kind': {'$in': [kind for kind, _ in CATALOG_SOURCES.values()]}}
+    if category != CATALOG_ALL:
+        match['category'] = category
+    brief = {'_id': 0, 'key': 1, 'kind': 1, 'sourceId': 1, 'title': 1, 'thumbnail': 1, 'category': 1,
+             'rating': 1, 'views': 1, 'downloads': 1}
+    facets = {'counts': [{'$group': {'_id': '$kind', 'n': {'$sum': 1}}}]}
+    for name, field in CATALOG_TOP.items():
+        facets[name] = [{'$match': {field: {'$ne': None}}}, {'$sort': {field: -1, 'key': 1}},
+                        {'$limit': CATALOG_TOP_N}, {'$project': brief}]
+    return [{'$match': match}, {'$facet': facets}]
+
+
+def catalog_summary(category):
+    row = next(get_db()['trainingcatalog'].aggregate(catalog_summary_pipeline(category)))
+    counts = {kind: 0 for kind, _ in CATALOG_SOURCES.values()}
+    counts.update({c['_id']: c['n'] for c in row['counts']})
+    fields = {
+        'key': f"category:{category}",
+        'kind': 'category',
+        'category': category,
+        'counts': {**counts, 'total': sum(counts.values())},
+        'updatedAt': now(),
+    }
+    for name in CATALOG_TOP:
+        fields[name] = row[name]
+    return fields
+
+
+def materialize_training_catalog(full=False, batch_size=DEFAULT_BATCH_SIZE):
+    started = now()
+    watermark = None if full else get_watermark('trainingcatalog')
+    coll = get_db()['trainingcatalog']
+    touched = set()
+    ops = []
+    for name, (kind, visible) in CATALOG_SOURCES.items():
+        # Current catalog categories, so items that moved or vanished also
+        # refresh the category they came from.
+        listed = {d['sourceId']: d.get('category') for d in coll.find({'kind': kind}, {'sourceId': 1, 'category': 1})}
+        query = {} if watermark is None else {'updatedAt': {'$gte': watermark}}
+        for doc in get_db()[name].find(query):
+            touched.update({doc.get('category'), listed.get(doc['_id'])})
+            key = f"{kind}:{doc['_id']}"
+            if doc.get('status') == visible:
+                ops.append(UpdateOne({'key': key},
+                                     {'$set': catalog_item(kind, doc), '$setOnInsert': {'createdAt': now()}},
+                                     upsert=True))
+            elif doc['_id'] in listed:
+                ops.append(DeleteOne({'key': key}))
+        existing = {d['_id'] for d in get_db()[name].find({'_id': {'$in': list(listed)}}, {'_id': 1})}
+        for source_id in listed.keys() - existing:
+            touched.add(listed[source_id])
+            ops.append(DeleteOne({'key': f"{kind}:{source_id}"}))
+    for batch in batched(ops, batch_size):
+        coll.bulk_write(batch, ordered=False)
+
+    touched.discard(None)
+    if watermark is None:
+        touched |= set(CATEGORIES) | set(coll.distinct('category', {'kind': {'$ne': 'category'}}))
+    if not touched:
+        print("trainingcatalog: up to date")
+        set_watermark('trainingcatalog', started)
+        return 0
+    summaries = [UpdateOne({'key': f"category:{c}"},
+                           {'$set': catalog_summary(c), '$setOnInsert': {'createdAt': now()}},
+                           upsert=True)
+                 for c in sorted(touched) + [CATALOG_ALL]]
+    coll.bulk_write(summaries, ordered=False)
+    set_watermark('trainingcatalog', started)
+    print(f"trainingcatalog: {len(ops)} items changed, {len(summaries)} category summaries rebuilt")
+    return len(ops)
+
+
+# ---------------------------------------------------------------------------
+# Search tokens backfill (--search-tokens)
+#
+# Seeded and imported documents get searchTokens when they are built; this
+# fills it in for documents written by the app, and refreshes documents
+# updated since the last run.
+# ---------------------------------------------------------------------------
+
+def build_search_tokens(collections=None, full=False, batch_size=DEFAULT_BATCH_SIZE, write_concern=None):
+    report = {}
+    for name in collections or SEARCH_FIELDS:
+        # One watermark per collection: a run limited to some collections
+        # must not mark the others as done.
+        job = f'searchtokens:{name}'
+        started = now()
+        watermark = None if full else get_watermark(job)
+        fields = SEARCH_FIELDS[name]
+        query = {}
+        if watermark is not None:
+            query = {'$or': [{'searchTokens': {'$exists': False}}, {'updatedAt': {'$gte': watermark}}]}
+        coll = get_collection(name, write_concern)
+        cursor = get_db()[name].find(query, {f: 1 for f in fields + ['searchTokens']})
+        updated = 0
+        for batch in batched(cursor, batch_size):
+            ops = []
+            for d in batch:
+                tokens = search_tokens(d, fields)
+                if d.get('searchTokens') != tokens:
+                    ops.append(UpdateOne({'_id': d['_id']}, {'$set': {'searchTokens': tokens}}))
+            if ops:
+                coll.bulk_write(ops, ordered=False)
+                updated += len(ops)
+        report[name] = updated
+        print(f"searchTokens: {updated} {name} updated")
+        set_watermark(job, started)
+    return report
+
+
+def search_index(name):
+    fields = SEARCH_FIELDS[name]
+    return IndexModel([(f, TEXT) for f in fields], name='text_es', default_language='spanish',
+                      weights={f: SEARCH_WEIGHTS[f] for f in fields})
+
+
+# ---------------------------------------------------------------------------
+# Point-in-zone assignment (--assign-zones)
+#
+# Stamps alerts and incidents with the _id of the riskzone they fall in, so
+# zone filters become an equality match on zoneId. Zones are bucketed in a
+# grid whose cells are as wide as the largest radius, so a point can only be
+# inside zones registered in its own or the 8 neighbouring cells; distances to
+# those candidates are computed with NumPy for a whole chunk of points at once.
+# When a point is inside several zones the nearest center wins.
+#
+# Later runs only stamp points without a zoneId. Each collection remembers a
+# hash of the zones it was assigned against; when zones are added, moved,
+# resized or removed, the next run reassigns that collection from scratch,
+# so points stamped null can still land in a new zone.
+# ---------------------------------------------------------------------------
+
+EARTH_RADIUS_M = 6371008.8
+# Upper bound on point x candidate distances computed per chunk.
+ASSIGN_CELLS_PER_CHUNK = 4_000_000
+
+
+def require_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise SystemExit("This step needs NumPy: pip install numpy")
+        np = numpy
+    return np
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = (np.radians(a) for a in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+class ZoneGrid:
+    def __init__(self, zones):
+        require_numpy()
+        self.ids = [z['_id'] for z in zones]
+        self.lat = np.array([z['coordinates']['lat'] for z in zones], dtype=float)
+        self.lng = np.array([z['coordinates']['lng'] for z in zones], dtype=float)
+        self.radius = np.array([z['radius'] for z in zones], dtype=float)
+
+        cell_m = max(float(self.radius.max()), 1.0)
+        # Use the widest latitude so a cell is never narrower than cell_m in longitude.
+        cos_lat = math.cos(math.radians(min(89.0, float(np.abs(self.lat).max()))))
+        self.dlat = cell_m / 111320.0
+        self.dlng = cell_m / (111320.0 * cos_lat)
+        self.lat0 = float(self.lat.min())
+        self.lng0 = float(self.lng.min())
+
+        ci, cj = self.cells(self.lat, self.lng)
+        self.shape = (int(ci.max()) + 1, int(cj.max()) + 1)
+        counts = np.zeros(self.shape, dtype=int)
+        np.add.at(counts, (ci, cj), 1)
+        self.table = np.full(self.shape + (int(counts.max()),), -1, dtype=np.int64)
+        fill = np.zeros(self.shape, dtype=int)
+        for idx, (i, j) in enumerate(zip(ci, cj)):
+            self.table[i, j, fill[i, j]] = idx
+            fill[i, j] += 1
+
+    @property
+    def candidates_per_point(self):
+        return 9 * self.table.shape[2]
+
+    def cells(self, lat, lng):
+        return (np.floor((lat - self.lat0) / self.dlat).astype(np.int64),
+                np.floor((lng - self.lng0) / self.dlng).astype(np.int64))
+
+    def assign(self, lat, lng):
+        # Returns the index into self.ids for every point, or -1.
+        n = len(lat)
+        ci, cj = self.cells(lat, lng)
+        h, w, k = self.table.shape
+        cand = np.full((n, 9 * k), -1, dtype=np.int64)
+        col = 0
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                ii, jj = ci + di, cj + dj
+                ok = (ii >= 0) & (ii < h) & (jj >= 0) & (jj < w)
+                cand[ok, col:col + k] = self.table[ii[ok], jj[ok]]
+                col += k
+        safe = np.where(cand >= 0, cand, 0)
+        d = haversine_m(lat[:, None], lng[:, None], self.lat[safe], self.lng[safe])
+        inside = (cand >= 0) & (d <= self.radius[safe])
+        best = np.where(inside, d, np.inf).argmin(axis=1)
+        result = cand[np.arange(n), best]
+        result[~inside.any(axis=1)] = -1
+        return result
+
+
+def point_of(name, doc):
+    # (lat, lng) of an alert or incident, whichever shape it was stored in.
+    geo = doc.get(GEO_FIELD)
+    if geo and geo.get('type') == 'Point':
+        return geo['coordinates'][1], geo['coordinates'][0]
+    coords = (doc.get('location') or {}).get('coordinates')
+    if isinstance(coords, dict) and 'lat' in coords:
+        return coords['lat'], coords['lng']
+    if isinstance(coords, (list, tuple)) and len(coords) == 2:
+        return coords[1], coords[0]
+    return None
+
+
+def zones_hash(zones):
+    shape = sorted([str(z['_id']), z['coordinates']['lat'], z['coordinates']['lng'], z['radius']] for z in zones)
+    return hashlib.sha256(json.dumps(shape).encode('utf-8')).hexdigest()
+
+
+def assign_zones(collections=('alerts', 'incidents'), full=False, write_concern=None):
+    zones = list(get_db()['riskzones'].find({}, {'coordinates': 1, 'radius': 1}))
+    if not zones:
+        print("assign-zones: no riskzones, nothing to do")
+        return {}
+    grid = ZoneGrid(zones)
+    chunk = max(1000, ASSIGN_CELLS_PER_CHUNK // grid.candidates_per_point)
+    zones_at = zones_hash(zones)
+    report = {}
+    for name in collections:
+        job = f'assignzones:{name}'
+        state = get_db()['seedjobs'].find_one({'_id': job}) or {}
+        reassign = full or state.get('zones') != zones_at
+        if reassign and not full and state:
+            print(f"assign-zones {name}: riskzones changed since the last run, reassigning every point")
+        coll = get_collection(name, write_concern)
+        query = {} if reassign else {'zoneId': {'$exists': False}}
+        cursor = coll.find(query, {GEO_FIELD: 1, 'location.coordinates': 1}, batch_size=chunk)
+        stats = {'assigned': 0, 'outside': 0, 'skipped': 0}
+        for docs in batched(cursor, chunk):
+            ids, lat, lng = [], [], []
+            for d in docs:
+                p = point_of(name, d)
+                if p is None:
+                    stats['skipped'] += 1
+                    continue
+                ids.append(d['_id'])
+                lat.append(p[0])
+                lng.append(p[1])
+            if not ids:
+                continue
+            idx = grid.assign(np.array(lat, dtype=float), np.array(lng, dtype=float))
+            # One UpdateMany per zone instead of one update per document.
+            by_zone = {}
+            for doc_id, z in zip(ids, idx.tolist()):
+                by_zone.setdefault(z, []).append(doc_id)
+            # Points outside every zone get zoneId null so later runs skip them too.
+            ops = []
+            for z, doc_ids in by_zone.items():
+                stats['outside' if z < 0 else 'assigned'] += len(doc_ids)
+                zone_id = grid.ids[z] if z >= 0 else None
+                ops.append(UpdateMany({'_id': {'$in': doc_ids}}, {'$set': {'zoneId': zone_id}}))
+            coll.bulk_write(ops, ordered=False)
+        report[name] = stats
+        set_watermark(job, now(), zones=zones_at)
+        print(f"assign-zones {name}: {stats['assigned']} in a zone, {stats['outside']} outside, "
+              f"{stats['skipped']} without coordinates")
+    return report
+
+
+# ---------------------------------------------------------------------------
+# Evacuation lookup table (--evacuation-table)
+#
+# For every riskzone and every cell of a fixed grid over the map, stores the
+# k nearest active meeting points that still have capacity, each with the
+# routes that lead to it (nearest route start first). The public map can then
+# answer "where do I go" with one $geoIntersects lookup on the cell polygon.
+# A route leads to a meeting point when its last vertex is within
+# ROUTE_SNAP_M of it.
+# ---------------------------------------------------------------------------
+
+LOOKUP_CELL_M = 250
+LOOKUP_K = 3
+ROUTE_SNAP_M = 150
+ROUTES_PER_POINT = 2
+
+
+def meeting_point_capacity(p):
+    # `occupancy` is optional; without it the whole capacity is available.
+    return (p.get('capacity') or 0) - (p.get('occupancy') or 0)
+
+
+def lookup_grid(lat, lng, cell_m=LOOKUP_CELL_M, pad_m=1000):
+    # Cell centers and polygons covering everything passed in, plus a margin.
+    lat0 = float(lat.min()) - pad_m / 111320.0
+    lat1 = float(lat.max()) + pad_m / 111320.0
+    cos_lat = math.cos(math.radians(float(np.abs(lat).max())))
+    dlat = cell_m / 111320.0
+    dlng = cell_m / (111320.0 * cos_lat)
+    lng0 = float(lng.min()) - pad_m / (111320.0 * cos_lat)
+    lng1 = float(lng.max()) + pad_m / (111320.0 * cos_lat)
+    rows = int(math.ceil((lat1 - lat0) / dlat))
+    cols = int(math.ceil((lng1 - lng0) / dlng))
+    ii, jj = np.meshgrid(np.arange(rows), np.arange(cols), indexing='ij')
+    ii, jj = ii.ravel(), jj.ravel()
+    south, west = lat0 + ii * dlat, lng0 + jj * dlng
+    return ii, jj, south + dlat / 2, west + dlng / 2, (south, west, dlat, dlng)
+
+
+def cell_polygon(south, west, dlat, dlng):
+    ring = [[west, south], [west + dlng, south], [west + dlng, south + dlat], [west, south + dlat], [west, south]]
+    return {'type': 'Polygon', 'coordinates': [[[round(x, 6), round(y, 6)] for x, y in ring]]}
+
+
+def routes_by_meeting_point(routes, p_lat, p_lng):
+    # {point index: [(route index, start lat, start lng)]}
+    ends = [r['coordinates'][-1] for r in routes]
+    e_lat = np.array([e['lat'] for e in ends], dtype=float)
+    e_lng = np.array([e['lng'] for e in ends], dtype=float)
+    d = haversine_m(e_lat[:, None], e_lng[:, None], p_lat[None, :], p_lng[None, :])
+    nearest = d.argmin(axis=1)
+    served = {}
+    for r_idx, p_idx in enumerate(nearest.tolist()):
+        if d[r_idx, p_idx] <= ROUTE_SNAP_M:
+            start = routes[r_idx]['coordinates'][0]
+            served.setdefault(p_idx, []).append((r_idx, start['lat'], start['lng']))
+    return served
+
+
+def nearest_meeting_points(q_lat, q_lng, points, p_lat, p_lng, routes, served, k=LOOKUP_K):
+    # One list of entries per query location.
+    k = min(k, len(points))
+    d = haversine_m(q_lat[:, None], q_lng[:, None], p_lat[None, :], p_lng[None, :])
+    top = np.argpartition(d, k - 1, axis=1)[:, :k] if k < len(points) else np.tile(np.arange(k), (len(q_lat), 1))
+    out = []
+    for q in range(len(q_lat)):
+        order = top[q][np.argsort(d[q, top[q]])]
+        entries = []
+        for p_idx in order.tolist():
+            cands = served.get(p_idx, [])
+            cands = sorted(cands, key=lambda c: (c[1] - q_lat[q]) ** 2 + (c[2] - q_lng[q]) ** 2)
+            p = points[p_idx]
+            entries.append({
+                'meetingPointId': p['_id'],
+                'name': p['name'],
+                'distance_m': int(d[q, p_idx]),
+                'remainingCapacity': meeting_point_capacity(p),
+                'routeIds': [routes[c[0]]['_id'] for c in cands[:ROUTES_PER_POINT]],
+            })
+        out.append(entries)
+    return out
+
+
+def build_evacuation_table(k=LOOKUP_K, cell_m=LOOKUP_CELL_M, batch_size=DEFAULT_BATCH_SIZE):
+    require_numpy()
+    started = now()
+    points = [p for p in get_db()['meetingpoints'].find({'status': 'active'},
+                                                  {'name': 1, 'coordinates': 1, 'capacity': 1, 'occupancy': 1})
+              if meeting_point_capacity(p) > 0]
+    if not points:
+        print("evacuationlookup: no active meeting points with capacity")
+        return 0
+    routes = [r for r in get_db()['evacuationroutes'].find({'status': 'active'}, {'coordinates': 1})
+              if len(r.get('coordinates', [])) >= 2]
+    zones = list(get_db()['riskzones'].find({}, {'name': 1, 'coordinates': 1}))
+
+    p_lat = np.array([p['coordinates']['lat'] for p in points], dtype=float)
+    p_lng = np.array([p['coordinates']['lng'] for p in points], dtype=float)
+    served = routes_by_meeting_point(routes, p_lat, p_lng) if routes else {}
+
+    def ops():
+        if zones:
+            z_lat = np.array([z['coordinates']['lat'] for z in zones], dtype=float)
+            z_lng = np.array([z['coordinates']['lng'] for z in zones], dtype=float)
+            table = nearest_meeting_points(z_lat, z_lng, points, p_lat, p_lng, routes, served, k)
+            for z, entries in zip(zones, table):
+                yield UpdateOne({'key': f"zone:{z['_id']}"}, {'$set': {
+                    'key': f"zone:{z['_id']}", 'kind': 'zone', 'zoneId': z['_id'], 'zone': z['name'],
+                    GEO_FIELD: geo_point(z['coordinates']), 'meetingPoints': entries, 'builtAt': started,
+                }}, upsert=True)
+
+        all_lat = np.concatenate([p_lat] + ([z_lat] if zones else []))
+        all_lng = np.concatenate([p_lng] + ([z_lng] if zones else []))
+        ii, jj, c_lat, c_lng, (south, west, dlat, dlng) = lookup_grid(all_lat, all_lng, cell_m)
+        step = max(1, ASSIGN_CELLS_PER_CHUNK // len(points))
+        for lo in range(0, len(ii), step):
+            sl = slice(lo, lo + step)
+            table = nearest_meeting_points(c_lat[sl], c_lng[sl], points, p_lat, p_lng, routes, served, k)
+            for n, entries in enumerate(table, start=lo):
+                key = f"cell:{ii[n]}:{jj[n]}"
+                yield UpdateOne({'key': key}, {'$set': {
+                    'key': key, 'kind': 'cell',
+                    GEO_FIELD: cell_polygon(float(south[n]), float(west[n]), dlat, dlng),
+                    'meetingPoints': entries, 'builtAt': started,
+                }}, upsert=True)
+
+    written = 0
+    for batch in batched(ops(), batch_size):
+        get_db()['evacuationlookup'].bulk_write(batch, ordered=False)
+        written += len(batch)
+    # Cells or zones that no longer exist in this build.
+    stale = get_db()['evacuationlookup'].delete_many({'builtAt': {'$lt': started}}).deleted_count
+    print(f"evacuationlookup: {written} entries ({len(points)} meeting points, {len(routes)} routes)"
+          + (f", {stale} stale removed" if stale else ""))
+    return written
+
+
+# ---------------------------------------------------------------------------
+# Route geometry (--route-geometry)
+#
+# Derives from each route's coordinate list:
+#   distance / estimatedTime  geodesic length (m) and walking time (min), the
+#                             fields the map shows; distance_m and
+#                             estimated_time_min are corrected to match
+#   bbox                      [[south, west], [north, east]] for viewport culling
+#   simplified                {zoom: [[lat, lng], ...]}, Douglas-Peucker with a
+#                             tolerance of one pixel at that zoom
+# Points are in Leaflet's [lat, lng] order so the map can use them directly.
+# Segment lengths for a whole batch of routes are computed in one NumPy pass.
+# Later runs only process routes updated since the last watermark.
+# ---------------------------------------------------------------------------
+
+WALKING_M_PER_MIN = 75         # ~4.5 km/h, an evacuating group on foot
+ROUTE_ZOOMS = (12, 14, 16)
+SIMPLIFY_PX = 1.0
+WEB_MERCATOR_M_PER_PX = 156543.03392  # at zoom 0 on the equator
+
+
+def douglas_peucker(x, y, tolerance):
+    # Boolean mask of the vertices to keep; x, y in metres.
+    keep = np.zeros(len(x), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(x) - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j <= i + 1:
+            continue
+        dx, dy = x[j] - x[i], y[j] - y[i]
+        px, py = x[i + 1:j] - x[i], y[i + 1:j] - y[i]
+        norm = math.hypot(dx, dy)
+        d = np.hypot(px, py) if norm == 0 else np.abs(dy * px - dx * py) / norm
+        k = int(d.argmax())
+        if d[k] > tolerance:
+            m = i + 1 + k
+            keep[m] = True
+            stack += [(i, m), (m, j)]
+    return keep
+
+
+def route_lengths(routes):
+    # Geodesic length in metres of every route, as one vectorized pass.
+    lat = np.array([c['lat'] for r in routes for c in r['coordinates']], dtype=float)
+    lng = np.array([c['lng'] for r in routes for c in r['coordinates']], dtype=float)
+    sizes = np.array([len(r['coordinates']) for r in routes])
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    seg = haversine_m(lat[:-1], lng[:-1], lat[1:], lng[1:])
+    # Zero the segments joining the last vertex of one route to the next route.
+    seg[(starts[1:] - 1)] = 0
+    return np.add.reduceat(np.append(seg, 0), starts)
+
+
+def route_geometry_fields(route, length_m):
+    lat = np.array([c['lat'] for c in route['coordinates']], dtype=float)
+    lng = np.array([c['lng'] for c in route['coordinates']], dtype=float)
+    # Local equirectangular metres are plenty for a few-km route.
+    cos_lat = math.cos(math.radians(float(lat.mean())))
+    x = np.radians(lng - lng[0]) * EARTH_RADIUS_M * cos_lat
+    y = np.radians(lat - lat[0]) * EARTH_RADIUS_M
+    simplified = {}
+    for z in ROUTE_ZOOMS:
+        tolerance = SIMPLIFY_PX * WEB_MERCATOR_M_PER_PX * cos_lat / 2 ** z
+        keep = douglas_peucker(x, y, tolerance)
+        simplified[str(z)] = [[float(a), float(b)] for a, b in zip(lat[keep], lng[keep])]
+    distance = int(round(length_m))
+    eta = max(1, math.ceil(length_m / WALKING_M_PER_MIN))
+    return {
+        'distance': distance,
+        'estimatedTime': eta,
+        'distance_m': distance,
+        'estimated_time_min': eta,
+        'bbox': [[float(lat.min()), float(lng.min())], [float(lat.max()), float(lng.max())]],
+        'simplified': simplified,
+        'geometryAt': now(),
+    }
+
+
+def route_order(route):
+    # Hand-entered routes may carry an explicit vertex order.
+    coords = route.get('coordinates') or []
+    if any('order' in c for c in coords):
+        coords = sorted(coords, key=lambda c: c.get('order', 0))
+    return {**route, 'coordinates': coords}
+
+
+def compute_route_geometry(full=False, batch_size=DEFAULT_BATCH_SIZE, write_concern=None):
+    require_numpy()
+    started = now()
+    watermark = None if full else get_watermark('routegeometry')
+    query = {} if watermark is None else {'$or': [{'bbox': {'$exists': False}},
+                                                  {'updatedAt': {'$gte': watermark}}]}
+    coll = get_collection('evacuationroutes', write_concern)
+    cursor = get_db()['evacuationroutes'].find(query, {'coordinates': 1})
+    updated = skipped = 0
+    with timer.stage('route-geometry'):
+        for batch in batched(cursor, batch_size):
+            routes = [route_order(r) for r in batch]
+            usable = [r for r in routes if len(r['coordinates']) >= 2]
+            skipped += len(routes) - len(usable)
+            routes = usable
+            if not routes:
+                continue
+            lengths = route_lengths(routes)
+            ops = [UpdateOne({'_id': r['_id']}, {'$set': route_geometry_fields(r, length)})
+                   for r, length in zip(routes, lengths)]
+            coll.bulk_write(ops, ordered=False)
+            updated += len(ops)
+    set_watermark('routegeometry', started)
+    print(f"route geometry: {updated} routes updated" + (f", {skipped} without a usable line" if skipped else ""))
+    return updated
+
+
+# ---------------------------------------------------------------------------
+# Evacuation plan (--evacuation-plan)
+#
+# Decides how many people of each riskzone go to which meeting point: a
+# min-cost flow from zone population to the free capacity of the active
+# meeting points, where the cost of a person is their walking ETA. The ETA of
+# a zone/point pair is the best route that ends at the point (walk to the
+# route start + route length) or the straight line times PLAN_DETOUR,
+# whichever is shorter. Each zone only considers its PLAN_CANDIDATES nearest
+# points within PLAN_MAX_ETA_MIN, which keeps the graph sparse (more
+# candidates mostly make the solver slower); people that fit nowhere are
+# counted as unserved rather than failing the plan.
+#
+# evacuationplan gets one document per zone (where its people go), one per
+# meeting point (how full it ends up) and one "summary" document.
+# ---------------------------------------------------------------------------
+
+PLAN_CANDIDATES = 8
+PLAN_MAX_ETA_MIN = 60
+PLAN_DETOUR = 1.3  # street distance over straight-line distance, when no route helps
+
+
+class MinCostFlow:
+    # Successive shortest paths with Dijkstra on reduced costs. Every search
+    # starts at one node with excess and stops as soon as it reaches the sink,
+    # so when most people walk to a nearby point it only touches a few nodes.
+
+    def __init__(self, n):
+        self.adj = [[] for _ in range(n)]
+        self.to = []
+        self.cap = []
+        self.cost = []
+
+    def add_arc(self, u, v, cap, cost):
+        # Arc a and its residual twin a ^ 1.
+        arc = len(self.to)
+        self.adj[u].append(arc)
+        self.adj[v].append(arc + 1)
+        self.to += [v, u]
+        self.cap += [cap, 0]
+        self.cost += [cost, -cost]
+        return arc
+
+    def flow(self, arc):
+        return self.cap[arc ^ 1]
+
+    def solve(self, supply, sink):
+        # supply: {node: units}; every unit must be able to reach the sink.
+        to, cap, cost = self.to, self.cap, self.cost
+        adj = [[(a, to[a], cost[a]) for a in arcs] for arcs in self.adj]
+        n = len(adj)
+        h = [0] * n  # potentials; all costs start non-negative
+        dist = [math.inf] * n
+        prev = [-1] * n
+        done = [False] * n
+        total = 0
+        for source, excess in supply.items():
+            while excess > 0:
+                dist[source] = 0
+                touched = [source]
+                settled = []
+                heap = [(0, source)]
+                while heap:
+                    d, u = heapq.heappop(heap)
+                    if done[u]:
+                        continue
+                    done[u] = True
+                    settled.append(u)
+                    if u == sink:
+                        break
+                    hu = h[u] + d
+                    for a, v, c in adj[u]:
+                        if cap[a] > 0:
+                            nd = hu + c - h[v]
+                            if nd < dist[v] and not done[v]:
+                                if dist[v] == math.inf:
+                                    touched.append(v)
+                                dist[v] = nd
+                                prev[v] = a
+                                heapq.heappush(heap, (nd, v))
+                if not done[sink]:
+                    raise ValueError(f"node {source} cannot reach the sink")
+                # Nodes the search did not settle are at least as far as the
+                # sink, so only the settled ones need their potential moved.
+                reached = dist[sink]
+                for v in settled:
+                    h[v] += dist[v] - reached
+                push, v = excess, sink
+                while v != source:
+                    a = prev[v]
+                    push = min(push, cap[a])
+                    v = to[a ^ 1]
+                v = sink
+                while v != source:
+                    a = prev[v]
+                    cap[a] -= push
+                    cap[a ^ 1] += push
+                    total += push * cost[a]
+                    v = to[a ^ 1]
+                excess -= push
+                for v in touched:
+                    dist[v] = math.inf
+                    done[v] = False
+        return total
+
+
+def plan_candidates(zones, points, routes):
+    # [(zone index, point index, eta seconds, route index or None)]
+    z_lat = np.array([z['coordinates']['lat'] for z in zones], dtype=float)
+    z_lng = np.array([z['coordinates']['lng'] for z in zones], dtype=float)
+    p_lat = np.array([p['coordinates']['lat'] for p in points], dtype=float)
+    p_lng = np.array([p['coordinates']['lng'] for p in points], dtype=float)
+    served = routes_by_meeting_point(routes, p_lat, p_lng) if routes else {}
+    if routes:
+        lengths = route_lengths(routes).tolist()
+        r_lat = np.array([r['coordinates'][0]['lat'] for r in routes], dtype=float)
+        r_lng = np.array([r['coordinates'][0]['lng'] for r in routes], dtype=float)
+    k = min(PLAN_CANDIDATES, len(points))
+    m_per_s = WALKING_M_PER_MIN / 60.0
+    limit = PLAN_MAX_ETA_MIN * 60
+    step = max(1, ASSIGN_CELLS_PER_CHUNK // max(len(points), len(routes)))
+    pairs = []
+    for lo in range(0, len(zones), step):
+        sl = slice(lo, lo + step)
+        d = haversine_m(z_lat[sl, None], z_lng[sl, None], p_lat[None, :], p_lng[None, :])
+        top = np.argpartition(d, k - 1, axis=1)[:, :k] if k < len(points) else np.tile(np.arange(k), (len(d), 1))
+        walk = haversine_m(z_lat[sl, None], z_lng[sl, None], r_lat[None, :], r_lng[None, :]) if routes else None
+        for i, row in enumerate(top.tolist()):
+            for p in row:
+                best, via = float(d[i, p]) * PLAN_DETOUR, None
+                for r, _, _ in served.get(p, []):
+                    m = float(walk[i, r]) + lengths[r]
+                    if m < best:
+                        best, via = m, r
+                eta = int(round(best / m_per_s))
+                if eta <= limit:
+                    pairs.append((lo + i, p, eta, via))
+    return pairs
+
+
+def build_evacuation_plan(batch_size=DEFAULT_BATCH_SIZE):
+    require_numpy()
+    started = now()
+    points = [p for p in get_db()['meetingpoints'].find({'status': 'active'},
+                                                  {'name': 1, 'coordinates': 1, 'capacity': 1, 'occupancy': 1})
+              if meeting_point_capacity(p) > 0]
+    zones = [z for z in get_db()['riskzones'].find({}, {'name': 1, 'coordinates': 1, 'population': 1})
+             if (z.get('population') or 0) > 0]
+    if not points or not zones:
+        print("evacuationplan: needs riskzones with population and active meeting points with capacity")
+        return None
+    routes = [r for r in get_db()['evacuationroutes'].find({'status': 'active'}, {'coordinates': 1})
+              if len(r.get('coordinates', [])) >= 2]
+
+    with timer.stage('evacuation-plan'):
+        solve_started = time.perf_counter()
+        pairs = plan_candidates(zones, points, routes)
+        n_zones, n_points = len(zones), len(points)
+        sink = n_zones + n_points
+        population = [int(z['population']) for z in zones]
+        free = [meeting_point_capacity(p) for p in points]
+        # Flow goes out of whichever side has less in total (people or places),
+        # so most searches end one hop away; sending the sources in a
+        # north-to-south sweep keeps the reshuffles between them local.
+        zones_first = sum(population) <= sum(free)
+        graph = MinCostFlow(sink + 1)
+        arcs = []
+        for z, p, eta, r in pairs:
+            u, v = (z, n_zones + p) if zones_first else (n_zones + p, z)
+            arcs.append((z, p, eta, r, graph.add_arc(u, v, min(population[z], free[p]), eta)))
+        # Dearer than any chain of real trips, so people are only left out when
+        # no reshuffle of the others makes room for them.
+        unserved_cost = (PLAN_MAX_ETA_MIN * 60 + 1) * (min(n_zones, n_points) + 2)
+        if zones_first:
+            sources = {z: population[z] for z in sorted(range(n_zones), key=lambda z: zones[z]['coordinates']['lat'])}
+            for p in range(n_points):
+                graph.add_arc(n_zones + p, sink, free[p], 0)
+        else:
+            sources = {n_zones + p: free[p]
+                       for p in sorted(range(n_points), key=lambda p: points[p]['coordinates']['lat'])}
+            for z in range(n_zones):
+                graph.add_arc(z, sink, population[z], 0)
+        for node, units in sources.items():
+            graph.add_arc(node, sink, units, unserved_cost)
+        graph.solve(sources, sink)
+        solve_s = time.perf_counter() - solve_started
+
+    by_zone, by_point = {}, {}
+    for z, p, eta, r, arc in arcs:
+        people = graph.flow(arc)
+        if people:
+            by_zone.setdefault(z, []).append((eta, p, r, people))
+            by_point.setdefault(p, []).append((z, people))
+    unserved = [population[z] - sum(t[3] for t in by_zone.get(z, [])) for z in range(n_zones)]
+    served_eta = sum(eta * people for trips in by_zone.values() for eta, _, _, people in trips)
+    total_served = sum(population) - sum(unserved)
+
+    def eta_min(seconds):
+        return max(1, math.ceil(seconds / 60))
+
+    def ops():
+        for z, zone in enumerate(zones):
+            trips = sorted(by_zone.get(z, []), key=lambda t: t[0])
+            served = sum(t[3] for t in trips)
+            yield UpdateOne({'key': f"zone:{zone['_id']}"}, {'$set': {
+                'key': f"zone:{zone['_id']}", 'kind': 'zone', 'zoneId': zone['_id'], 'zone': zone['name'],
+                GEO_FIELD: geo_point(zone['coordinates']),
+                'population': population[z], 'served': served, 'unserved': unserved[z],
+                'avgEtaMin': round(sum(t[0] * t[3] for t in trips) / served / 60, 1) if served else None,
+                'assignments': [{
+                    'meetingPointId': points[p]['_id'], 'name': points[p]['name'], 'people': people,
+                    'etaMin': eta_min(eta), 'routeId': routes[r]['_id'] if r is not None else None,
+                } for eta, p, r, people in trips],
+                'builtAt': started,
+            }}, upsert=True)
+        for p, point in enumerate(points):
+            assigned = sum(people for _, people in by_point.get(p, []))
+            yield UpdateOne({'key': f"point:{point['_id']}"}, {'$set': {
+                'key': f"point:{point['_id']}", 'kind': 'meetingpoint', 'meetingPointId': point['_id'],
+                'name': point['name'], GEO_FIELD: geo_point(point['coordinates']),
+                'capacity': free[p], 'assigned': assigned, 'load': round(assigned / free[p], 3),
+                'zones': [{'zoneId': zones[z]['_id'], 'zone': zones[z]['name'], 'people': people}
+                          for z, people in sorted(by_point.get(p, []), key=lambda t: -t[1])],
+                'builtAt': started,
+            }}, upsert=True)
+        yield UpdateOne({'key': 'summary'}, {'$set': {
+            'key': 'summary', 'kind': 'summary',
+            'zones': n_zones, 'meetingPoints': n_points, 'routes': len(routes), 'candidates': len(pairs),
+            'population': sum(population), 'served': total_served, 'unserved': sum(unserved),
+            'capacity': sum(free),
+            'avgEtaMin': round(served_eta / total_served / 60, 1) if total_served else None,
+            'maxEtaMin': eta_min(max((t[0] for trips in by_zone.values() for t in trips), default=0)),
+            'solveSeconds': round(solve_s, 3), 'builtAt': started,
+        }}, upsert=True)
+
+    for batch in batched(ops(), batch_size):
+        get_db()['evacuationplan'].bulk_write(batch, ordered=False)
+    stale = get_db()['evacuationplan'].delete_many({'builtAt': {'$lt': started}}).deleted_count
+    print(f"evacuationplan: {total_served}/{sum(population)} people placed in {n_points} meeting points "
+          f"from {n_zones} zones ({len(pairs)} candidate trips, solved in {solve_s:.2f}s)"
+          + (f", {stale} stale removed" if stale else ""))
+    return total_served
+
+
+# ---------------------------------------------------------------------------
+# Vector tiles (--tiles map.mbtiles)
+#
+# Renders riskzones, meetingpoints and evacuationroutes into Mapbox Vector
+# Tiles stored in an MBTiles (SQLite) file, one layer per collection, for
+# zooms TILE_ZOOMS, so the map can serve static tiles instead of querying
+# every feature. The protobuf encoding is done by hand (it is only varints
+# and packed ints) to avoid another dependency. Features are small next to a
+# tile, so they are not clipped: every tile a feature's bbox touches gets
+# the whole feature, and renderers clip at the tile edge.
+#
+# The file also remembers each feature's content hash and the tiles it was
+# drawn into. A later run re-renders only the tiles of features that were
+# added, changed or removed since; --full rebuilds every tile.
+# ---------------------------------------------------------------------------
+
+TILE_ZOOMS = range(10, 17)
+TILE_EXTENT = 4096
+TILE_BUFFER = 64 / TILE_EXTENT  # fraction of a tile around a feature still drawn
+TILE_LAYERS = {
+    # collection: properties copied into the tile
+    'riskzones': ['name', 'level', 'type', 'population'],
+    'meetingpoints': ['name', 'type', 'capacity', 'status'],
+    'evacuationroutes': ['name', 'status', 'difficulty', 'distance', 'estimatedTime'],
+}
+MVT_POINT, MVT_LINESTRING, MVT_POLYGON = 1, 2, 3
+
+
+def pb_varint(n):
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def pb_key(field, wire):
+    return pb_varint(field << 3 | wire)
+
+
+def pb_bytes(field, data):
+    return pb_key(field, 2) + pb_varint(len(data)) + data
+
+
+def pb_packed(field, values):
+    return pb_bytes(field, b''.join(pb_varint(v) for v in values))
+
+
+def zigzag(n):
+    return (n << 1) ^ (n >> 63)
+
+
+def mvt_value(v):
+    if isinstance(v, bool):
+        return pb_key(7, 0) + pb_varint(int(v))
+    if isinstance(v, int):
+        return pb_key(6, 0) + pb_varint(zigzag(v))
+    if isinstance(v, float):
+        return pb_key(3, 1) + struct.pack('<d', v)
+    return pb_bytes(1, str(v).encode('utf-8'))
+
+
+def mvt_geometry(kind, parts):
+    # parts: lists of integer (x, y) tile coordinates; rings are not closed.
+    cmds, cx, cy = [], 0, 0
+    for part in parts:
+        for i, (x, y) in enumerate(part):
+            if i == 0:
+                cmds.append(1 | (1 << 3))                      # MoveTo(1)
+            elif i == 1:
+                cmds.append(2 | ((len(part) - 1) << 3))        # LineTo(n - 1)
+            cmds += [zigzag(x - cx), zigzag(y - cy)]
+            cx, cy = x, y
+        if kind == MVT_POLYGON:
+            cmds.append(7 | (1 << 3))                          # ClosePath
+    return cmds
+
+
+def mvt_layer(name, features):
+    # features: [(kind, parts, properties)]
+    keys, values, encoded = {}, {}, []
+    for kind, parts, props in features:
+        tags = []
+        for k, v in props.items():
+            if v is None:
+                continue
+            tags += [keys.setdefault(k, len(keys)), values.setdefault((type(v).__name__, v), len(values))]
+        encoded.append(pb_bytes(2, pb_packed(2, tags) + pb_key(3, 0) + pb_varint(kind)
+                                + pb_packed(4, mvt_geometry(kind, parts))))
+    body = pb_key(15, 0) + pb_varint(2) + pb_bytes(1, name.encode('utf-8')) + b''.join(encoded)
+    body += b''.join(pb_bytes(3, k.encode('utf-8')) for k in keys)
+    body += b''.join(pb_bytes(4, mvt_value(v)) for _, v in values)
+    body += pb_key(5, 0) + pb_varint(TILE_EXTENT)
+    return pb_bytes(3, body)
+
+
+def lnglat_to_tile(lng, lat, z):
+    # Fractional XYZ tile coordinates (Web Mercator).
+    n = 2 ** z
+    s = math.sin(math.radians(max(-85.0511, min(85.0511, lat))))
+    return (lng + 180.0) / 360.0 * n, (0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)) * n
+
+
+def tile_feature(name, doc):
+    # (kind, [rings or lines as [lng, lat] lists], properties) or None.
+    doc = route_order(doc) if name == 'evacuationroutes' else doc
+    geom = doc.get(GEO_FIELD) or add_geometry(name, dict(doc)).get(GEO_FIELD)
+    if not geom:
+        return None
+    kind = {'Point': MVT_POINT, 'LineString': MVT_LINESTRING, 'Polygon': MVT_POLYGON}.get(geom['type'])
+    if kind is None:
+        return None
+    coords = geom['coordinates']
+    parts = {MVT_POINT: [[coords]], MVT_LINESTRING: [coords], MVT_POLYGON: coords}[kind]
+    props = {'id': str(doc['_id'])}
+    props.update({k: doc[k] for k in TILE_LAYERS[name] if isinstance(doc.get(k), (str, int, float))})
+    return kind, parts, props
+
+
+def feature_tiles(parts, z):
+    lngs = [p[0] for part in parts for p in part]
+    lats = [p[1] for part in parts for p in part]
+    x0, y0 = lnglat_to_tile(min(lngs), max(lats), z)
+    x1, y1 = lnglat_to_tile(max(lngs), min(lats), z)
+    n = 2 ** z
+    xs = range(max(0, int(x0 - TILE_BUFFER)), min(n - 1, int(x1 + TILE_BUFFER)) + 1)
+    ys = range(max(0, int(y0 - TILE_BUFFER)), min(n - 1, int(y1 + TILE_BUFFER)) + 1)
+    return [(x, y) for x in xs for y in ys]
+
+
+def encode_part(kind, part, z, x, y, exterior=True):
+    pts = []
+    for lng, lat in part:
+        tx, ty = lnglat_to_tile(lng, lat, z)
+        p = (round((tx - x) * TILE_EXTENT), round((ty - y) * TILE_EXTENT))
+        if not pts or pts[-1] != p:        # points that collapse at this zoom
+            pts.append(p)
+    if kind == MVT_POLYGON:
+        if len(pts) > 1 and pts[0] == pts[-1]:
+            pts.pop()
+        if len(pts) < 3:
+            return None
+        # Exterior rings need positive area in tile coordinates (y down), holes negative.
+        area = sum(ax * by - bx * ay for (ax, ay), (bx, by) in zip(pts, pts[1:] + pts[:1]))
+        if (area < 0) == exterior:
+            pts.reverse()
+    elif kind == MVT_LINESTRING and len(pts) < 2:
+        return None
+    return pts
+
+
+def render_tile(features, z, x, y):
+    layers = b''
+    for name in TILE_LAYERS:
+        encoded = []
+        for kind, parts, props in features.get(name, []):
+            pts = [encode_part(kind, part, z, x, y, exterior=i == 0) for i, part in enumerate(parts)]
+            if not pts[0]:
+                continue               # too small to draw at this zoom
+            encoded.append((kind, [p for p in pts if p], props))
+        if encoded:
+            layers += mvt_layer(name, encoded)
+    return layers
+
+
+TILES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB,
+                                  PRIMARY KEY (zoom_level, tile_column, tile_row));
+CREATE TABLE IF NOT EXISTS feature_hashes (layer TEXT, fid TEXT, hash TEXT, PRIMARY KEY (layer, fid));
+CREATE TABLE IF NOT EXISTS feature_tiles (layer TEXT, fid TEXT, z INTEGER, x INTEGER, y INTEGER);
+CREATE INDEX IF NOT EXISTS feature_tiles_feature ON feature_tiles (layer, fid);
+CREATE INDEX IF NOT EXISTS feature_tiles_tile ON feature_tiles (z, x, y);
+"""
+
+
+def build_tiles(path, full=False):
+    import sqlite3
+    started = time.perf_counter()
+    features = {}
+    for name, props in TILE_LAYERS.items():
+        fields = {f: 1 for f in props + ['coordinates', 'radius', GEO_FIELD]}
+        for doc in get_db()[name].find({}, fields):
+            f = tile_feature(name, doc)
+            if f is not None:
+                raw = json.dumps([f[0], f[1], f[2]], sort_keys=True, default=str)
+                features[(name, f[2]['id'])] = (f, hashlib.sha256(raw.encode('utf-8')).hexdigest())
+
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(TILES_SCHEMA)
+        if full:
+            conn.executescript("DELETE FROM tiles; DELETE FROM feature_hashes; DELETE FROM feature_tiles;")
+        stored = {(layer, fid): h for layer, fid, h in conn.execute("SELECT layer, fid, hash FROM feature_hashes")}
+        changed = [k for k, (_, h) in features.items() if stored.get(k) != h]
+        removed = [k for k in stored if k not in features]
+        dirty = set()
+        for layer, fid in changed + removed:
+            dirty.update(conn.execute("SELECT z, x, y FROM feature_tiles WHERE layer = ? AND fid = ?", (layer, fid)))
+        conn.executemany("DELETE FROM feature_tiles WHERE layer = ? AND fid = ?", changed + removed)
+        conn.executemany("DELETE FROM feature_hashes WHERE layer = ? AND fid = ?", removed)
+        rows = []
+        for key in changed:
+            (kind, parts, _), h = features[key]
+            for z in TILE_ZOOMS:
+                for x, y in feature_tiles(parts, z):
+                    rows.append((*key, z, x, y))
+                    dirty.add((z, x, y))
+        conn.executemany("INSERT INTO feature_tiles VALUES (?, ?, ?, ?, ?)", rows)
+        conn.executemany("INSERT OR REPLACE INTO feature_hashes VALUES (?, ?, ?)",
+                         [(*key, features[key][1]) for key in changed])
+
+        written = deleted = 0
+        for z, x, y in sorted(dirty):
+            in_tile = {}
+            for layer, fid in conn.execute("SELECT layer, fid FROM feature_tiles WHERE z = ? AND x = ? AND y = ?",
+                                           (z, x, y)):
+                in_tile.setdefault(layer, []).append(features[(layer, fid)][0])
+            for layer in in_tile:
+                in_tile[layer].sort(key=lambda f: f[2]['id'])
+            data = render_tile(in_tile, z, x, y)
+            tms_y = 2 ** z - 1 - y
+            if data:
+                conn.execute("INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?)",
+                             (z, x, tms_y, gzip.compress(data, mtime=0)))
+                written += 1
+            else:
+                conn.execute("DELETE FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                             (z, x, tms_y))
+                deleted += 1
+        write_tiles_metadata(conn, features)
+        conn.commit()
+    finally:
+        conn.close()
+    timer.add('tiles', time.perf_counter() - started, written)
+    print(f"tiles: {len(changed)} features changed, {len(removed)} removed; "
+          f"{written} tiles written, {deleted} emptied ({path})")
+    return written
+
+
+def write_tiles_metadata(conn, features):
+    lngs = [p[0] for (f, _) in features.values() for part in f[1] for p in part]
+    lats = [p[1] for (f, _) in features.values() for part in f[1] for p in part]
+    bounds = [min(lngs), min(lats), max(lngs), max(lats)] if lngs else [-180, -85, 180, 85]
+    layers = [{'id': name, 'fields': {k: 'String' if k in ('id', 'name', 'level', 'type', 'status', 'difficulty')
+                                      else 'Number' for k in ['id'] + props},
+               'minzoom': TILE_ZOOMS[0], 'maxzoom': TILE_ZOOMS[-1]}
+              for name, props in TILE_LAYERS.items()]
+    meta = {
+        'name': f"{get_db().name} map",
+        'format': 'pbf',
+        'type': 'overlay',
+        'minzoom': str(TILE_ZOOMS[0]),
+        'maxzoom': str(TILE_ZOOMS[-1]),
+        'bounds': ','.join(f"{v:.6f}" for v in bounds),
+        'center': f"{(bounds[0] + bounds[2]) / 2:.6f},{(bounds[1] + bounds[3]) / 2:.6f},{TILE_ZOOMS[0] + 3}",
+        'json': json.dumps({'vector_layers': layers}),
+    }
+    conn.executemany("INSERT OR REPLACE INTO metadata VALUES (?, ?)", meta.items())
+
+
+# ---------------------------------------------------------------------------
+# Model schemas
+#
+# Python copies of the $jsonSchema validators in src/lib/models/*.model.ts.
+# Keep them in sync when a model changes.
+# ---------------------------------------------------------------------------
+
+CATEGORIES = ["primeros-auxilios", "evacuacion", "prevencion", "respuesta", "otro"]
+_DATE = {'bsonType': 'date'}
+
+MODEL_SCHEMAS = {
+    'users': {
+        'bsonType': 'object',
+        'required': ['name', 'email', 'password', 'role'],
+        'properties': {
+            'name': {'bsonType': 'string', 'minLength': 2},
+            'email': {'bsonType': 'string', 'pattern': r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'},
+            'password': {'bsonType': 'string', 'minLength': 6},
+            'role': {'enum': ['user', 'admin']},
+            'phone': {'bsonType': 'string'},
+            'createdAt': _DATE,
+            'updatedAt': _DATE,
+        },
+    },
+    'alerts': {
+        'bsonType': 'object',
+        'required': ['title', 'description', 'type', 'severity', 'location', 'status', 'userId'],
+        'properties': {
+            'title': {'bsonType': 'string', 'minLength': 3},
+            'description': {'bsonType': 'string', 'minLength': 10},
+            'type': {'enum': ALERT_TYPES},
+            'severity': {'enum': ALERT_SEVERITIES},
+            'location': {
+                'bsonType': 'object',
+                'required': ['address'],
+                'properties': {
+                    'address': {'bsonType': 'string'},
+                    'coordinates': {
+                        'bsonType': 'object',
+                        'properties': {'lat': {'bsonType': 'double'}, 'lng': {'bsonType': 'double'}},
+                    },
+                },
+            },
+            'status': {'enum': ALERT_STATUSES},
+            'userId': {'bsonType': 'objectId'},
+            'assignedTo': {'bsonType': 'objectId'},
+            'createdAt': _DATE,
+            'updatedAt': _DATE,
+            'resolvedAt': _DATE,
+        },
+    },
+    'incidents': {
+        'bsonType': 'object',
+        'required': ['title', 'description', 'type', 'severity', 'location', 'reporter'],
+        'properties': {
+            'title': {'bsonType': 'string', 'minLength': 3},
+            'description': {'bsonType': 'string', 'minLength': 10},
+            'type': {'enum': INCIDENT_TYPES},
+            'severity': {'enum': INCIDENT_SEVERITIES},
+            'status': {'enum': INCIDENT_STATUSES},
+            'location': {
+                'bsonType': 'object',
+                'required': ['type', 'coordinates'],
+                'properties': {
+                    'type': {'enum': ['Point']},
+                    'coordinates': {'bsonType': 'array', 'items': {'bsonType': 'double'},
+                                    'minItems': 2, 'maxItems': 2},
+                    'address': {'bsonType': 'string'},
+                    'city': {'bsonType': 'string'},
+                    'department': {'bsonType': 'string'},
+                },
+            },
+            'reporter': {
+                'bsonType': 'object',
+                'required': ['name'],
+                'properties': {
+                    'name': {'bsonType': 'string'},
+                    'phone': {'bsonType': 'string'},
+                    'email': {'bsonType': 'string'},
+                    'userId': {'bsonType': 'objectId'},
+                },
+            },
+            'attachments': {
+                'bsonType': 'array',
+                'items': {
+                    'bsonType': 'object',
+                    'required': ['url', 'type', 'fileName', 'uploadedAt'],
+                    'properties': {
+                        'url': {'bsonType': 'string'},
+                        'type': {'enum': ['image', 'video']},
+                        'fileName': {'bsonType': 'string'},
+                        'uploadedAt': _DATE,
+                    },
+                },
+            },
+            'affectedPeople': {'bsonType': 'int', 'minimum': 0},
+            'responseTeam': {
+                'bsonType': 'object',
+                'properties': {
+                    'teamId': {'bsonType': 'string'},
+                    'assignedAt': _DATE,
+                    'arrivedAt': _DATE,
+                    'resolvedAt': _DATE,
+                },
+            },
+            'notes': {'bsonType': 'string'},
+            'createdAt': _DATE,
+            'updatedAt': _DATE,
+        },
+    },
+    'riskzones': {
+        'bsonType': 'object',
+        'required': ['name', 'level', 'type', 'coordinates', 'radius', 'population'],
+        'properties': {
+            'name': {'bsonType': 'string', 'minLength': 3},
+            'level': {'enum': ZONE_LEVELS},
+            'type': {'enum': ZONE_TYPES},
+            'coordinates': {
+                'bsonType': 'object',
+                'required': ['lat', 'lng'],
+                'properties': {
+                    'lat': {'bsonType': 'double', 'minimum': -90, 'maximum': 90},
+                    'lng': {'bsonType': 'double', 'minimum': -180, 'maximum': 180},
+                },
+            },
+            'radius': {'bsonType': 'int', 'minimum': 100},
+            'population': {'bsonType': 'int', 'minimum': 0},
+            'incidents': {'bsonType': 'int', 'minimum': 0},
+            'description': {'bsonType': 'string'},
+            'lastUpdated': _DATE,
+            'createdAt': _DATE,
+        },
+    },
+    'meetingpoints': {
+        'bsonType': 'object',
+        'required': ['name', 'type', 'address', 'coordinates', 'capacity', 'status'],
+        'properties': {
+            'name': {'bsonType': 'string', 'minLength': 3},
+            'type': {'enum': ['primary', 'secondary', 'emergency']},
+            'address': {'bsonType': 'string'},
+            'coordinates': {
+                'bsonType': 'object',
+                'required': ['lat', 'lng'],
+                'properties': {'lat': {'bsonType': 'double'}, 'lng': {'bsonType': 'double'}},
+            },
+            'capacity': {'bsonType': 'int', 'minimum': 50},
+            'facilities': {'bsonType': 'array', 'items': {'bsonType': 'string'}},
+            'accessibility': {'bsonType': 'bool'},
+            'contact': {
+                'bsonType': 'object',
+                'required': ['phone'],
+                'properties': {'phone': {'bsonType': 'string'}, 'email': {'bsonType': 'string'}},
+            },
+            'status': {'enum': ['active', 'inactive', 'maintenance']},
+            'createdAt': _DATE,
+            'updatedAt': _DATE,
+        },
+    },
+    'evacuationroutes': {
+        'bsonType': 'object',
+        'required': ['name', 'coordinates', 'startPoint', 'endPoint', 'distance', 'difficulty', 'status'],
+        'properties': {
+            'name': {'bsonType': 'string', 'minLength': 3},
+            'description': {'bsonType': 'string'},
+            'coordinates': {
+                'bsonType': 'array',
+                'minItems': 2,
+                'items': {
+                    'bsonType': 'object',
+                    'required': ['lat', 'lng', 'order'],
+                    'properties': {
+                        'lat': {'bsonType': 'double', 'minimum': -90, 'maximum': 90},
+                        'lng': {'bsonType': 'double', 'minimum': -180, 'maximum': 180},
+                        'order': {'bsonType': 'int', 'minimum': 0},
+                    },
+                },
+            },
+            'startPoint': {
+                'bsonType': 'object',
+                'required': ['name', 'lat', 'lng'],
+                'properties': {'name': {'bsonType': 'string'}, 'lat': {'bsonType': 'double'},
+                               'lng': {'bsonType': 'double'}},
+            },
+            'endPoint': {
+                'bsonType': 'object',
+                'required': ['name', 'lat', 'lng'],
+                'properties': {'name': {'bsonType': 'string'}, 'lat': {'bsonType': 'double'},
+                               'lng': {'bsonType': 'double'}},
+            },
+            'distance': {'bsonType': 'int', 'minimum': 0},
+            'estimatedTime': {'bsonType': 'int', 'minimum': 0},
+            'difficulty': {'enum': ['easy', 'moderate', 'difficult']},
+            'status': {'enum': ['active', 'inactive', 'blocked']},
+            'accessibility': {'bsonType': 'bool'},
+            'warnings': {'bsonType': 'array', 'items': {'bsonType': 'string'}},
+            'createdAt': _DATE,
+            'updatedAt': _DATE,
+        },
+    },
+    'courses': {
+        'bsonType': 'object',
+        'required': ['title', 'description', 'category', 'level', 'duration', 'instructor', 'status'],
+        'properties': {
+            'title': {'bsonType': 'string', 'minLength': 5},
+            'description': {'bsonType': 'string', 'minLength': 20},
+            'category': {'enum': CATEGORIES},
+            'level': {'enum': ['basico', 'intermedio', 'avanzado']},
+            'duration': {'bsonType': 'int', 'minimum': 1},
+            'instructor': {'bsonType': 'string'},
+            'thumbnail': {'bsonType': 'string'},
+            'enrollments': {'bsonType': 'int', 'minimum': 0},
+            'rating': {'bsonType': 'double', 'minimum': 0, 'maximum': 5},
+            'status': {'enum': ['draft', 'published', 'archived']},
+            'createdAt': _DATE,
+            'updatedAt': _DATE,
+        },
+    },
+    'videos': {
+        'bsonType': 'object',
+        'required': ['title', 'description', 'youtubeId', 'category', 'status'],
+        'properties': {
+            'title': {'bsonType': 'string', 'minLength': 5},
+            'description': {'bsonType': 'string', 'minLength': 10},
+            'youtubeId': {'bsonType': 'string', 'minLength': 11, 'maxLength': 11},
+            'category': {'enum': CATEGORIES},
+            'duration': {'bsonType': 'int', 'minimum': 0},
+            'views': {'bsonType': 'int', 'minimum': 0},
+            'thumbnail': {'bsonType': 'string'},
+            'tags': {'bsonType': 'array', 'items': {'bsonType': 'string'}},
+            'status': {'enum': ['active', 'inactive']},
+            'createdAt': _DATE,
+            'updatedAt': _DATE,
+        },
+    },
+    'resources': {
+        'bsonType': 'object',
+        'required': ['title', 'description', 'type', 'category', 'fileUrl', 'status'],
+        'properties': {
+            'title': {'bsonType': 'string', 'minLength': 5},
+            'description': {'bsonType': 'string', 'minLength': 10},
+            'type': {'enum': ['pdf', 'document', 'guide', 'manual', 'infographic']},
+            'category': {'enum': CATEGORIES},
+            'fileUrl': {'bsonType': 'string'},
+            'fileSize': {'bsonType': 'int', 'minimum': 0},
+            'downloads': {'bsonType': 'int', 'minimum': 0},
+            'thumbnail': {'bsonType': 'string'},
+            'tags': {'bsonType': 'array', 'items': {'bsonType': 'string'}},
+            'status': {'enum': ['active', 'inactive']},
+            'createdAt': _DATE,
+            'updatedAt': _DATE,
+        },
+    },
+}
+
+
+BSON_TYPE_CHECKS = {
+    'string': lambda v: isinstance(v, str),
+    'int': lambda v: isinstance(v, int) and not isinstance(v, bool) and -2**31 <= v < 2**31,
+    'long': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'double': lambda v: isinstance(v, float),
+    'bool': lambda v: isinstance(v, bool),
+    'date': lambda v: isinstance(v, datetime),
+    'objectId': lambda v: isinstance(v, ObjectId),
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list),
+}
+
+
+def parse_date(value):
+    d = datetime.fromisoformat(value.strip())
+    if d.tzinfo is not None:
+        d = d.astimezone(timezone.utc).replace(tzinfo=None)
+    return d
+
+
+def coerce(value, schema):
+    # Converts JSON/CSV scalars to the BSON type the schema asks for when that
+    # is unambiguous ("4" -> 4, 4 -> 4.0 for doubles, ISO strings -> dates).
+    t = schema.get('bsonType')
+    try:
+        if isinstance(value, str) and t not in (None, 'string'):
+            if t == 'int' or t == 'long':
+                value = int(value)
+            elif t == 'double':
+                value = float(value)
+            elif t == 'bool' and value.lower() in ('true', 'false', '1', '0'):
+                value = value.lower() in ('true', '1')
+            elif t == 'date':
+                value = parse_date(value)
+            elif t == 'objectId' and ObjectId.is_valid(value):
+                value = ObjectId(value)
+            elif t == 'array':
+                value = json.loads(value) if value.startswith('[') else value.split('|')
+            elif t == 'object' and value.startswith('{'):
+                value = json_util.loads(value)
+        elif t == 'double' and isinstance(value, int) and not isinstance(value, bool):
+            value = float(value)
+        elif t in ('int', 'long') and isinstance(value, float) and value.is_integer():
+            value = int(value)
+    except ValueError:
+        return value  # left as is; validation reports it
+
+    if isinstance(value, dict) and 'properties' in schema:
+        for k, sub in schema['properties'].items():
+            if k in value:
+                value[k] = coerce(value[k], sub)
+    elif isinstance(value, list) and 'items' in schema:
+        value = [coerce(v, schema['items']) for v in value]
+    return value
+
+
+def compile_schema(schema, path='$'):
+    # Turns a $jsonSchema subset into a function check(value, errors) that
+    # appends error strings; all keyword lookups happen once, here. Array
+    # items are reported as path[] rather than per index.
+    checks = []
+    t = schema.get('bsonType')
+    type_ok = BSON_TYPE_CHECKS.get(t)
+    if 'enum' in schema:
+        allowed = schema['enum']
+        checks.append(lambda v, errors: v in allowed or errors.append(f"{path}: {v!r} not in {allowed}"))
+    if 'minLength' in schema or 'maxLength' in schema or 'pattern' in schema:
+        lo, hi = schema.get('minLength', 0), schema.get('maxLength')
+        pattern = re.compile(schema['pattern']) if 'pattern' in schema else None
+
+        def check_string(v, errors):
+            if not isinstance(v, str):
+                return
+            if len(v) < lo:
+                errors.append(f"{path}: shorter than {lo}")
+            if hi is not None and len(v) > hi:
+                errors.append(f"{path}: longer than {hi}")
+            if pattern is not None and not pattern.search(v):
+                errors.append(f"{path}: does not match {pattern.pattern}")
+        checks.append(check_string)
+    if 'minimum' in schema or 'maximum' in schema:
+        lo, hi = schema.get('minimum'), schema.get('maximum')
+
+        def check_range(v, errors):
+            if not isinstance(v, (int, float)) or isinstance(v, bool):
+                return
+            if lo is not None and v < lo:
+                errors.append(f"{path}: below {lo}")
+            if hi is not None and v > hi:
+                errors.append(f"{path}: above {hi}")
+        checks.append(check_range)
+    if 'required' in schema or 'properties' in schema:
+        required = schema.get('required', [])
+        props = [(k, compile_schema(sub, f"{path}.{k}")) for k, sub in schema.get('properties', {}).items()]
+
+        def check_object(v, errors):
+            if not isinstance(v, dict):
+                return
+            for k in required:
+                if k not in v:
+                    errors.append(f"{path}.{k}: required")
+            for k, check in props:
+                if k in v:
+                    check(v[k], errors)
+        checks.append(check_object)
+    if 'items' in schema or 'minItems' in schema or 'maxItems' in schema:
+        lo, hi = schema.get('minItems', 0), schema.get('maxItems')
+        item = compile_schema(schema['items'], f"{path}[]") if 'items' in schema else None
+
+        def check_array(v, errors):
+            if not isinstance(v, list):
+                return
+            if len(v) < lo:
+                errors.append(f"{path}: fewer than {lo} items")
+            if hi is not None and len(v) > hi:
+                errors.append(f"{path}: more than {hi} items")
+            if item is not None:
+                for x in v:
+                    item(x, errors)
+        checks.append(check_array)
+
+    def check(value, errors):
+        if type_ok is not None and not type_ok(value):
+            errors.append(f"{path}: expected {t}, got {type(value).__name__}")
+            return
+        for c in checks:
+            c(value, errors)
+    return check
+
+
+_validators = {}
+
+
+def validator(name):
+    # Compiled check for MODEL_SCHEMAS[name]: validator(name)(doc) -> [errors].
+    if name not in _validators:
+        check = compile_schema(MODEL_SCHEMAS[name])
+
+        def validate(doc):
+            errors = []
+            check(doc, errors)
+            return errors
+        _validators[name] = validate
+    return _validators[name]
+
+
+# ---------------------------------------------------------------------------
+# Collection validators (--validate)
+#
+# Creates (or collMods) every modelled collection with its $jsonSchema
+# validator, and checks each batch in-process with the compiled validator
+# before it is sent. With validationAction "error" the server would reject
+# an invalid document, so it is moved to `quarantine` (with its errors)
+# instead and the rest of the batch is written; with "warn" the batch is
+# written whole and invalid documents are only counted.
+#
+# Existing collections get validationLevel "moderate", so documents that were
+# already invalid can still be updated in place by the later jobs.
+# ---------------------------------------------------------------------------
+
+VALIDATED = {}                 # collection -> validationAction; filled from --validate
+QUARANTINE = 'quarantine'
+
+
+def install_validators(action='warn', collections=None):
+    db = get_db()
+    existing = set(db.list_collection_names())
+    for name in collections or MODEL_SCHEMAS:
+        spec = {'$jsonSchema': MODEL_SCHEMAS[name]}
+        if name in existing:
+            db.command('collMod', name, validator=spec, validationLevel='moderate', validationAction=action)
+        else:
+            db.create_collection(name, validator=spec, validationLevel='strict', validationAction=action)
+        VALIDATED[name] = action
+    print(f"Validators installed on {len(VALIDATED)} collections (validationAction={action})")
+
+
+def validate_batch(name, batch):
+    # Returns (documents to send, number of invalid documents).
+    check = validator(name)
+    good, bad = [], []
+    for d in batch:
+        errors = check(d)
+        if errors:
+            bad.append({'collection': name, 'errors': errors, 'document': d, 'quarantinedAt': now()})
+        else:
+            good.append(d)
+    if not bad:
+        return batch, 0
+    if VALIDATED[name] == 'warn':
+        return batch, len(bad)
+    get_db()[QUARANTINE].insert_many(bad, ordered=False)
+    return good, len(bad)
+
+
+# ---------------------------------------------------------------------------
+# File import (--import)
+#
+# Streams <collection>.ndjson / .jsonl / .csv files, optionally .gz/.bz2/.xz
+# compressed, into bulk_load. Files are memory-mapped and read line by line,
+# so memory stays flat regardless of file size. NDJSON may use MongoDB
+# extended JSON ({"$date": ...}, {"$oid": ...}); CSV headers may use dotted
+# paths ("coordinates.lat") and "a|b|c" for string arrays. Every record is
+# coerced and checked against MODEL_SCHEMAS; rejects go to
+# <file>.rejects.ndjson with the reason and the import carries on.
+# ---------------------------------------------------------------------------
+
+DECOMPRESSORS = {
+    '.gz': lambda raw: gzip.GzipFile(fileobj=raw, mode='rb'),
+    '.bz2': lambda raw: bz2.BZ2File(raw, mode='rb'),
+    '.xz': lambda raw: lzma.LZMAFile(raw, mode='rb'),
+}
+
+
+@contextmanager
+def mapped_lines(path):
+    # Yields an iterator of raw byte lines.
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield iter(())
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if hasattr(mm, 'madvise'):
+                mm.madvise(mmap.MADV_SEQUENTIAL)
+            opener = DECOMPRESSORS.get(os.path.splitext(path)[1])
+            stream = opener(mm) if opener else mm
+            try:
+                yield iter(stream.readline, b'')
+            finally:
+                if opener:
+                    stream.close()
+
+
+def import_target(spec):
+    # "alerts=path/to/file.csv" or "path/to/alerts.ndjson.gz"
+    if '=' in spec:
+        name, path = spec.split('=', 1)
+    else:
+        path = spec
+        name = os.path.basename(path).split('.')[0]
+    return name, path
+
+
+def unflatten(row):
+    doc = {}
+    for key, value in row.items():
+        if key is None or value is None or value == '':
+            continue
+        parts = key.split('.')
+        cur = doc
+        for p in parts[:-1]:
+            cur = cur.setdefault(p, {})
+        cur[parts[-1]] = value
+    return doc
+
+
+def read_records(path):
+    # Yields (line number, document or None, raw text).
+    is_csv = 'csv' in os.path.basename(path).split('.')[1:]
+    with mapped_lines(path) as lines:
+        text = (line.decode('utf-8-sig') for line in lines)
+        if is_csv:
+            reader = csv.DictReader(text)
+            for row in reader:
+                yield reader.line_num, unflatten(row), None
+            return
+        for n, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield n, json_util.loads(line), line
+            except ValueError as e:
+                yield n, None, line.rstrip('\n') + f"  # {e}"
+
+
+def import_records(name, path, stats):
+    schema = MODEL_SCHEMAS.get(name)
+    check = validator(name) if schema is not None else None
+    rejects_path = path + '.rejects.ndjson'
+    if os.path.exists(rejects_path):
+        os.remove(rejects_path)  # don't leave a previous run's rejects behind
+    rejects = None
+    try:
+        for line_no, doc, raw in read_records(path):
+            stats['read'] += 1
+            if doc is None:
+                errors = ["invalid JSON"]
+            elif not isinstance(doc, dict):
+                errors = ["not a JSON object"]
+            elif schema is None:
+                errors = []
+            else:
+                doc = coerce(doc, schema)
+                errors = check(doc)
+            if errors:
+                stats['rejected'] += 1
+                if rejects is None:
+                    rejects = open(rejects_path, 'w', encoding='utf-8')
+                rejects.write(json_util.dumps({'line': line_no, 'errors': errors,
+                                               'record': doc if doc is not None else raw}) + '\n')
+                continue
+            yield add_search_tokens(name, add_geometry(name, doc))
+    finally:
+        if rejects is not None:
+            rejects.close()
+
+
+def import_files(specs, batch_size=DEFAULT_BATCH_SIZE, write_concern=None, workers=None):
+    by_collection = {}
+    for spec in specs:
+        name, path = import_target(spec)
+        by_collection.setdefault(name, []).append(path)
+
+    stats = {path: {'read': 0, 'rejected': 0} for paths in by_collection.values() for path in paths}
+
+    def chain_files(name, paths):
+        for path in paths:
+            yield from import_records(name, path, stats[path])
+
+    with timer.stage('import'):
+        result = bulk_load({name: chain_files(name, paths) for name, paths in by_collection.items()},
+                           batch_size=batch_size, write_concern=write_concern, workers=workers)
+    for path, st in stats.items():
+        msg = f"Imported {path}: {st['read'] - st['rejected']} of {st['read']} records"
+        if st['rejected']:
+            msg += f", {st['rejected']} rejected (see {path}.rejects.ndjson)"
+        print(msg)
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Snapshot / restore (--snapshot DIR, --restore DIR)
+#
+# A snapshot is one gzip'd file of concatenated raw BSON per collection
+# (mongodump's format, compressed) plus manifest.json with document counts,
+# index definitions and collection options. Documents are copied as raw bytes
+# in both directions and never decoded into Python dicts.
+#
+# Restore loads every collection in parallel into a <name>__restore staging
+# collection created with the original options, adds its indexes and
+# validator only once the data is in, and then swaps it in with
+# renameCollection(dropTarget), so readers see the old data until the new
+# copy is complete.
+# ---------------------------------------------------------------------------
+
+SNAPSHOT_GZIP_LEVEL = 1        # favour speed; BSON still shrinks ~4x
+SNAPSHOT_CODEC = CodecOptions(document_class=RawBSONDocument)
+RESTORE_SUFFIX = '__restore'
+# Applied after the staging collection is loaded, so documents that predate
+# the current validator are restored as they were snapshotted.
+VALIDATION_OPTIONS = ('validator', 'validationLevel', 'validationAction')
+
+
+def count_raw_documents(raw):
+    n = off = 0
+    while off < len(raw):
+        off += int.from_bytes(raw[off:off + 4], 'little')
+        n += 1
+    return n
+
+
+def index_specs(name):
+    specs = []
+    for idx_name, info in get_db()[name].index_information().items():
+        if idx_name == '_id_':
+            continue
+        options = {k: v for k, v in info.items() if k not in ('key', 'v', 'ns')}
+        specs.append({'name': idx_name, 'key': [list(k) for k in info['key']], 'options': options})
+    return specs
+
+
+def collection_options(name):
+    # create_collection options (validator, collation, capped, ...) of `name`.
+    info = next(get_db().list_collections(filter={'name': name}), None)
+    return dict(info.get('options', {})) if info else {}
+
+
+def snapshot_collection(name, directory):
+    path = os.path.join(directory, f"{name}.bson.gz")
+    count = size = 0
+    with gzip.open(path, 'wb', compresslevel=SNAPSHOT_GZIP_LEVEL) as f:
+        for raw in get_db()[name].find_raw_batches():
+            f.write(raw)
+            count += count_raw_documents(raw)
+            size += len(raw)
+    return {'file': os.path.basename(path), 'count': count, 'bsonBytes': size, 'indexes': index_specs(name),
+            'options': collection_options(name)}
+
+
+def snapshot_files(directory):
+    # Files a previous snapshot wrote to `directory`; refuses anything else, so
+    # --snapshot never deletes files it did not create.
+    path = os.path.join(directory, 'manifest.json')
+    if not os.path.isdir(directory) or not os.path.isfile(path):
+        raise SystemExit(f"{directory} exists and does not hold a snapshot; choose a new directory")
+    with open(path, encoding='utf-8') as f:
+        manifest = json_util.loads(f.read())
+    return ['manifest.json'] + [spec['file'] for spec in manifest['collections'].values()]
+
+
+def snapshot(directory, collections=None, workers=None):
+    collections = collections or MANAGED_COLLECTIONS
+    old_files = snapshot_files(directory) if os.path.exists(directory) else None
+    tmp = directory.rstrip('/') + '.tmp'
+    os.makedirs(tmp, exist_ok=True)
+    with timer.stage('snapshot'), ThreadPoolExecutor(max_workers=workers or len(collections)) as pool:
+        futures = {name: pool.submit(snapshot_collection, name, tmp) for name in collections}
+        manifest = {
+            'created': now().isoformat() + 'Z',
+            'db': get_db().name,
+            'collections': {name: f.result() for name, f in futures.items()},
+        }
+    with open(os.path.join(tmp, 'manifest.json'), 'w', encoding='utf-8') as f:
+        f.write(json_util.dumps(manifest, indent=2))
+    # Replace the old snapshot only once the new one is complete, touching
+    # only the files its manifest lists; the manifest moves in last.
+    if old_files is None:
+        os.rename(tmp, directory)
+    else:
+        new_files = [spec['file'] for spec in manifest['collections'].values()] + ['manifest.json']
+        for old in set(old_files) - set(new_files):
+            if os.path.isfile(os.path.join(directory, old)):
+                os.remove(os.path.join(directory, old))
+        for new in new_files:
+            os.replace(os.path.join(tmp, new), os.path.join(directory, new))
+        os.rmdir(tmp)
+    total = sum(c['count'] for c in manifest['collections'].values())
+    print(f"Snapshot of {len(collections)} collections ({total} documents) written to {directory}")
+    return manifest
+
+
+def snapshot_documents(path):
+    with gzip.open(path, 'rb') as f:
+        yield from decode_file_iter(f, codec_options=SNAPSHOT_CODEC)
+
+
+def finish_restore(name, spec):
+    staging = get_db()[name + RESTORE_SUFFIX]
+    models = [IndexModel([tuple(k) for k in ix['key']], name=ix['name'], **ix['options'])
+              for ix in spec['indexes']]
+    if models:
+        staging.create_indexes(models)
+    validation = {k: v for k, v in spec.get('options', {}).items() if k in VALIDATION_OPTIONS}
+    if validation:
+        get_db().command('collMod', staging.name, **validation)
+    staging.rename(name, dropTarget=True)
+
+
+def restore(directory, batch_size=DEFAULT_BATCH_SIZE, write_concern=None, workers=None):
+    with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json_util.loads(f.read())
+    specs = manifest['collections']
+    for name, spec in specs.items():
+        # Snapshots older than the options field get a plain collection.
+        options = {k: v for k, v in spec.get('options', {}).items() if k not in VALIDATION_OPTIONS}
+        get_db().drop_collection(name + RESTORE_SUFFIX)
+        get_db().create_collection(name + RESTORE_SUFFIX, **options)
+
+    with timer.stage('restore'):
+        stats = bulk_load({name + RESTORE_SUFFIX: snapshot_documents(os.path.join(directory, spec['file']))
+                           for name, spec in specs.items()},
+                          batch_size=batch_size, write_concern=write_concern, workers=workers)
+        for name, spec in specs.items():
+            loaded = stats[name + RESTORE_SUFFIX]['inserted']
+            if loaded != spec['count']:
+                raise SystemExit(f"Restore of {name} loaded {loaded} of {spec['count']} documents; "
+                                 f"staging collection {name + RESTORE_SUFFIX} left in place")
+        with ThreadPoolExecutor(max_workers=workers or len(specs)) as pool:
+            for f in [pool.submit(finish_restore, name, spec) for name, spec in specs.items()]:
+                f.result()
+    print(f"Restored {len(specs)} collections from {directory}")
+    return stats
+
+
+# ---------------------------------------------------------------------------
+# Indexes
+#
+# One entry per query shape the API runs; see the route noted next to each.
+# Names are fixed so re-running is a no-op and a changed definition can be
+# detected and rebuilt.
+# ---------------------------------------------------------------------------
+
+INDEXES = {
+    'alerts': [
+        # /api/alerts: find({}).sort({createdAt: -1}).limit(50)
+        IndexModel([('createdAt', DESCENDING)], name='createdAt_desc'),
+        IndexModel([('title', ASCENDING)], name='seed_key'),
+        IndexModel([(GEO_FIELD, GEOSPHERE)], name='geometry_2dsphere'),
+        IndexModel([('zoneId', ASCENDING), ('createdAt', DESCENDING)], name='zoneId_createdAt'),
+        search_index('alerts'),
+        IndexModel([('searchTokens', ASCENDING)], name='searchTokens'),
+    ],
+    'incidents': [
+        # /api/incidents, /api/dashboard/incidents: sort({createdAt: -1}) with optional filters
+        IndexModel([('createdAt', DESCENDING)], name='createdAt_desc'),
+        IndexModel([('status', ASCENDING), ('createdAt', DESCENDING)], name='status_createdAt'),
+        IndexModel([('severity', ASCENDING), ('createdAt', DESCENDING)], name='severity_createdAt'),
+        IndexModel([('type', ASCENDING), ('createdAt', DESCENDING)], name='type_createdAt'),
+        # /api/dashboard/zone-stats: everything filters on location.neighborhood
+        IndexModel([('location.neighborhood', ASCENDING), ('createdAt', DESCENDING)],
+                   name='neighborhood_createdAt'),
+        IndexModel([('location.neighborhood', ASCENDING), ('status', ASCENDING)], name='neighborhood_status'),
+        IndexModel([('location.neighborhood', ASCENDING), ('severity', ASCENDING)],
+                   name='neighborhood_severity'),
+        IndexModel([('location', GEOSPHERE)], name='location_2dsphere'),
+        IndexModel([('zoneId', ASCENDING), ('createdAt', DESCENDING)], name='zoneId_createdAt'),
+        # Rollup jobs pick up changed incidents by updatedAt.
+        IndexModel([('updatedAt', ASCENDING)], name='updatedAt'),
+    ],
+    'dashboardstats': [
+        # /api/dashboard/calculate-stats upserts on {date}
+        IndexModel([('date', ASCENDING)], name='date_unique', unique=True),
+    ],
+    'users': [
+        IndexModel([('email', ASCENDING)], name='email_unique', unique=True),
+    ],
+    'zonestats': [
+        IndexModel([('zone', ASCENDING)], name='zone_unique', unique=True),
+    ],
+    'trainingcatalog': [
+        IndexModel([('key', ASCENDING)], name='key_unique', unique=True),
+        # /capacitacion: find({category}) returns the summary and the items
+        IndexModel([('category', ASCENDING), ('kind', ASCENDING)], name='category_kind'),
+        IndexModel([('sourceId', ASCENDING)], name='sourceId'),
+    ],
+    'evacuationlookup': [
+        IndexModel([('key', ASCENDING)], name='key_unique', unique=True),
+        # "where do I go": {geometry: {$geoIntersects: <user location>}, kind: "cell"}
+        IndexModel([(GEO_FIELD, GEOSPHERE)], name='geometry_2dsphere'),
+        IndexModel([('zoneId', ASCENDING)], name='zoneId', sparse=True),
+    ],
+    'evacuationplan': [
+        IndexModel([('key', ASCENDING)], name='key_unique', unique=True),
+        # admin views: find({kind: "meetingpoint"}).sort({load: -1})
+        IndexModel([('kind', ASCENDING), ('load', DESCENDING)], name='kind_load'),
+        IndexModel([('zoneId', ASCENDING)], name='zoneId', sparse=True),
+        IndexModel([(GEO_FIELD, GEOSPHERE)], name='geometry_2dsphere', sparse=True),
+    ],
+    # Map lookups: $geoIntersects on zone polygons, $near on points and routes.
+    'riskzones': [
+        IndexModel([('name', ASCENDING)], name='seed_key'),
+        IndexModel([(GEO_FIELD, GEOSPHERE)], name='geometry_2dsphere'),
+        IndexModel([('center', GEOSPHERE)], name='center_2dsphere'),
+    ],
+    'meetingpoints': [
+        IndexModel([('name', ASCENDING)], name='seed_key'),
+        IndexModel([(GEO_FIELD, GEOSPHERE)], name='geometry_2dsphere'),
+    ],
+    'evacuationroutes': [
+        IndexModel([('name', ASCENDING)], name='seed_key'),
+        IndexModel([(GEO_FIELD, GEOSPHERE)], name='geometry_2dsphere'),
+    ],
+    'courses': [
+        IndexModel([('title', ASCENDING)], name='seed_key'),
+        search_index('courses'),
+        IndexModel([('searchTokens', ASCENDING)], name='searchTokens'),
+    ],
+    'videos': [
+        IndexModel([('youtubeId', ASCENDING)], name='seed_key'),
+        search_index('videos'),
+        IndexModel([('searchTokens', ASCENDING)], name='searchTokens'),
+    ],
+    'resources': [
+        IndexModel([('title', ASCENDING)], name='seed_key'),
+        search_index('resources'),
+        IndexModel([('searchTokens', ASCENDING)], name='searchTokens'),
+    ],
+}
+
+
+def index_sizes(name):
+    try:
+        stats = next(get_db()[name].aggregate([{'$collStats': {'storageStats': {}}}]), None)
+    except (OperationFailure, NotImplementedError):
+        # Older servers / stand-ins such as mongomock don't support $collStats.
+        return {}
+    return (stats or {}).get('storageStats', {}).get('indexSizes', {})
+
+
+def index_matches(current, doc):
+    if TEXT in doc['key'].values():
+        # Text indexes report their key as _fts/_ftsx; compare the weights instead.
+        weights = {f: 1 for f, kind in doc['key'].items() if kind == TEXT}
+        weights.update(doc.get('weights', {}))
+        return (dict(current.get('weights', {})) == weights
+                and current.get('default_language', 'english') == doc.get('default_language', 'english'))
+    return (list(current['key']) == list(doc['key'].items())
+            and current.get('unique', False) == doc.get('unique', False))
+
+
+def ensure_collection_indexes(name, models):
+    started = time.perf_counter()
+    coll = get_db()[name]
+    existing = coll.index_information()
+    rebuilt = []
+    for model in models:
+        doc = model.document
+        current = existing.get(doc['name'])
+        if current is not None and not index_matches(current, doc):
+            # Same name, different definition: drop it so create_indexes can rebuild.
+            coll.drop_index(doc['name'])
+            rebuilt.append(doc['name'])
+    coll.create_indexes(models)
+    return {
+        'seconds': time.perf_counter() - started,
+        'rebuilt': rebuilt,
+        'sizes': index_sizes(name),
+    }
+
+
+def ensure_indexes(collections=None, workers=None):
+    specs = {n: m for n, m in INDEXES.items() if collections is None or n in collections}
+    with timer.stage('indexes'), ThreadPoolExecutor(max_workers=workers or max(1, len(specs))) as pool:
+        futures = {name: pool.submit(ensure_collection_indexes, name, models) for name, models in specs.items()}
+        report = {name: f.result() for name, f in futures.items()}
+
+    for name, r in report.items():
+        sizes = r['sizes']
+        total = sum(sizes.get(m.document['name'], 0) for m in specs[name])
+        msg = f"Indexes on {name}: {len(specs[name])} ready in {r['seconds']:.2f}s"
+        if sizes:
+            msg += f", {total / 1024:.0f} KiB"
+        if r['rebuilt']:
+            msg += f" (rebuilt {', '.join(r['rebuilt'])})"
+        print(msg)
+    return report
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Seed the Cruz Roja MongoDB database.")
+    parser.add_argument("--scale", type=int, default=0, metavar="N",
+                        help="also generate N synthetic alerts and N incidents (plus zones and routes)")
+    parser.add_argument("--history", type=float, default=0, metavar="YEARS",
+                        help="also generate YEARS of alert and incident history over the existing riskzones")
+    parser.add_argument("--history-daily", type=int, default=200, metavar="N",
+                        help="mean alerts and incidents per day for --history (default: %(default)s)")
+    parser.add_argument("--history-timeseries", action="store_true",
+                        help="write --history to alerts_ts/incidents_ts time-series collections instead")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="random seed for --scale; same seed and --base-date give the same data")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="documents per insert_many batch (default: %(default)s)")
+    parser.add_argument("--write-concern", default=None, metavar="W",
+                        help='write concern for bulk inserts: "majority", "1", "0" or "<w>:j" (default: server)')
+    parser.add_argument("--write-workers", type=int, default=None,
+                        help="threads issuing insert batches (default: 4 per core, max 32)")
+    parser.add_argument("--engine", choices=["threads", "async"], default="threads",
+                        help="bulk insert engine: thread pool, or one asyncio pipeline per collection "
+                             "(Motor if installed) (default: %(default)s)")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                        help="connections (and writes in flight) for --engine async (default: %(default)s)")
+    parser.add_argument("--shard", action="append", default=[], metavar="COLL[=FIELD,...]",
+                        help="pre-split COLL on its (zone, createdAt) shard key and route insert batches "
+                             "per shard; repeatable (alerts, incidents have default keys)")
+    parser.add_argument("--virtual-shards", type=int, default=VIRTUAL_SHARDS, metavar="N",
+                        help="stand-in shards to plan for when not connected to mongos (default: %(default)s)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="upsert only new or changed seed documents instead of clearing collections "
+                             "(applies to the base seed and --users)")
+    parser.add_argument("--prune", action="store_true",
+                        help="with --incremental, delete seed documents no longer present in the seed")
+    parser.add_argument("--validate", choices=["error", "warn"], nargs="?", const="warn", default=None,
+                        help="install the model $jsonSchema validators and pre-validate every batch; invalid "
+                             "documents are only counted (warn, the default) or go to `quarantine` (error)")
+    parser.add_argument("--skip-indexes", action="store_true",
+                        help="do not create or verify indexes after loading")
+    parser.add_argument("--import", dest="import_files", action="append", default=[], metavar="FILE",
+                        help="stream records from <collection>.ndjson|.jsonl|.csv[.gz|.bz2|.xz] "
+                             "(or collection=FILE); may be repeated")
+    parser.add_argument("--snapshot", default=None, metavar="DIR",
+                        help="after everything else, dump all managed collections to DIR")
+    parser.add_argument("--restore", default=None, metavar="DIR",
+                        help="replace all managed collections with the snapshot in DIR and exit")
+    parser.add_argument("--skip-seed", action="store_true",
+                        help="do not run the base seed (useful to only run the jobs below)")
+    parser.add_argument("--stats", action="store_true",
+                        help="materialize daily dashboardstats from incidents (incremental)")
+    parser.add_argument("--zone-stats", action="store_true",
+                        help="materialize per-zone rollups into zonestats (incremental)")
+    parser.add_argument("--search-tokens", action="store_true",
+                        help="fill in searchTokens on documents that lack it or changed (all of them with --full)")
+    parser.add_argument("--training-catalog", action="store_true",
+                        help="materialize the trainingcatalog read model (incremental unless --full)")
+    parser.add_argument("--assign-zones", action="store_true",
+                        help="stamp alerts and incidents with the zoneId of the riskzone they fall in "
+                             "(needs numpy)")
+    parser.add_argument("--route-geometry", action="store_true",
+                        help="compute route lengths, walking ETAs, bounding boxes and simplified lines "
+                             "(needs numpy; incremental unless --full)")
+    parser.add_argument("--tiles", default=None, metavar="FILE.mbtiles",
+                        help="render riskzones, meetingpoints and routes into vector tiles in FILE.mbtiles, "
+                             "redrawing only tiles whose features changed (all of them with --full)")
+    parser.add_argument("--evacuation-table", action="store_true",
+                        help="precompute the nearest meeting points and routes per riskzone and map cell "
+                             "(needs numpy)")
+    parser.add_argument("--evacuation-plan", action="store_true",
+                        help="assign each riskzone's population to meeting points by walking time without "
+                             "exceeding their capacity (min-cost flow; needs numpy)")
+    parser.add_argument("--nearest-k", type=int, default=LOOKUP_K,
+                        help="meeting points stored per zone/cell (default: %(default)s)")
+    parser.add_argument("--full", action="store_true",
+                        help="for the jobs above, ignore watermarks and previous results and redo everything")
+    parser.add_argument("--base-date", type=lambda v: datetime.strptime(v, "%Y-%m-%d"), default=None,
+                        help="YYYY-MM-DD that synthetic timestamps count back from (default: today UTC)")
+    parser.add_argument("--users", type=int, default=0, metavar="N",
+                        help="also create N test users (test<i>@loadtest.cruzroja.org.co / test<i>)")
+    parser.add_argument("--hash-workers", type=int, default=None,
+                        help="processes used for bcrypt hashing (default: all cores)")
+    parser.add_argument("--hash-cache", default=None, metavar="PATH",
+                        help="JSON file of precomputed bcrypt hashes, reused and updated across runs "
+                             "(contains test plaintexts, do not use for real accounts)")
+    return parser.parse_args(argv)
 
-    if resources:
-        res = db['resources'].insert_many(resources)
-        print(f"Inserted {len(res.inserted_ids)} into resources")
 
 if __name__ == '__main__':
-    seed()
+    args = parse_args()
+    if args.restore:
+        restore(args.restore, batch_size=args.batch_size, write_concern=parse_write_concern(args.write_concern),
+                workers=args.write_workers)
+        raise SystemExit(0)
+    hash_cache = load_hash_cache(args.hash_cache) if args.hash_cache else None
+    SHARD_KEYS.update(parse_shard_spec(spec) for spec in args.shard)
+    VIRTUAL_SHARDS = args.virtual_shards
+    write_concern = parse_write_concern(args.write_concern)
+    if args.validate:
+        install_validators(args.validate)
+    if args.incremental and not args.skip_indexes:
+        # Incremental runs look documents up by key, so build indexes first.
+        ensure_indexes()
+    if not args.skip_seed:
+        seed(hash_cache=hash_cache, batch_size=args.batch_size, write_concern=write_concern,
+             workers=args.write_workers, incremental=args.incremental, prune=args.prune,
+             engine=args.engine, pool_size=args.pool_size)
+    if args.import_files:
+        import_files(args.import_files, batch_size=args.batch_size, write_concern=write_concern,
+                     workers=args.write_workers)
+    if args.users:
+        seed_users(args.users, seed=args.seed, batch_size=args.batch_size, base=args.base_date,
+                   hash_workers=args.hash_workers, hash_cache=hash_cache,
+                   write_concern=write_concern, workers=args.write_workers, incremental=args.incremental,
+                   engine=args.engine, pool_size=args.pool_size)
+    if args.scale:
+        seed_scale(args.scale, seed=args.seed, batch_size=args.batch_size, base=args.base_date,
+                   write_concern=write_concern, workers=args.write_workers, engine=args.engine,
+                   pool_size=args.pool_size)
+    if args.history:
+        seed_history(args.history, seed=args.seed, daily=args.history_daily, batch_size=args.batch_size,
+                     base=args.base_date, write_concern=write_concern, workers=args.write_workers,
+                     timeseries=args.history_timeseries, engine=args.engine, pool_size=args.pool_size)
+    if not args.skip_indexes and not args.incremental:
+        # Building after the bulk load is much cheaper than maintaining indexes per insert.
+        ensure_indexes()
+    if args.assign_zones:
+        assign_zones(full=args.full, write_concern=write_concern)
+    if args.stats:
+        materialize_dashboard_stats(full=args.full or bool(args.scale or args.history))
+    if args.zone_stats:
+        materialize_zone_stats(full=args.full or bool(args.scale or args.history))
+    if args.search_tokens:
+        build_search_tokens(full=args.full, write_concern=write_concern)
+    if args.training_catalog:
+        materialize_training_catalog(full=args.full)
+    if args.route_geometry:
+        compute_route_geometry(full=args.full or bool(args.scale), write_concern=write_concern)
+    if args.evacuation_table:
+        build_evacuation_table(k=args.nearest_k)
+    if args.evacuation_plan:
+        build_evacuation_plan()
+    if args.tiles:
+        build_tiles(args.tiles, full=args.full)
+    if args.snapshot:
+        snapshot(args.snapshot)
+    save_hash_cache(args.hash_cache, hash_cache)
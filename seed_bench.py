@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# Benchmark for seed.py: runs the seeder at several scales and writes per-stage
+# timings, insert throughput, batch latency percentiles and peak RSS as JSON.
+# Run: python3 seed_bench.py --scales 1000,10000,100000 --out bench.json
+#      python3 seed_bench.py --mongomock                 (no server needed)
+#      python3 seed_bench.py --baseline bench.json       (fail on regressions)
+# Requires: pip install pymongo bcrypt python-dotenv   (mongomock for --mongomock)
+#
+# Each scale runs in its own subprocess so peak RSS and caches don't leak
+# between runs. The target database is dropped and refilled, so point it at a
+# throwaway database, never at the app's.
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+DEFAULT_SCALES = "1000,10000,100000"
+BENCH_DB = "cruzroja_bench"
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def peak_rss_mb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_one(args):
+    if args.mongomock:
+        import mongomock
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+    import seed
+
+    if args.mongomock:
+        seed.use_database(seed.MongoClient()[args.db])
+    else:
+        seed.use_database(seed.MongoClient(args.uri)[args.db])
+    seed.get_client().drop_database(args.db)
+    seed.timer.reset()
+
+    started = time.perf_counter()
+    seed.seed(batch_size=args.batch_size)
+    if args.users:
+        seed.seed_users(args.users, seed=args.seed, batch_size=args.batch_size)
+    seed.seed_scale(args.scale, seed=args.seed, batch_size=args.batch_size)
+    if not args.skip_indexes:
+        seed.ensure_indexes()
+    total = time.perf_counter() - started
+
+    t = seed.timer
+    collections = {}
+    for name, batches in t.batches.items():
+        latencies = [sec for sec, _ in batches]
+        docs = sum(n for _, n in batches)
+        busy = sum(latencies)
+        collections[name] = {
+            "docs": docs,
+            "batches": len(batches),
+            "insert_seconds": round(busy, 4),
+            "docs_per_sec": round(docs / busy, 1) if busy else None,
+            "batch_p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "batch_p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        }
+    hashed = t.counts.get("bcrypt", 0)
+    return {
+        "scale": args.scale,
+        "users": args.users,
+        "batch_size": args.batch_size,
+        "total_seconds": round(total, 3),
+        "stages": {k: round(v, 4) for k, v in t.stages.items()},
+        "bcrypt": {
+            "passwords": hashed,
+            "seconds": round(t.stages.get("bcrypt", 0.0), 4),
+            "ms_per_hash": round(t.stages["bcrypt"] / hashed * 1000, 2) if hashed else None,
+        },
+        "collections": collections,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_all(args):
+    results = []
+    for scale in [int(s) for s in args.scales.split(",") if s.strip()]:
+        cmd = [sys.executable, os.path.abspath(__file__), "--one", str(scale),
+               "--db", args.db, "--batch-size", str(args.batch_size), "--users", str(args.users)]
+        if args.uri:
+            cmd += ["--uri", args.uri]
+        if args.seed is not None:
+            cmd += ["--seed", str(args.seed)]
+        if args.mongomock:
+            cmd.append("--mongomock")
+        if args.skip_indexes:
+            cmd.append("--skip-indexes")
+        print(f"scale={scale} ...", flush=True)
+        out = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, text=True).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        print(f"scale={scale}: {result['total_seconds']}s, peak RSS {result['peak_rss_mb']} MiB")
+        results.append(result)
+    return {
+        "created": datetime.utcnow().isoformat() + "Z",
+        "backend": "mongomock" if args.mongomock else "mongod",
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "runs": results,
+    }
+
+
+def regressions(report, baseline, tolerance):
+    # Throughput drops larger than `tolerance` for any (scale, collection).
+    base = {(r["scale"], name): c["docs_per_sec"]
+            for r in baseline.get("runs", []) for name, c in r["collections"].items()}
+    found = []
+    for r in report["runs"]:
+        for name, c in r["collections"].items():
+            before = base.get((r["scale"], name))
+            after = c["docs_per_sec"]
+            if before and after and after < before * (1 - tolerance):
+                found.append(f"scale={r['scale']} {name}: {before} -> {after} docs/s")
+    return found
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark seed.py at several scales.")
+    parser.add_argument("--scales", default=DEFAULT_SCALES,
+                        help="comma separated --scale values (default: %(default)s)")
+    parser.add_argument("--users", type=int, default=100,
+                        help="bcrypt-hashed test users per run (default: %(default)s)")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--uri", default=os.getenv("MONGODB_URI", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default=BENCH_DB,
+                        help="database to drop and fill (default: %(default)s)")
+    parser.add_argument("--mongomock", action="store_true",
+                        help="use an in-memory mongomock database instead of a server")
+    parser.add_argument("--skip-indexes", action="store_true")
+    parser.add_argument("--out", default="bench.json", help="where to write results (default: %(default)s)")
+    parser.add_argument("--baseline", default=None, metavar="PATH",
+                        help="previous results; exit 1 if throughput regressed beyond --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed docs/sec drop against --baseline (default: %(default)s)")
+    parser.add_argument("--one", type=int, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.one is not None:
+        args.scale = args.one
+        # Progress output from seed.py goes to stderr; stdout carries the result.
+        real_stdout, sys.stdout = sys.stdout, sys.stderr
+        result = run_one(args)
+        sys.stdout = real_stdout
+        print(json.dumps(result))
+        sys.exit(0)
+
+    report = run_all(args)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.out}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        if found:
+            sys.exit(1)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# Keeps what seed.py derives from alerts and incidents up to date while the app
+# writes to them: dashboardstats and zonestats from incidents, searchTokens on
+# alerts.
+# Run: python3 seed_watch.py                    (until Ctrl-C / SIGTERM)
+#      python3 seed_watch.py --idle-exit 10     (stop after 10 s without changes)
+#      python3 seed_watch.py --full             (rebuild everything, then watch)
+# Requires: pip install pymongo python-dotenv, and a replica set: change streams
+# do not exist on a standalone mongod. A single node is enough:
+#   mongod --replSet rs0 --dbpath /tmp/rs0 --port 27017
+#   mongosh --eval 'rs.initiate()'
+#   MONGODB_URI='mongodb://localhost:27017/?replicaSet=rs0' python3 seed_watch.py
+#
+# Changes are read in micro-batches (up to --batch-size events or --flush-ms),
+# reduced to the days, zones and documents they touch, and those are recomputed
+# from the source collections, so replaying a batch after a crash is harmless.
+# The resume token is saved in seedjobs after each batch. Without one (first
+# run, --full, or a token the oplog no longer covers) the derived collections
+# are caught up with seed.py's own incremental jobs after the stream is opened,
+# so nothing written in between is missed.
+import argparse
+import signal
+import sys
+import time
+
+from pymongo import UpdateOne
+from pymongo.errors import OperationFailure
+
+import seed
+
+JOB = 'watch'
+WATCHED = ['alerts', 'incidents']
+# Fields only seed.py and this worker write; updates that touch nothing else
+# are our own writes coming back.
+DERIVED_FIELDS = {'searchTokens', 'zoneId'}
+# Fields that decide which day and zone an incident counts towards.
+PLACEMENT_FIELDS = {'createdAt', 'location'}
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_FLUSH_MS = 1000
+TOKEN_SAVE_S = 60  # how often to save the token while nothing happens
+HISTORY_LOST = 286  # ChangeStreamHistoryLost: the token fell off the oplog
+
+PIPELINE = [{'$match': {'$or': [
+    {'ns.coll': {'$in': WATCHED}},
+    # These end or reset the stream for every collection.
+    {'operationType': {'$in': ['dropDatabase', 'invalidate']}},
+]}}]
+
+
+def enable_pre_images():
+    # Deletes, and updates that move an incident to another day or zone, need
+    # the old document. MongoDB 6.0+ can keep it; without it those events fall
+    # back to a full rebuild.
+    db = seed.get_db()
+    try:
+        existing = set(db.list_collection_names())
+        for name in WATCHED:
+            if name in existing:
+                db.command('collMod', name, changeStreamPreAndPostImages={'enabled': True})
+            else:
+                db.create_collection(name, changeStreamPreAndPostImages={'enabled': True})
+        return True
+    except OperationFailure as e:
+        print(f"watch: no pre-images ({e}); deletes will rebuild the stats from scratch")
+        return False
+
+
+class Pending:
+    # What one micro-batch of events touched.
+
+    def __init__(self):
+        self.events = 0
+        self.days = set()
+        self.zones = set()
+        self.searched = {}  # collection: {_id: current document}
+        self.rebuild = None  # why everything has to be recomputed, if it does
+
+    def add(self, event):
+        self.events += 1
+        op = event['operationType']
+        if op not in ('insert', 'update', 'replace', 'delete'):
+            self.rebuild = op  # drop, rename, dropDatabase, invalidate
+            return
+        name = event['ns']['coll']
+        changed = None
+        if op == 'update':
+            desc = event.get('updateDescription') or {}
+            changed = {f.split('.')[0] for f in list(desc.get('updatedFields', {})) + desc.get('removedFields', [])}
+            if changed and changed <= DERIVED_FIELDS:
+                return
+        before = event.get('fullDocumentBeforeChange')
+        after = event.get('fullDocument')
+
+        if name == 'incidents':
+            if before is None and (op in ('replace', 'delete') or (op == 'update' and changed & PLACEMENT_FIELDS)):
+                self.rebuild = f"{op} without a pre-image"
+            for doc in (before, after):
+                if doc is None:
+                    continue
+                if doc.get('createdAt') is not None:
+                    self.days.add(seed.local_day(doc['createdAt']))
+                zone = (doc.get('location') or {}).get('neighborhood')
+                if zone is not None:
+                    self.zones.add(zone)
+        if name in seed.SEARCH_FIELDS and after is not None:
+            self.searched.setdefault(name, {})[after['_id']] = after
+
+    def apply(self):
+        if self.rebuild:
+            print(f"watch: {self.rebuild}, rebuilding")
+            catch_up(full=True)
+            return
+        seed.refresh_dashboard_days(self.days)
+        if self.zones:
+            seed.refresh_zone_stats(self.zones)
+        for name, docs in self.searched.items():
+            fields = seed.SEARCH_FIELDS[name]
+            ops = []
+            for doc in docs.values():
+                tokens = seed.search_tokens(doc, fields)
+                if doc.get('searchTokens') != tokens:
+                    ops.append(UpdateOne({'_id': doc['_id']}, {'$set': {'searchTokens': tokens}}))
+            if ops:
+                seed.get_db()[name].bulk_write(ops, ordered=False)
+
+
+def catch_up(full=False):
+    seed.materialize_dashboard_stats(full=full)
+    seed.materialize_zone_stats(full=full)
+    seed.build_search_tokens(collections=[n for n in WATCHED if n in seed.SEARCH_FIELDS], full=full)
+
+
+def next_batch(stream, batch_size, flush_ms):
+    # Waits up to max_await_time for the first event, then keeps collecting
+    # until the batch is full or flush_ms has passed since that event.
+    pending = Pending()
+    deadline = None
+    while pending.events < batch_size:
+        event = stream.try_next()
+        if event is not None:
+            pending.add(event)
+            deadline = deadline or time.monotonic() + flush_ms / 1000
+            if event['operationType'] == 'invalidate':
+                break
+        elif deadline is None or not stream.alive:
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+    return pending
+
+
+def consume(stream, batch_size, flush_ms, idle_exit=None):
+    # Returns the last saved token once the stream ends or has been idle for
+    # idle_exit seconds.
+    token = stream.resume_token
+    saved_at = idle_since = time.monotonic()
+    while stream.alive:
+        pending = next_batch(stream, batch_size, flush_ms)
+        if pending.events:
+            started = time.perf_counter()
+            pending.apply()
+            print(f"watch: {pending.events} changes -> {len(pending.days)} days, {len(pending.zones)} zones, "
+                  f"{sum(len(d) for d in pending.searched.values())} search docs "
+                  f"({time.perf_counter() - started:.2f}s)")
+            idle_since = time.monotonic()
+        if stream.resume_token != token and (pending.events or time.monotonic() - saved_at >= TOKEN_SAVE_S):
+            token = stream.resume_token
+            seed.set_watermark(JOB, token)
+            saved_at = time.monotonic()
+        if not pending.events and idle_exit is not None and time.monotonic() - idle_since >= idle_exit:
+            break
+    return token
+
+
+def watch(batch_size=DEFAULT_BATCH_SIZE, flush_ms=DEFAULT_FLUSH_MS, idle_exit=None, full=False):
+    pre_images = enable_pre_images()
+    token = None if full else seed.get_watermark(JOB)
+    options = {'full_document': 'updateLookup', 'max_await_time_ms': min(flush_ms, 1000)}
+    if pre_images:
+        options['full_document_before_change'] = 'whenAvailable'
+    while True:
+        try:
+            # start_after (unlike resume_after) also continues past an invalidate.
+            with seed.get_db().watch(PIPELINE, start_after=token, **options) as stream:
+                if token is None:
+                    catch_up(full)
+                    full = False
+                    token = stream.resume_token
+                    seed.set_watermark(JOB, token)
+                print(f"watch: following {', '.join(WATCHED)} in {seed.get_db().name}")
+                token = consume(stream, batch_size, flush_ms, idle_exit)
+                if stream.alive:
+                    return token  # idle_exit
+        except OperationFailure as e:
+            if e.code != HISTORY_LOST or token is None:
+                raise
+            print("watch: the saved resume token is older than the oplog; catching up from scratch")
+            token = None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Keep dashboardstats, zonestats and searchTokens current from change streams.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="most changes applied together (default: %(default)s)")
+    parser.add_argument("--flush-ms", type=int, default=DEFAULT_FLUSH_MS,
+                        help="longest a change waits for its batch to fill (default: %(default)s)")
+    parser.add_argument("--idle-exit", type=float, default=None, metavar="SECONDS",
+                        help="exit after this long without changes (tests, cron)")
+    parser.add_argument("--full", action="store_true",
+                        help="ignore the saved resume token and rebuild everything before watching")
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    # SIGTERM (docker stop, systemd) stops like Ctrl-C; an interrupted batch
+    # is simply replayed next time.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        watch(args.batch_size, args.flush_ms, args.idle_exit, args.full)
+    except KeyboardInterrupt:
+        pass
+    print("watch: stopped")
@@ -13,6 +13,10 @@ export interface Alert {
       lng: number
     }
   }
+  geometry?: {
+    type: "Point"
+    coordinates: [number, number]
+  }
   status: "active" | "in-progress" | "resolved"
   userId: ObjectId
   assignedTo?: ObjectId
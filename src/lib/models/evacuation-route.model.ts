@@ -9,6 +9,10 @@ export interface EvacuationRoute {
     lng: number
     order: number
   }>
+  geometry?: {
+    type: "LineString"
+    coordinates: Array<[number, number]>
+  }
   startPoint: {
     name: string
     lat: number
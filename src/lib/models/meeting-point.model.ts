@@ -9,6 +9,10 @@ export interface MeetingPoint {
     lat: number
     lng: number
   }
+  geometry?: {
+    type: "Point"
+    coordinates: [number, number]
+  }
   capacity: number
   facilities: string[]
   accessibility: boolean
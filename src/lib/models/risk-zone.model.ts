@@ -10,6 +10,14 @@ export interface RiskZone {
     lng: number
   }
   radius: number // in meters
+  geometry?: {
+    type: "Polygon"
+    coordinates: Array<Array<[number, number]>> // radius as a [lng, lat] ring
+  }
+  center?: {
+    type: "Point"
+    coordinates: [number, number]
+  }
   population: number
   incidents: number
   description: string
@@ -0,0 +1,23 @@
+# Tests run against mongomock, so no mongod is needed:
+#   pip install pytest mongomock pymongo bcrypt numpy
+#   python3 -m pytest tests
+import os
+import sys
+
+import mongomock
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import seed  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    # A fresh in-memory database per test. mongomock is not thread-safe, so
+    # tests that load data pass workers=1.
+    database = mongomock.MongoClient()['cruzroja_test']
+    seed.use_database(database)
+    seed.VALIDATED.clear()
+    yield database
+    seed.VALIDATED.clear()
@@ -0,0 +1,79 @@
+import random
+from datetime import datetime
+
+import pytest
+
+import seed
+
+np = pytest.importorskip('numpy')
+
+
+def zones(n, rng):
+    docs = list(seed.gen_riskzones(n, rng, datetime(2026, 1, 1)))
+    for i, z in enumerate(docs):
+        z['_id'] = i
+        z['radius'] = rng.choice([100, 300, 500, 1000, 1500])
+    return docs
+
+
+def brute_force(zs, lat, lng):
+    # Nearest zone whose circle contains the point, or -1.
+    zlat = np.array([z['coordinates']['lat'] for z in zs])
+    zlng = np.array([z['coordinates']['lng'] for z in zs])
+    radius = np.array([z['radius'] for z in zs], dtype=float)
+    d = seed.haversine_m(lat[:, None], lng[:, None], zlat[None, :], zlng[None, :])
+    d = np.where(d <= radius, d, np.inf)
+    return np.where(np.isinf(d.min(axis=1)), -1, d.argmin(axis=1))
+
+
+@pytest.mark.parametrize('n_zones', [1, 10, 300])
+def test_grid_matches_brute_force(n_zones):
+    rng = random.Random(n_zones)
+    zs = zones(n_zones, rng)
+    grid = seed.ZoneGrid(zs)
+    # Around the city, including points beyond every zone and the grid itself.
+    pts = [seed.scatter(rng, seed.SOACHA_CENTER, seed.SCALE_SPREAD_M) for _ in range(5000)]
+    lat = np.array([p['lat'] for p in pts])
+    lng = np.array([p['lng'] for p in pts])
+    expected = brute_force(zs, lat, lng)
+    assert (expected >= 0).any()
+    assert grid.assign(lat, lng).tolist() == expected.tolist()
+
+
+def test_assign_zones_stamps_documents(db):
+    rng = random.Random(7)
+    zs = zones(30, rng)
+    db.riskzones.insert_many(zs)
+    alerts = list(seed.gen_alerts(300, rng, zs, datetime(2026, 1, 1)))
+    alerts.append({'title': "Sin ubicación"})
+    far = {'title': "Lejos", 'location': {'coordinates': {'lat': 10.0, 'lng': -70.0}}}
+    db.alerts.insert_many(alerts + [far])
+
+    report = seed.assign_zones(collections=['alerts'])['alerts']
+    stored = list(db.alerts.find({'location.coordinates': {'$exists': True}}))
+    lat = np.array([seed.point_of('alerts', d)[0] for d in stored])
+    lng = np.array([seed.point_of('alerts', d)[1] for d in stored])
+    expected = [zs[i]['_id'] if i >= 0 else None for i in brute_force(zs, lat, lng).tolist()]
+    assert [d['zoneId'] for d in stored] == expected
+    outside = expected.count(None)
+    assert report == {'assigned': len(expected) - outside, 'outside': outside, 'skipped': 1}
+    assert db.alerts.find_one({'title': "Lejos"})['zoneId'] is None
+    assert 'zoneId' not in db.alerts.find_one({'title': "Sin ubicación"})
+    # Already assigned documents are left alone.
+    assert seed.assign_zones(collections=['alerts'])['alerts']['assigned'] == 0
+
+
+def test_new_zone_picks_up_points_stamped_outside(db):
+    rng = random.Random(8)
+    zs = zones(5, rng)
+    db.riskzones.insert_many(zs)
+    far = {'lat': 4.7, 'lng': -74.0}
+    db.alerts.insert_one({'title': "Lejos", 'location': {'coordinates': far}})
+    seed.assign_zones(collections=['alerts'])
+    assert db.alerts.find_one()['zoneId'] is None
+
+    db.riskzones.insert_one({'_id': 99, 'coordinates': far, 'radius': 200})
+    assert seed.assign_zones(collections=['alerts'])['alerts']['assigned'] == 1
+    assert db.alerts.find_one()['zoneId'] == 99
+    # Unchanged zones: only unstamped points are looked at again.
+    assert seed.assign_zones(collections=['alerts'])['alerts'] == {'assigned': 0, 'outside': 0, 'skipped': 0}
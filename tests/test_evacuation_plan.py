@@ -0,0 +1,112 @@
+import random
+
+import pytest
+
+import seed
+
+
+def reference_cost(n, arcs, supply, sink):
+    # Successive shortest paths with Bellman-Ford from a super source.
+    source = n
+    to, cap, cost = [], [], []
+    adj = [[] for _ in range(n + 1)]
+
+    def add(u, v, c, w):
+        adj[u].append(len(to))
+        adj[v].append(len(to) + 1)
+        to.extend([v, u])
+        cap.extend([c, 0])
+        cost.extend([w, -w])
+
+    for u, v, c, w in arcs:
+        add(u, v, c, w)
+    for u, units in supply.items():
+        add(source, u, units, 0)
+    need, total = sum(supply.values()), 0
+    while need:
+        dist, prev = [float('inf')] * (n + 1), [-1] * (n + 1)
+        dist[source] = 0
+        for _ in range(n + 1):
+            for u in range(n + 1):
+                for a in adj[u]:
+                    if cap[a] > 0 and dist[u] + cost[a] < dist[to[a]]:
+                        dist[to[a]], prev[to[a]] = dist[u] + cost[a], a
+        push, v = need, sink
+        while v != source:
+            push, v = min(push, cap[prev[v]]), to[prev[v] ^ 1]
+        v = sink
+        while v != source:
+            cap[prev[v]] -= push
+            cap[prev[v] ^ 1] += push
+            v = to[prev[v] ^ 1]
+        need -= push
+        total += push * dist[sink]
+    return total
+
+
+def test_small_instance():
+    # Zones 0 and 1 (10 people each) both prefer point 2 (capacity 12);
+    # point 3 is farther. Zone 1 has the smaller detour, so it moves.
+    g = seed.MinCostFlow(5)
+    z0p2 = g.add_arc(0, 2, 100, 1)
+    z0p3 = g.add_arc(0, 3, 100, 10)
+    z1p2 = g.add_arc(1, 2, 100, 1)
+    z1p3 = g.add_arc(1, 3, 100, 4)
+    g.add_arc(2, 4, 12, 0)
+    g.add_arc(3, 4, 100, 0)
+    assert g.solve({0: 10, 1: 10}, 4) == 10 * 1 + 2 * 1 + 8 * 4
+    assert (g.flow(z0p2), g.flow(z0p3), g.flow(z1p2), g.flow(z1p3)) == (10, 0, 2, 8)
+
+
+def test_unreachable_sink_raises():
+    g = seed.MinCostFlow(3)
+    g.add_arc(0, 1, 5, 1)
+    with pytest.raises(ValueError):
+        g.solve({0: 1}, 2)
+
+
+@pytest.mark.parametrize('trial', range(40))
+def test_matches_bellman_ford(trial):
+    rng = random.Random(trial)
+    nz, np_ = rng.randint(1, 6), rng.randint(1, 6)
+    sink = nz + np_
+    arcs = [(z, nz + p, rng.randint(1, 30), rng.randint(0, 50))
+            for z in range(nz) for p in range(np_) if rng.random() < 0.6]
+    arcs += [(nz + p, sink, rng.randint(0, 20), 0) for p in range(np_)]
+    # Overflow arc, like the plan's "unserved" arc, so every unit has a way out.
+    arcs += [(z, sink, 10 ** 6, 1000) for z in range(nz)]
+    supply = {z: rng.randint(0, 25) for z in range(nz)}
+
+    g = seed.MinCostFlow(sink + 1)
+    ids = [g.add_arc(*a) for a in arcs]
+    total = g.solve(supply, sink)
+    assert total == reference_cost(sink + 1, arcs, supply, sink)
+    assert total == sum(g.flow(i) * a[3] for i, a in zip(ids, arcs))
+    assert all(0 <= g.flow(i) <= a[2] for i, a in zip(ids, arcs))
+    for z in range(nz):
+        assert sum(g.flow(i) for i, a in zip(ids, arcs) if a[0] == z) == supply[z]
+
+
+def test_plan_respects_capacity_and_population(db):
+    pytest.importorskip('numpy')
+    rng = random.Random(3)
+
+    def near():
+        return {'lat': 4.55 + rng.random() * 0.03, 'lng': -74.22 + rng.random() * 0.03}
+
+    zones = [{'_id': i, 'name': f"Zona {i}", 'coordinates': near(), 'population': rng.randint(100, 2000)}
+             for i in range(40)]
+    points = [{'_id': i, 'name': f"Punto {i}", 'coordinates': near(), 'capacity': rng.randint(200, 1500),
+               'status': 'active'} for i in range(15)]
+    db.riskzones.insert_many(zones)
+    db.meetingpoints.insert_many(points)
+
+    seed.build_evacuation_plan()
+    summary = db.evacuationplan.find_one({'key': 'summary'})
+    planned_zones = list(db.evacuationplan.find({'kind': 'zone'}))
+    planned_points = list(db.evacuationplan.find({'kind': 'meetingpoint'}))
+    assert len(planned_zones) == len(zones)
+    assert all(p['assigned'] <= p['capacity'] for p in planned_points)
+    assert all(z['served'] + z['unserved'] == z['population'] for z in planned_zones)
+    assert sum(z['served'] for z in planned_zones) == sum(p['assigned'] for p in planned_points) == summary['served']
+    assert summary['served'] + summary['unserved'] == sum(z['population'] for z in zones)
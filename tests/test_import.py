@@ -0,0 +1,13 @@
+import json
+
+import seed
+
+
+def test_non_object_lines_are_rejected(db, tmp_path):
+    path = tmp_path / 'seedjobs.ndjson'
+    path.write_text('{"_id": "a"}\n[1, 2]\n"text"\nnot json\n{"_id": "b"}\n', encoding='utf-8')
+    seed.import_files([str(path)], workers=1)
+    assert sorted(d['_id'] for d in db.seedjobs.find()) == ['a', 'b']
+    rejects = [json.loads(line) for line in (tmp_path / 'seedjobs.ndjson.rejects.ndjson').read_text().splitlines()]
+    assert [(r['line'], r['errors']) for r in rejects] == [
+        (2, ["not a JSON object"]), (3, ["not a JSON object"]), (4, ["invalid JSON"])]
@@ -0,0 +1,83 @@
+import seed
+
+
+def courses():
+    return seed.seed_documents()['courses']
+
+
+def test_second_run_writes_nothing(db):
+    first = seed.upsert_load({'courses': courses()}, workers=1)['courses']
+    assert first['upserted'] == 5
+    second = seed.upsert_load({'courses': courses()}, workers=1)['courses']
+    assert (second['upserted'], second['modified'], second['unchanged']) == (0, 0, 5)
+    assert db.courses.count_documents({}) == 5
+
+
+def test_changed_document_is_updated_in_place(db):
+    seed.upsert_load({'courses': courses()}, workers=1)
+    before = db.courses.find_one({'title': courses()[0]['title']})
+    docs = courses()
+    docs[0]['duration'] += 1
+    st = seed.upsert_load({'courses': docs}, workers=1)['courses']
+    assert (st['modified'], st['unchanged']) == (1, 4)
+    after = db.courses.find_one({'title': docs[0]['title']})
+    assert after['_id'] == before['_id']
+    assert after['duration'] == before['duration'] + 1
+    assert after['seedHash'] != before['seedHash']
+
+
+def test_prune_removes_only_seeded_documents(db):
+    seed.upsert_load({'courses': courses()}, workers=1)
+    db.courses.insert_one({'title': "Curso creado en la app"})
+    st = seed.upsert_load({'courses': courses()[1:]}, workers=1, prune=True)['courses']
+    assert st['pruned'] == 1
+    assert db.courses.find_one({'title': courses()[0]['title']}) is None
+    assert db.courses.find_one({'title': "Curso creado en la app"}) is not None
+
+
+def test_password_change_is_detected_without_hashing_it(db):
+    cache = {}
+
+    def load(users):
+        return seed.upsert_load(
+            {'users': users},
+            prepare={'users': lambda batch: seed.hash_user_passwords(batch, cache=cache)},
+            verify={'users': lambda pairs: seed.passwords_unchanged(pairs, cache=cache)},
+            workers=1)['users']
+
+    users = seed.seed_documents()['users']
+    email, plain = users[0]['email'], users[0]['password']
+    load(users)
+    stored = db.users.find_one({'email': email})
+    assert stored['_id'] == seed.seed_user_id(email)
+    assert seed.check_password(plain, stored['password'])
+
+    users = seed.seed_documents()['users']
+    assert seed.content_hash(users[0]) == seed.content_hash({**users[0], 'password': "otra-clave"})
+    users[0]['password'] = "otra-clave"
+    cache.clear()  # force bcrypt.checkpw against the stored hash
+    st = load(users)
+    assert (st['modified'], st['unchanged']) == (1, 2)
+    assert seed.check_password("otra-clave", db.users.find_one({'email': email})['password'])
+
+
+def test_scale_rerun_replaces_only_its_own_documents(db):
+    seed.upsert_load({'riskzones': seed.seed_documents()['riskzones']}, workers=1)
+    db.incidents.insert_one({'title': "Reportado en la app"})
+    for _ in range(2):
+        seed.seed_scale(200, seed=1, workers=1)
+    counts = seed.scale_counts(200)
+    assert db.riskzones.count_documents({}) == counts['riskzones'] + 2
+    assert db.evacuationroutes.count_documents({}) == counts['evacuationroutes']
+    assert db.alerts.count_documents({}) == counts['alerts']
+    assert db.incidents.count_documents({'seedSource': seed.SCALE_MARK}) == counts['incidents']
+    assert db.incidents.find_one({'title': "Reportado en la app"}) is not None
+
+
+def test_scale_alerts_reference_seeded_users(db):
+    users = seed.seed_documents()['users']
+    db.users.insert_many(users)
+    seed.seed_scale(300, seed=1, workers=1)
+    ids = {u['_id'] for u in users}
+    reporters = db.alerts.distinct('userId')
+    assert len(reporters) == len(ids) and set(reporters) <= ids
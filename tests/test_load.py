@@ -0,0 +1,33 @@
+import pytest
+
+import seed
+
+
+def failing_source():
+    yield {'n': 1}
+    raise RuntimeError("source failed")
+
+
+def source(n):
+    return ({'n': i} for i in range(n))
+
+
+@pytest.mark.parametrize('engine', ['threads', 'async'])
+def test_source_error_is_raised(db, engine):
+    with pytest.raises(RuntimeError, match="source failed"):
+        seed.load({'broken': failing_source(), 'fine': source(2000)}, engine=engine, batch_size=100,
+                  workers=1, pool_size=2)
+
+
+def test_async_prepare_error_is_raised(db):
+    def prepare(batch):
+        raise ValueError("prepare failed")
+
+    with pytest.raises(ValueError, match="prepare failed"):
+        seed.load({'fine': source(500)}, engine='async', batch_size=100, pool_size=2, prepare={'fine': prepare})
+
+
+def test_async_load_writes_everything(db):
+    stats = seed.load({'a': source(1234), 'b': source(10)}, engine='async', batch_size=100, pool_size=2)
+    assert (stats['a']['inserted'], stats['b']['inserted']) == (1234, 10)
+    assert db.a.count_documents({}) == 1234
@@ -0,0 +1,32 @@
+import bson
+import pytest
+
+import seed
+
+
+@pytest.fixture
+def snapshot_db(db, monkeypatch):
+    # mongomock has neither raw batches nor list_collections.
+    monkeypatch.setattr(type(db.alerts), 'find_raw_batches',
+                        lambda self, *a, **k: [b''.join(bson.encode(d) for d in self.find())], raising=False)
+    monkeypatch.setattr(type(db), 'list_collections', lambda self, filter=None, **k: iter([]))
+    db.alerts.insert_many([{'n': i} for i in range(3)])
+    db.users.insert_one({'email': "a@b.co"})
+    return db
+
+
+def test_refuses_a_directory_without_a_snapshot(snapshot_db, tmp_path):
+    (tmp_path / 'important.txt').write_text("x")
+    with pytest.raises(SystemExit):
+        seed.snapshot(str(tmp_path), collections=['alerts'])
+    assert [p.name for p in tmp_path.iterdir()] == ['important.txt']
+
+
+def test_replaces_only_the_previous_snapshot_files(snapshot_db, tmp_path):
+    target = tmp_path / 'snap'
+    seed.snapshot(str(target), collections=['alerts', 'users'])
+    (target / 'notes.txt').write_text("x")
+    manifest = seed.snapshot(str(target), collections=['alerts'])
+    assert sorted(p.name for p in target.iterdir()) == ['alerts.bson.gz', 'manifest.json', 'notes.txt']
+    assert manifest['collections']['alerts']['count'] == 3
+    assert not (tmp_path / 'snap.tmp').exists()
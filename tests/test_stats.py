@@ -0,0 +1,82 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import seed
+
+DAY = datetime(2026, 3, 10)
+
+
+def utc_day(field, tz=None):
+    # mongomock has no timezone argument in $year/$month/$dayOfMonth.
+    return {'$dateFromParts': {'year': {'$year': field}, 'month': {'$month': field},
+                               'day': {'$dayOfMonth': field}}}
+
+
+@pytest.fixture
+def incidents(db, monkeypatch):
+    monkeypatch.setattr(seed, 'day_expr', utc_day)
+    monkeypatch.setattr(seed, 'config', lambda key: 'UTC' if key == 'STATS_TZ' else seed.CONFIG_DEFAULTS[key])
+    rng = random.Random(1)
+    zones = list(seed.gen_riskzones(3, rng, DAY))
+    old = DAY - timedelta(days=30)
+    hours = {0: [10], 1: [9, 20], 2: [11], 3: [0.5, 15, 16]}  # day offset -> hours
+    for offset, hs in hours.items():
+        for h in hs:
+            doc = seed.make_incident(rng, zones[0], DAY + timedelta(days=offset, hours=h))
+            doc['updatedAt'] = old
+            db.incidents.insert_one(doc)
+    seed.materialize_dashboard_stats(full=True)
+    return db
+
+
+def totals(db):
+    return {d['date']: d['metrics']['totalIncidents'] for d in db.dashboardstats.find()}
+
+
+def test_incremental_run_recomputes_changed_days_only(incidents):
+    db = incidents
+    db.incidents.update_many({'createdAt': {'$lt': DAY + timedelta(days=1)}},
+                             {'$set': {'updatedAt': datetime.utcnow() + timedelta(seconds=1)}})
+    db.incidents.insert_one({**seed.make_incident(random.Random(2), {'name': "Olivos", 'coordinates': {
+        'lat': 4.58, 'lng': -74.2}, 'radius': 500}, DAY + timedelta(days=2, hours=23, minutes=30)),
+        'updatedAt': datetime.utcnow() + timedelta(seconds=1)})
+    seed.materialize_dashboard_stats()
+    # Day 3 is clipped by the 25 h window but keeps its full count.
+    assert totals(db) == {DAY: 1, DAY + timedelta(days=1): 2, DAY + timedelta(days=2): 2,
+                          DAY + timedelta(days=3): 3}
+
+
+def test_days_emptied_inside_the_range_are_removed(incidents):
+    db = incidents
+    db.incidents.delete_many({'createdAt': {'$gte': DAY + timedelta(days=1), '$lt': DAY + timedelta(days=2)}})
+    db.incidents.update_many({'createdAt': {'$lt': DAY + timedelta(days=1)}},
+                             {'$set': {'updatedAt': datetime.utcnow() + timedelta(seconds=1)}})
+    db.incidents.update_many({'createdAt': {'$gte': DAY + timedelta(days=2), '$lt': DAY + timedelta(days=3)}},
+                             {'$set': {'updatedAt': datetime.utcnow() + timedelta(seconds=1)}})
+    seed.materialize_dashboard_stats()
+    assert totals(db) == {DAY: 1, DAY + timedelta(days=2): 1, DAY + timedelta(days=3): 3}
+
+
+def zone_totals(db):
+    return {z['zone']: z['totalIncidents'] for z in db.zonestats.find()}
+
+
+def test_zone_left_by_a_moved_or_deleted_incident_is_recomputed(db):
+    rng = random.Random(3)
+    zones = list(seed.gen_riskzones(3, rng, DAY))
+    db.riskzones.insert_many(zones)
+    db.incidents.insert_many([{**seed.make_incident(rng, zones[i % 3], DAY), 'updatedAt': DAY}
+                              for i in range(9)])
+    seed.materialize_zone_stats(full=True)
+    labels = [seed.zone_label(z) for z in zones]
+    assert zone_totals(db) == {label: 3 for label in labels}
+
+    # Move one incident from zone 0 to zone 1 and delete one from zone 2.
+    moved = db.incidents.find_one({'location.neighborhood': labels[0]})
+    db.incidents.update_one({'_id': moved['_id']}, {'$set': {'location.neighborhood': labels[1],
+                                                              'updatedAt': datetime.utcnow() + timedelta(seconds=1)}})
+    db.incidents.delete_one({'location.neighborhood': labels[2]})
+    seed.materialize_zone_stats()
+    assert zone_totals(db) == {labels[0]: 2, labels[1]: 4, labels[2]: 2}
@@ -0,0 +1,83 @@
+import random
+from datetime import datetime
+
+import pytest
+
+import seed
+
+BASE = datetime(2026, 1, 1)
+
+
+def generated():
+    zones = list(seed.gen_riskzones(20, random.Random(1), BASE))
+    return {
+        'riskzones': [dict(z) for z in zones],
+        'evacuationroutes': list(seed.gen_evacuationroutes(zones, 2, random.Random(2), BASE)),
+        'alerts': list(seed.gen_alerts(500, random.Random(3), zones, BASE)),
+        'incidents': list(seed.gen_incidents(500, random.Random(4), zones, BASE)),
+    }
+
+
+@pytest.mark.parametrize('source', ['seed_documents', 'generated'])
+def test_seed_data_matches_the_models(db, source):
+    docs = seed.seed_documents() if source == 'seed_documents' else generated()
+    for name, batch in docs.items():
+        if name not in seed.MODEL_SCHEMAS:
+            continue
+        seed.VALIDATED[name] = 'error'
+        sent, invalid = seed.validate_batch(name, batch)
+        assert invalid == 0, (name, [seed.validator(name)(d) for d in batch if seed.validator(name)(d)][:3])
+        assert len(sent) == len(batch)
+    assert db[seed.QUARANTINE].count_documents({}) == 0
+
+
+def broken_alerts():
+    alerts = seed.seed_documents()['alerts']
+    alerts[1]['userId'] = "user_123"
+    alerts[2]['status'] = "reported"
+    return alerts
+
+
+def test_error_mode_quarantines_invalid_documents(db):
+    seed.VALIDATED['alerts'] = 'error'
+    alerts = broken_alerts()
+    sent, invalid = seed.validate_batch('alerts', alerts)
+    assert invalid == 2
+    assert [d['title'] for d in sent] == [alerts[0]['title'], alerts[3]['title']]
+    quarantined = {q['document']['title']: q for q in db[seed.QUARANTINE].find()}
+    assert set(quarantined) == {alerts[1]['title'], alerts[2]['title']}
+    assert all(q['collection'] == 'alerts' and q['errors'] for q in quarantined.values())
+
+
+def test_warn_mode_sends_everything_and_counts(db):
+    seed.VALIDATED['alerts'] = 'warn'
+    alerts = broken_alerts()
+    sent, invalid = seed.validate_batch('alerts', alerts)
+    assert (len(sent), invalid) == (len(alerts), 2)
+    assert db[seed.QUARANTINE].count_documents({}) == 0
+
+
+class RecordingDb:
+    # mongomock has no collMod or validator options.
+    def __init__(self, existing):
+        self.existing = existing
+        self.calls = []
+
+    def list_collection_names(self):
+        return list(self.existing)
+
+    def command(self, cmd, name, **kwargs):
+        self.calls.append((cmd, name, kwargs))
+
+    def create_collection(self, name, **kwargs):
+        self.calls.append(('create', name, kwargs))
+
+
+def test_existing_collections_get_moderate_validation(db, monkeypatch):
+    fake = RecordingDb(['alerts'])
+    monkeypatch.setattr(seed, 'get_db', lambda: fake)
+    seed.install_validators(collections=['alerts', 'courses'])
+    (_, alerts, mod), (_, courses, create) = fake.calls
+    assert (alerts, mod['validationLevel'], mod['validationAction']) == ('alerts', 'moderate', 'warn')
+    assert (courses, create['validationLevel']) == ('courses', 'strict')
+    assert seed.VALIDATED == {'alerts': 'warn', 'courses': 'warn'}
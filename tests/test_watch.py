@@ -0,0 +1,131 @@
+import copy
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import seed
+import seed_watch
+
+BASE = datetime(2026, 1, 1)
+_id = 0
+
+
+def utc_day(field, tz=None):
+    # mongomock has no timezone argument in $year/$month/$dayOfMonth.
+    return {'$dateFromParts': {'year': {'$year': field}, 'month': {'$month': field},
+                               'day': {'$dayOfMonth': field}}}
+
+
+def event(op, coll, after=None, before=None, updated=None):
+    global _id
+    _id += 1
+    e = {'_id': {'_data': str(_id)}, 'operationType': op, 'ns': {'db': 'test', 'coll': coll},
+         'fullDocument': after, 'fullDocumentBeforeChange': before}
+    if updated is not None:
+        e['updateDescription'] = {'updatedFields': {f: 1 for f in updated}, 'removedFields': []}
+    return e
+
+
+@pytest.fixture
+def data(db, monkeypatch):
+    monkeypatch.setattr(seed, 'day_expr', utc_day)
+    monkeypatch.setattr(seed, 'config', lambda key: 'UTC' if key == 'STATS_TZ' else seed.CONFIG_DEFAULTS[key])
+    rng = random.Random(1)
+    zones = list(seed.gen_riskzones(8, rng, BASE))
+    db.riskzones.insert_many(zones)
+    db.incidents.insert_many(list(seed.gen_incidents(400, rng, zones, BASE, history_days=20)))
+    db.alerts.insert_many(list(seed.gen_alerts(50, rng, zones, BASE)))
+    seed_watch.catch_up(full=True)
+    return db
+
+
+def stats(db):
+    def strip(docs):
+        return sorted(str(sorted((k, str(v)) for k, v in d.items() if k not in ('_id', 'createdAt', 'updatedAt')))
+                      for d in docs)
+    return strip(db.dashboardstats.find()), strip(db.zonestats.find())
+
+
+def test_own_writes_are_ignored():
+    pending = seed_watch.Pending()
+    pending.add(event('update', 'alerts', {'_id': 1, 'title': "x"}, updated=['searchTokens']))
+    pending.add(event('update', 'incidents', {'_id': 2}, updated=['zoneId']))
+    assert pending.events == 2
+    assert (pending.days, pending.zones, pending.searched, pending.rebuild) == (set(), set(), {}, None)
+
+
+def test_add_collects_days_zones_and_documents():
+    inc = {'_id': 1, 'createdAt': datetime(2026, 1, 2, 15), 'location': {'neighborhood': "Danubio"}}
+    moved = {**inc, 'createdAt': datetime(2026, 1, 5, 9), 'location': {'neighborhood': "Olivos"}}
+    alert = {'_id': 2, 'title': "Inundación", 'description': "Calle 10"}
+    pending = seed_watch.Pending()
+    pending.add(event('update', 'incidents', moved, inc, updated=['createdAt', 'location.neighborhood']))
+    pending.add(event('update', 'alerts', alert, updated=['title']))
+    assert pending.days == {datetime(2026, 1, 2), datetime(2026, 1, 5)}
+    assert pending.zones == {"Danubio", "Olivos"}
+    assert pending.searched == {'alerts': {2: alert}}
+    assert pending.rebuild is None
+
+
+@pytest.mark.parametrize('e', [
+    event('delete', 'incidents'),
+    event('update', 'incidents', {'_id': 1, 'createdAt': BASE}, updated=['createdAt']),
+    event('drop', 'incidents'),
+    event('invalidate', None),
+])
+def test_lost_history_forces_a_rebuild(e):
+    pending = seed_watch.Pending()
+    pending.add(e)
+    assert pending.rebuild is not None
+
+
+def test_status_update_without_pre_image_is_incremental():
+    inc = {'_id': 1, 'createdAt': BASE, 'status': 'closed', 'location': {'neighborhood': "Danubio"}}
+    pending = seed_watch.Pending()
+    pending.add(event('update', 'incidents', inc, updated=['status']))
+    assert (pending.rebuild, pending.days, pending.zones) == (None, {BASE}, {"Danubio"})
+
+
+def test_apply_matches_a_full_rebuild(data):
+    db = data
+    pending = seed_watch.Pending()
+    # Move an incident to another zone and day.
+    inc = db.incidents.find_one()
+    other = db.incidents.find_one({'location.neighborhood': {'$ne': inc['location']['neighborhood']}})
+    changes = {'location.neighborhood': other['location']['neighborhood'], 'status': 'resolved',
+               'createdAt': inc['createdAt'] - timedelta(days=3)}
+    db.incidents.update_one({'_id': inc['_id']}, {'$set': changes})
+    pending.add(event('update', 'incidents', db.incidents.find_one({'_id': inc['_id']}), copy.deepcopy(inc),
+                      updated=list(changes)))
+    # Delete one, and insert one on a day and in a zone nothing else has.
+    gone = db.incidents.find_one({'_id': {'$ne': inc['_id']}})
+    db.incidents.delete_one({'_id': gone['_id']})
+    pending.add(event('delete', 'incidents', before=gone))
+    new = {k: v for k, v in other.items() if k != '_id'}
+    new.update(createdAt=datetime(2030, 5, 5, 12), location={**other['location'], 'neighborhood': "Nueva"})
+    db.incidents.insert_one(new)
+    pending.add(event('insert', 'incidents', new))
+    # Retitle an alert.
+    alert = db.alerts.find_one()
+    db.alerts.update_one({'_id': alert['_id']}, {'$set': {'title': "Deslizamiento en Olivos"}})
+    pending.add(event('update', 'alerts', db.alerts.find_one({'_id': alert['_id']}), updated=['title']))
+
+    pending.apply()
+    incremental = stats(db)
+    assert db.dashboardstats.count_documents({'date': datetime(2030, 5, 5)}) == 1
+    assert 'deslizamiento' in db.alerts.find_one({'_id': alert['_id']})['searchTokens']
+
+    db.dashboardstats.delete_many({})
+    db.zonestats.delete_many({})
+    seed_watch.catch_up(full=True)
+    assert incremental == stats(db)
+
+
+def test_rebuild_runs_a_full_catch_up(monkeypatch):
+    calls = []
+    monkeypatch.setattr(seed_watch, 'catch_up', lambda full=False: calls.append(full))
+    pending = seed_watch.Pending()
+    pending.add(event('dropDatabase', None))
+    pending.apply()
+    assert calls == [True]